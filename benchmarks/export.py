@@ -0,0 +1,103 @@
+"""Compare URL use history export throughput: paging through the status
+endpoint's ORM + pydantic path and streaming row tuples
+
+    $ python benchmarks/export.py [rows]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime
+
+# Puts src on sys.path before the application imports
+from utils import prepare_database, report
+
+# isort: split
+
+from sqlalchemy import insert
+
+from db.db import async_session
+from models.models import ShortenedURL, ShortenedURLUse
+from schemas.short_url_use import ShortURLUseRead
+from services.export import export_rows
+from services.services import url_use_service
+
+
+async def fill(rows: int) -> int:
+    async with async_session() as db:
+        url = ShortenedURL(
+            value="https://clck.ru/bench", original="https://example.com/"
+        )
+        db.add(url)
+        await db.commit()
+        now = datetime.utcnow()
+        for start in range(0, rows, 10_000):
+            await db.execute(
+                insert(ShortenedURLUse),
+                [
+                    {
+                        "created_at": now,
+                        "host": "127.0.0.1",
+                        "port": number % 65536,
+                        "user_agent": "bench",
+                        "url_id": url.id,
+                    }
+                    for number in range(start, min(start + 10_000, rows))
+                ],
+            )
+        await db.commit()
+    return url.id
+
+
+async def export_paged(url_id: int) -> int:
+    size, cursor = 0, None
+    async with async_session() as db:
+        while True:
+            page = await url_use_service.get_page(
+                db=db,
+                filter=dict(url_id=url_id),
+                order_by=("created_at", "id"),
+                cursor=cursor,
+                limit=1000,
+            )
+            size += sum(
+                len(ShortURLUseRead.from_orm(use).json()) + 1
+                for use in page.items
+            )
+            if page.next_cursor is None:
+                return size
+            cursor = page.next_cursor
+
+
+async def export_streamed(url_id: int) -> int:
+    size = 0
+    async with async_session() as db:
+        partitions = url_use_service.stream_rows(db=db, url_id=url_id)
+        async for chunk in export_rows(
+            url_use_service.EXPORT_COLUMNS, partitions, "ndjson"
+        ):
+            size += len(chunk)
+    return size
+
+
+async def main(rows: int) -> None:
+    await prepare_database()
+    url_id = await fill(rows)
+
+    results = {}
+    for name, export in (
+        ("ORM + pydantic pages", export_paged),
+        ("streamed tuples", export_streamed),
+    ):
+        start = time.perf_counter()
+        size = await export(url_id)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "seconds": elapsed,
+            "rows/s": rows / elapsed,
+            "MB": size / 1_000_000,
+        }
+    report(f"Export of {rows} URL uses", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
@@ -0,0 +1,71 @@
+"""Compare GET /api/v1/{id} latency with BaseHTTPMiddleware and pure ASGI
+blacklist middleware
+
+    $ python benchmarks/middleware.py [requests]
+"""
+import asyncio
+import sys
+
+# Puts src on sys.path before the application imports
+from utils import measure, prepare_database, report, summary
+
+# isort: split
+
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse, ORJSONResponse
+from httpx import AsyncClient
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from api.v1 import base
+from db.db import async_session
+from middlewares.blacklist_middleware import BlacklistMiddleware
+from models.models import ShortenedURL
+from services.blacklist_matcher import blacklist_matcher
+
+
+class LegacyBlacklistMiddleware(BaseHTTPMiddleware):
+    """Previous BaseHTTPMiddleware-based implementation"""
+
+    async def dispatch(self, request: Request, call_next):
+        await blacklist_matcher.ensure_fresh()
+        if blacklist_matcher.is_blacklisted(request.client.host):
+            return JSONResponse(
+                status_code=status.HTTP_403_FORBIDDEN,
+                content={"detail": "You`ve been temporary blacklisted"},
+            )
+        return await call_next(request)
+
+
+def build_app(middleware) -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.include_router(base.api_router, prefix="/api/v1")
+    app.add_middleware(middleware)
+    return app
+
+
+async def main(requests: int) -> None:
+    await prepare_database()
+    async with async_session() as db:
+        url = ShortenedURL(
+            value="https://clck.ru/bench", original="https://example.com/"
+        )
+        db.add(url)
+        await db.commit()
+    path = f"/api/v1/{url.id}"
+
+    results = {}
+    for name, middleware in (
+        ("BaseHTTPMiddleware", LegacyBlacklistMiddleware),
+        ("pure ASGI", BlacklistMiddleware),
+    ):
+        app = build_app(middleware)
+        async with AsyncClient(app=app, base_url="http://bench") as client:
+            latencies = await measure(
+                lambda: client.get(path), requests=requests
+            )
+        results[name] = summary(latencies)
+    report(f"GET {path}, {requests} requests, ms", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,63 @@
+"""Compare GET /api/v1/{id} latency and CPU per redirect of the FastAPI
+route with the fast redirect route (PROJECT_FAST_REDIRECT)
+
+    $ python benchmarks/redirect.py [requests]
+"""
+import asyncio
+import sys
+import time
+
+# Puts src on sys.path before the application imports
+from utils import measure, prepare_database, report, summary
+
+# isort: split
+
+from httpx import AsyncClient
+
+from api.v1.redirect import RedirectRoute
+from core.config import app_settings
+from db.db import async_session
+from main import app
+from models.models import ShortenedURL
+from services.click_logger import click_logger
+
+
+async def main(requests: int) -> None:
+    # All the requests come from one client
+    app_settings.project_rate_limit = False
+    await prepare_database()
+    async with async_session() as db:
+        url = ShortenedURL(
+            value="https://clck.ru/bench", original="https://example.com/"
+        )
+        db.add(url)
+        await db.commit()
+    path = f"/api/v1/{url.id}"
+    routes = [
+        route
+        for route in app.router.routes
+        if not isinstance(route, RedirectRoute)
+    ]
+
+    click_logger.start()
+    results = {}
+    for name, route_list in (
+        ("FastAPI route", routes),
+        ("fast route", [RedirectRoute("/api/v1/{id:int}"), *routes]),
+    ):
+        app.router.routes = route_list
+        async with AsyncClient(app=app, base_url="http://bench") as client:
+            latencies = await measure(
+                lambda: client.get(path), requests=requests
+            )
+            start = time.process_time()
+            for _ in range(requests):
+                await client.get(path)
+            cpu = (time.process_time() - start) * 1000 / requests
+        results[name] = {**summary(latencies), "cpu_per_call": cpu}
+    await click_logger.stop()
+    report(f"GET {path}, {requests} requests, ms", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,131 @@
+"""Compare per-call CPU of statements rebuilt on every call with the cached
+statement templates of RepositoryDB: building the statement and its cache
+key alone, and whole repository calls
+
+    $ python benchmarks/statements.py [requests]
+"""
+import asyncio
+import sys
+import time
+
+# Puts src on sys.path before the application imports
+from utils import measure, prepare_database, report, summary
+
+# isort: split
+
+from sqlalchemy import select
+from sqlalchemy.sql import functions
+
+from db.db import async_session
+from models.models import ShortenedURL, ShortenedURLUse
+from services.services import short_url_service, url_use_service
+
+
+def legacy_get(id: int):
+    return select(ShortenedURL).where(ShortenedURL.id == id)
+
+
+def legacy_count(url_id: int):
+    return (
+        select(ShortenedURLUse)
+        .filter_by(url_id=url_id)
+        .with_only_columns(*[functions.count()])
+    )
+
+
+def legacy_get_multi(url_id: int):
+    return (
+        select(ShortenedURLUse)
+        .filter_by(url_id=url_id)
+        .order_by(ShortenedURLUse.id)
+        .offset(0)
+        .limit(100)
+    )
+
+
+async def execute(db, statement) -> list:
+    """Legacy repository call: execute and fetch like RepositoryDB does"""
+    return (await db.execute(statement)).scalars().all()
+
+
+def build_cpu(build, requests: int) -> dict[str, float]:
+    """CPU time of building a statement and its cache key, in ms"""
+    start = time.process_time()
+    for number in range(requests):
+        build(number)._generate_cache_key()
+    return {"cpu_per_call": (time.process_time() - start) * 1000 / requests}
+
+
+async def main(requests: int) -> None:
+    await prepare_database()
+    async with async_session() as db:
+        url = ShortenedURL(
+            value="https://clck.ru/bench", original="https://example.com/"
+        )
+        db.add(url)
+        await db.commit()
+        db.add_all(
+            ShortenedURLUse(
+                url_id=url.id,
+                host="127.0.0.1",
+                port=number,
+                user_agent="bench",
+            )
+            for number in range(100)
+        )
+        await db.commit()
+
+    results = {}
+    for name, build in (
+        ("build get, legacy", legacy_get),
+        ("build count, legacy", legacy_count),
+        ("build get_multi, legacy", legacy_get_multi),
+    ):
+        results[name] = build_cpu(build, requests * 10)
+    # Templates are built once, later calls only look them up
+    async with async_session() as db:
+        await url_use_service.count(db=db, filter={"url_id": url.id})
+    results["build, cached"] = build_cpu(
+        lambda number: url_use_service._statement(
+            ("count", url_use_service._filter_key({"url_id": number})),
+            lambda: None,
+        ),
+        requests * 10,
+    )
+    report("Statement construction, ms", results)
+
+    results = {}
+    async with async_session() as db:
+        for name, call in (
+            ("get, legacy", lambda: execute(db, legacy_get(url.id))),
+            ("get, cached", lambda: short_url_service.get(db=db, id=url.id)),
+            ("count, legacy", lambda: execute(db, legacy_count(url.id))),
+            (
+                "count, cached",
+                lambda: url_use_service.count(
+                    db=db, filter={"url_id": url.id}
+                ),
+            ),
+            (
+                "get_multi, legacy",
+                lambda: execute(db, legacy_get_multi(url.id)),
+            ),
+            (
+                "get_multi, cached",
+                lambda: url_use_service.get_multi(
+                    db=db, filter={"url_id": url.id}
+                ),
+            ),
+        ):
+            results[name] = summary(await measure(call, requests=requests))
+            start = time.process_time()
+            for _ in range(requests):
+                await call()
+            results[name]["cpu_per_call"] = (
+                (time.process_time() - start) * 1000 / requests
+            )
+    report(f"Repository calls, {requests} requests, ms", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,312 @@
+"""Benchmark suite of the shortener hot paths: redirects, batch shortening,
+status queries as click counts grow and blacklist middleware overhead.
+Runs the app in-process (on PROJECT_DB, a temporary SQLite database by
+default, without rate limiting) or against a running server with --url,
+which should run with PROJECT_RATE_LIMIT=false.
+Results are written to a JSON file; with a baseline the run fails when
+any of them regresses by more than --threshold
+
+    $ python benchmarks/suite.py --save-baseline
+    $ python benchmarks/suite.py --baseline benchmarks/baseline.json
+    $ python benchmarks/suite.py --url http://127.0.0.1:8080 --quick
+"""
+import argparse
+import asyncio
+import platform
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# Puts src on sys.path before the application imports
+from utils import (
+    compare,
+    load_json,
+    measure_concurrent,
+    prepare_database,
+    report,
+    save_json,
+    summary,
+)
+
+# isort: split
+
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from httpx import ASGITransport, AsyncClient
+
+API = "/api/v1"
+BENCH_DIR = Path(__file__).resolve().parent
+
+
+async def expect(response_call, status_code: int) -> None:
+    response = await response_call
+    if response.status_code != status_code:
+        raise RuntimeError(
+            f"{response.request.method} {response.request.url}:"
+            f" {response.status_code} {response.text[:200]}"
+        )
+
+
+async def create_url(client: AsyncClient) -> int:
+    response = await client.post(
+        f"{API}/",
+        json={"original_url": f"https://example.com/{uuid.uuid4().hex}"},
+    )
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+async def bench_redirect(client: AsyncClient, args) -> dict:
+    path = f"{API}/{await create_url(client)}"
+    latencies, elapsed = await measure_concurrent(
+        lambda: expect(client.get(path), 307),
+        requests=args.requests,
+        concurrency=args.concurrency,
+    )
+    return {"redirect": summary(latencies, elapsed)}
+
+
+async def bench_shorten(client: AsyncClient, args) -> dict:
+    results = {}
+    for batch_size in args.batch_sizes:
+
+        def shorten():
+            batch = [
+                {"original_url": f"https://example.com/{uuid.uuid4().hex}"}
+                for _ in range(batch_size)
+            ]
+            return expect(client.post(f"{API}/shorten", json=batch), 200)
+
+        latencies, elapsed = await measure_concurrent(
+            shorten, requests=args.batches, concurrency=args.concurrency
+        )
+        stats = summary(latencies, elapsed)
+        stats["urls_per_second"] = stats["rps"] * batch_size
+        results[f"shorten[batch={batch_size}]"] = stats
+    return results
+
+
+async def add_clicks_in_process(url_id: int, clicks: int) -> None:
+    from db.db import get_session
+    from services.services import url_use_service
+
+    now = datetime.utcnow()
+    for start in range(0, clicks, 10_000):
+        uses = [
+            {
+                "url_id": url_id,
+                "host": f"10.0.{number // 256 % 256}.{number % 256}",
+                "port": 1024 + number % 60000,
+                "user_agent": "bench",
+                "created_at": now,
+            }
+            for number in range(start, min(start + 10_000, clicks))
+        ]
+        async for db in get_session():
+            await url_use_service.record(db, objects_in=uses)
+
+
+async def add_clicks_remote(client: AsyncClient, url_id: int, clicks: int):
+    """Click through the API and let the click queue flush"""
+    path = f"{API}/{url_id}"
+    await measure_concurrent(
+        lambda: client.get(path), requests=clicks, concurrency=32
+    )
+    await asyncio.sleep(2)
+
+
+async def bench_status(client: AsyncClient, args) -> dict:
+    results = {}
+    for clicks in args.click_counts:
+        url_id = await create_url(client)
+        if args.url:
+            await add_clicks_remote(client, url_id, clicks)
+        else:
+            await add_clicks_in_process(url_id, clicks)
+        for name, params in (
+            ("status", {}),
+            ("status_full_info", {"full_info": True, "max_result": 100}),
+        ):
+            latencies, elapsed = await measure_concurrent(
+                lambda: expect(
+                    client.get(f"{API}/{url_id}/status", params=params), 200
+                ),
+                requests=args.requests,
+                concurrency=args.concurrency,
+            )
+            results[f"{name}[clicks={clicks}]"] = summary(latencies, elapsed)
+    return results
+
+
+def build_app(middlewares: list) -> FastAPI:
+    from api.v1 import base
+
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.include_router(base.api_router, prefix=API)
+    for middleware in middlewares:
+        app.add_middleware(middleware)
+    return app
+
+
+async def add_blacklist(size: int) -> None:
+    import ipaddress
+
+    from db.db import new_session
+    from models.models import BlacklistedClient
+    from services.blacklist_matcher import blacklist_matcher
+
+    async with new_session() as db:
+        db.add_all(
+            BlacklistedClient(
+                host=ipaddress.ip_address(
+                    f"203.{number >> 8}.{number & 255}.0"
+                ),
+                prefix_length=24,
+            )
+            for number in range(size)
+        )
+        await db.commit()
+    blacklist_matcher.invalidate()
+
+
+async def bench_blacklist(client: AsyncClient, args) -> dict:
+    """Redirects with and without the middleware, over a large blacklist"""
+    from middlewares.blacklist_middleware import BlacklistMiddleware
+    from middlewares.session_middleware import DBSessionMiddleware
+
+    await add_blacklist(args.blacklist_size)
+    path = f"{API}/{await create_url(client)}"
+    results = {}
+    for name, middlewares in (
+        ("redirect[no blacklist]", [DBSessionMiddleware]),
+        ("redirect[blacklist]", [BlacklistMiddleware, DBSessionMiddleware]),
+    ):
+        transport = ASGITransport(app=build_app(middlewares))
+        async with AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as app_client:
+            latencies, elapsed = await measure_concurrent(
+                lambda: expect(app_client.get(path), 307),
+                requests=args.requests,
+                concurrency=args.concurrency,
+            )
+        results[name] = summary(latencies, elapsed)
+    return results
+
+
+async def run_scenarios(client: AsyncClient, args) -> dict:
+    results = {}
+    for scenario in (bench_redirect, bench_shorten, bench_status):
+        started = time.perf_counter()
+        results.update(await scenario(client, args))
+        print(f"{scenario.__name__}: {time.perf_counter() - started:.1f}s")
+    if not args.url:
+        results.update(await bench_blacklist(client, args))
+    return results
+
+
+async def run(args) -> dict:
+    if args.url:
+        async with AsyncClient(base_url=args.url, timeout=60) as client:
+            return await run_scenarios(client, args)
+
+    from core.config import app_settings
+    from main import app
+    from services.click_logger import click_logger
+
+    # All the requests come from one client
+    app_settings.project_rate_limit = False
+    await prepare_database()
+    click_logger.start()
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            return await run_scenarios(client, args)
+    finally:
+        await click_logger.stop()
+
+
+def environment(args) -> dict:
+    from sqlalchemy.engine import make_url
+
+    from core.config import app_settings
+
+    return {
+        "target": args.url or "in-process",
+        "db": make_url(app_settings.project_db).get_backend_name(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started_at": datetime.utcnow().isoformat(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", help="running server, e.g. http://...:8080")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000]
+    )
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument(
+        "--click-counts", type=int, nargs="+", default=[0, 10_000, 100_000]
+    )
+    parser.add_argument("--blacklist-size", type=int, default=10_000)
+    parser.add_argument(
+        "--quick", action="store_true", help="small run for a smoke check"
+    )
+    parser.add_argument(
+        "--output", type=Path, default=BENCH_DIR / "results.json"
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=BENCH_DIR / "baseline.json"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed regression, a fraction of the baseline value",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the results as the new baseline",
+    )
+    args = parser.parse_args()
+    if args.quick:
+        args.requests, args.batches = 200, 5
+        args.batch_sizes, args.click_counts = [1, 100], [0, 1000]
+    return args
+
+
+def main() -> int:
+    args = parse_args()
+    results = asyncio.run(run(args))
+    report("Benchmark results, ms", results)
+    save_json(
+        args.output, {"environment": environment(args), "results": results}
+    )
+    print(f"Results are saved to {args.output}")
+    if args.save_baseline:
+        save_json(args.baseline, {"results": results})
+        print(f"Baseline is saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        return 0
+    regressions = compare(
+        results, load_json(args.baseline)["results"], args.threshold
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Shared helpers for the benchmark scripts
+
+Benchmarks run the application in-process against a local SQLite
+database (PROJECT_DB may point to a local Postgres instead):
+
+    $ python benchmarks/<benchmark>.py
+"""
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+BENCH_DB = Path(tempfile.gettempdir()) / "url-shortener-bench.db"
+os.environ.setdefault("PROJECT_DB", f"sqlite+aiosqlite:///{BENCH_DB}")
+logging.disable(logging.INFO)
+
+
+async def prepare_database() -> None:
+    """Recreate the full db schema on the application engine"""
+    from db.db import Base, engine
+
+    engine.echo = False
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+
+async def measure(
+    call: Callable[[], Awaitable], *, requests: int, warmup: int = 100
+) -> list[float]:
+    """Run `call` sequentially, return latencies in milliseconds"""
+    for _ in range(warmup):
+        await call()
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def measure_concurrent(
+    call: Callable[[], Awaitable], *, requests: int, concurrency: int
+) -> tuple[list[float], float]:
+    """
+    Run `requests` calls by `concurrency` parallel workers,
+    return latencies in milliseconds and the wall time in seconds
+    """
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in remaining:
+            start = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def summary(
+    latencies: list[float], elapsed: float | None = None
+) -> dict[str, float]:
+    """Latency percentiles (ms) and requests per second"""
+    percentiles = statistics.quantiles(latencies, n=100)
+    if elapsed is None:
+        elapsed = sum(latencies) / 1000
+    return {
+        "p50": percentiles[49],
+        "p95": percentiles[94],
+        "p99": percentiles[98],
+        "rps": len(latencies) / elapsed,
+    }
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+) -> list[str]:
+    """
+    Regressions of `results` against `baseline`: p95 or p99 latency
+    higher, or RPS lower, by more than `threshold` (a fraction)
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in ("p95", "p99"):
+            if stats[key] > base[key] * (1 + threshold):
+                regressions.append(
+                    f"{name}: {key} {stats[key]:.3f}ms"
+                    f" > baseline {base[key]:.3f}ms"
+                )
+        if stats["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: rps {stats['rps']:.1f}"
+                f" < baseline {base['rps']:.1f}"
+            )
+    return regressions
+
+
+def save_json(path: Path, data: dict) -> None:
+    path.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+
+
+def load_json(path: Path) -> dict:
+    return json.loads(path.read_text())
+
+
+def report(title: str, results: dict[str, dict[str, float]]) -> None:
+    print(title)
+    width = max(map(len, results), default=0) + 2
+    for name, stats in results.items():
+        print(
+            f"  {name:<{width}}"
+            + "  ".join(f"{key}={value:9.3f}" for key, value in stats.items())
+        )
@@ -0,0 +1,110 @@
+"""05 add original hash
+
+Revision ID: 2d84f6c0b1e7
+Revises: 9e3c7d21a6b8
+Create Date: 2023-05-10 21:17:52.660183
+
+"""
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2d84f6c0b1e7"
+down_revision = "9e3c7d21a6b8"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10_000
+DEFAULT_PORTS = {"http": 80, "https": 443}
+NAMING_CONVENTION = {"uq": "%(table_name)s_%(column_0_name)s_key"}
+
+
+def url_hash(url: str) -> str:
+    """SHA-256 hex digest of the URL normalized as the app did"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    userinfo, _, _ = parts.netloc.rpartition("@")
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    netloc = f"{userinfo}@{host}" if userinfo else host
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+    normalized = urlunsplit(
+        (scheme, netloc, parts.path or "/", parts.query, parts.fragment)
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column(
+        "db_shortened_url",
+        sa.Column("original_hash", sa.String(length=64), nullable=True),
+    )
+    shortened_url = sa.table(
+        "db_shortened_url",
+        sa.column("id", sa.Integer),
+        sa.column("original", sa.String),
+        sa.column("original_hash", sa.String),
+    )
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(shortened_url.c.id, shortened_url.c.original)
+            .where(shortened_url.c.id > last_id)
+            .order_by(shortened_url.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            shortened_url.update()
+            .where(shortened_url.c.id == sa.bindparam("row_id"))
+            .values(original_hash=sa.bindparam("row_hash")),
+            [
+                {"row_id": row.id, "row_hash": url_hash(row.original)}
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+    # URLs, which are equal only after normalization, keep their own rows
+    op.execute(
+        """
+        UPDATE db_shortened_url AS duplicate
+        SET original_hash = 'duplicate:' || duplicate.id
+        WHERE EXISTS (
+            SELECT 1 FROM db_shortened_url AS first
+            WHERE first.original_hash = duplicate.original_hash
+            AND first.id < duplicate.id
+        )
+        """
+    )
+    # SQLite alters columns and constraints by copying the table, its
+    # unique constraints are unnamed and get the Postgres names to match
+    with op.batch_alter_table(
+        "db_shortened_url", naming_convention=NAMING_CONVENTION
+    ) as batch_op:
+        batch_op.alter_column("original_hash", nullable=False)
+        batch_op.drop_constraint(
+            "db_shortened_url_original_key", type_="unique"
+        )
+        batch_op.create_index(
+            op.f("ix_db_shortened_url_original_hash"),
+            ["original_hash"],
+            unique=True,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table(
+        "db_shortened_url", naming_convention=NAMING_CONVENTION
+    ) as batch_op:
+        batch_op.drop_index(op.f("ix_db_shortened_url_original_hash"))
+        batch_op.create_unique_constraint(
+            "db_shortened_url_original_key", ["original"]
+        )
+        batch_op.drop_column("original_hash")
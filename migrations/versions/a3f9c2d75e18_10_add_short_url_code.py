@@ -0,0 +1,81 @@
+"""10 add short url code
+
+Revision ID: a3f9c2d75e18
+Revises: b7d3e5a1c086
+Create Date: 2023-05-20 16:42:11.384529
+
+"""
+import os
+import re
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a3f9c2d75e18"
+down_revision = "b7d3e5a1c086"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10_000
+SHORT_CODE_PATTERN = re.compile(r"[0-9A-Za-z_-]{1,16}")
+
+
+def short_code(short_url: str, base_url: str) -> str | None:
+    """Code of a short URL served by the app, if it has one"""
+    if not short_url.startswith(base_url):
+        return None
+    code = short_url.removeprefix(base_url)
+    return code if SHORT_CODE_PATTERN.fullmatch(code) else None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "db_shortened_url",
+        sa.Column("code", sa.String(length=16), nullable=True),
+    )
+    shortened_url = sa.table(
+        "db_shortened_url",
+        sa.column("id", sa.Integer),
+        sa.column("value", sa.String),
+        sa.column("code", sa.String),
+    )
+    connection = op.get_bind()
+    base = os.getenv("PROJECT_SHORT_URL_BASE", "http://127.0.0.1:8080/")
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(shortened_url.c.id, shortened_url.c.value)
+            .where(shortened_url.c.id > last_id)
+            .order_by(shortened_url.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        # Values are unique, so are the codes under one base; short URLs
+        # of other shorteners keep NULL and stay reachable by ID only
+        codes = [
+            {"row_id": row.id, "row_code": code}
+            for row in rows
+            if (code := short_code(row.value, base)) is not None
+        ]
+        if codes:
+            connection.execute(
+                shortened_url.update()
+                .where(shortened_url.c.id == sa.bindparam("row_id"))
+                .values(code=sa.bindparam("row_code")),
+                codes,
+            )
+        last_id = rows[-1].id
+    op.create_index(
+        "ix_db_shortened_url_code",
+        "db_shortened_url",
+        ["code"],
+        unique=True,
+        postgresql_include=["id", "original", "deleted"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_db_shortened_url_code", table_name="db_shortened_url")
+    op.drop_column("db_shortened_url", "code")
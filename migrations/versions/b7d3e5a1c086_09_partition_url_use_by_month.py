@@ -0,0 +1,141 @@
+"""09 partition url use by month
+
+Revision ID: b7d3e5a1c086
+Revises: 4c2f8d9e7b10
+Create Date: 2023-05-16 20:12:51.207316
+
+"""
+from datetime import date
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b7d3e5a1c086"
+down_revision = "4c2f8d9e7b10"
+branch_labels = None
+depends_on = None
+
+PARTITIONED_TABLE = "db_shortened_url_use"
+PARTITION_PREFIX = f"{PARTITIONED_TABLE}_p"
+# Further partitions are created by the app, as it maintains them
+PARTITIONS_AHEAD = 3
+LEGACY_TABLE = f"{PARTITIONED_TABLE}_unpartitioned"
+SEQUENCE = f"{PARTITIONED_TABLE}_id_seq"
+INDEXES = {
+    "ix_db_shortened_url_use_created_at": "(created_at)",
+    "ix_db_shortened_url_use_url_id_created_at_id": (
+        "(url_id, created_at, id)"
+    ),
+}
+
+
+def month_start(moment: date) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_partition_ddl(month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {PARTITION_PREFIX}{month:%Y%m}"
+        f" PARTITION OF {PARTITIONED_TABLE}"
+        f" FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+    )
+
+
+def upgrade() -> None:
+    # Native range partitioning is Postgres only,
+    # other backends keep the plain table
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute(f"ALTER TABLE {PARTITIONED_TABLE} RENAME TO {LEGACY_TABLE}")
+    op.execute(
+        f"ALTER TABLE {LEGACY_TABLE}"
+        f" RENAME CONSTRAINT {PARTITIONED_TABLE}_pkey TO {LEGACY_TABLE}_pkey"
+    )
+    for index in INDEXES:
+        op.execute(f"ALTER INDEX {index} RENAME TO {index}_unpartitioned")
+    op.execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY NONE")
+    # The partition key must be a part of the primary key
+    op.execute(
+        f"""
+        CREATE TABLE {PARTITIONED_TABLE} (
+            id INTEGER NOT NULL DEFAULT nextval('{SEQUENCE}'),
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            host VARCHAR(100) NOT NULL,
+            port INTEGER NOT NULL,
+            user_agent VARCHAR(1000) NOT NULL,
+            url_id INTEGER NOT NULL REFERENCES db_shortened_url (id),
+            user_id INTEGER REFERENCES db_user (id),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY {PARTITIONED_TABLE}.id")
+    for index, columns in INDEXES.items():
+        op.execute(f"CREATE INDEX {index} ON {PARTITIONED_TABLE} {columns}")
+    op.execute(
+        f"CREATE TABLE {PARTITIONED_TABLE}_default"
+        f" PARTITION OF {PARTITIONED_TABLE} DEFAULT"
+    )
+
+    oldest = (
+        op.get_bind()
+        .execute(sa.text(f"SELECT min(created_at) FROM {LEGACY_TABLE}"))
+        .scalar()
+    )
+    current = month_start(date.today())
+    month = month_start(oldest) if oldest else current
+    last = add_months(current, PARTITIONS_AHEAD)
+    while month <= last:
+        op.execute(create_partition_ddl(month))
+        month = add_months(month, 1)
+
+    op.execute(
+        f"INSERT INTO {PARTITIONED_TABLE}"
+        " (id, created_at, host, port, user_agent, url_id, user_id)"
+        " SELECT id, created_at, host, port, user_agent, url_id, user_id"
+        f" FROM {LEGACY_TABLE}"
+    )
+    op.execute(f"DROP TABLE {LEGACY_TABLE}")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute(f"ALTER TABLE {PARTITIONED_TABLE} RENAME TO {LEGACY_TABLE}")
+    op.execute(
+        f"ALTER TABLE {LEGACY_TABLE}"
+        f" RENAME CONSTRAINT {PARTITIONED_TABLE}_pkey TO {LEGACY_TABLE}_pkey"
+    )
+    for index in INDEXES:
+        op.execute(f"ALTER INDEX {index} RENAME TO {index}_partitioned")
+    op.execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY NONE")
+    op.execute(
+        f"""
+        CREATE TABLE {PARTITIONED_TABLE} (
+            id INTEGER NOT NULL DEFAULT nextval('{SEQUENCE}'),
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            host VARCHAR(100) NOT NULL,
+            port INTEGER NOT NULL,
+            user_agent VARCHAR(1000) NOT NULL,
+            url_id INTEGER NOT NULL REFERENCES db_shortened_url (id),
+            user_id INTEGER REFERENCES db_user (id),
+            CONSTRAINT {PARTITIONED_TABLE}_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY {PARTITIONED_TABLE}.id")
+    for index, columns in INDEXES.items():
+        op.execute(f"CREATE INDEX {index} ON {PARTITIONED_TABLE} {columns}")
+    op.execute(
+        f"INSERT INTO {PARTITIONED_TABLE}"
+        " (id, created_at, host, port, user_agent, url_id, user_id)"
+        " SELECT id, created_at, host, port, user_agent, url_id, user_id"
+        f" FROM {LEGACY_TABLE}"
+    )
+    op.execute(f"DROP TABLE {LEGACY_TABLE}")
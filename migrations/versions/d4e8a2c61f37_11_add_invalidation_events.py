@@ -0,0 +1,41 @@
+"""11 add invalidation events
+
+Revision ID: d4e8a2c61f37
+Revises: a3f9c2d75e18
+Create Date: 2023-05-22 18:05:37.602914
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d4e8a2c61f37"
+down_revision = "a3f9c2d75e18"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Only written on backends without LISTEN/NOTIFY
+    op.create_table(
+        "db_invalidation_event",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("table_name", sa.String(length=100), nullable=False),
+        sa.Column("keys", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_db_invalidation_event_created_at"),
+        "db_invalidation_event",
+        ["created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_db_invalidation_event_created_at"),
+        table_name="db_invalidation_event",
+    )
+    op.drop_table("db_invalidation_event")
@@ -0,0 +1,55 @@
+"""12 dedup live urls only
+
+Revision ID: f2a7c4e9b351
+Revises: d4e8a2c61f37
+Create Date: 2023-05-24 19:31:08.417265
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f2a7c4e9b351"
+down_revision = "d4e8a2c61f37"
+branch_labels = None
+depends_on = None
+
+LIVE_URL = sa.text("deleted IS NOT TRUE")
+
+
+def upgrade() -> None:
+    op.drop_index(
+        "ix_db_shortened_url_original_hash", table_name="db_shortened_url"
+    )
+    op.create_index(
+        "ix_db_shortened_url_original_hash",
+        "db_shortened_url",
+        ["original_hash"],
+        unique=True,
+        postgresql_where=LIVE_URL,
+        sqlite_where=LIVE_URL,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_db_shortened_url_original_hash", table_name="db_shortened_url"
+    )
+    # Deleted rows of URLs shortened again keep their own hashes
+    op.execute(
+        """
+        UPDATE db_shortened_url AS duplicate
+        SET original_hash = 'duplicate:' || duplicate.id
+        WHERE EXISTS (
+            SELECT 1 FROM db_shortened_url AS other
+            WHERE other.original_hash = duplicate.original_hash
+            AND other.id > duplicate.id
+        )
+        """
+    )
+    op.create_index(
+        "ix_db_shortened_url_original_hash",
+        "db_shortened_url",
+        ["original_hash"],
+        unique=True,
+    )
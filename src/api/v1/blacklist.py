@@ -1,42 +1,69 @@
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Response,
+    status,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.db import get_session
+from db.db import get_request_session
 from schemas.blacklist import BlacklistedClientCreate, BlacklistedClientRead
+from services.base import InvalidCursorError
+from services.blacklist_matcher import blacklist_matcher
 from services.services import blacklist_service
 
+from .responses import NEXT_CURSOR_HEADER
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
 @router.post("/blacklist", response_model=BlacklistedClientRead)
 async def blacklist(
-    *, db: AsyncSession = Depends(get_session), client: BlacklistedClientCreate
+    *,
+    db: AsyncSession = Depends(get_request_session),
+    client: BlacklistedClientCreate,
 ) -> BlacklistedClientRead:
     """Blacklist host"""
     db_object = await blacklist_service.create(db=db, object_in=client)
+    await blacklist_matcher.refresh(db)
     logger.info(
         "Host %s blacklisted until %s",
-        db_object.host,
-        db_object.until.ctime(),
+        db_object.network,
+        db_object.until.ctime() if db_object.until else "further notice",
     )
     return db_object
 
 
 @router.get("/blacklist", response_model=list[BlacklistedClientRead])
 async def show_blacklist(
-    *, db: AsyncSession = Depends(get_session)
+    *,
+    db: AsyncSession = Depends(get_request_session),
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
 ) -> list[BlacklistedClientRead]:
-    """Show blacklist"""
-    clients = await blacklist_service.get_multi(db=db)
-    return clients
+    """Show blacklist, the next page cursor is in the X-Next-Cursor header"""
+    try:
+        page = await blacklist_service.get_page(
+            db=db, cursor=cursor, limit=limit
+        )
+    except InvalidCursorError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)
+        )
+    if page.next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return page.items
 
 
 @router.delete("/blacklist/{id}", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_from_blacklist(
-    *, db: AsyncSession = Depends(get_session), id: int
+    *, db: AsyncSession = Depends(get_request_session), id: int
 ) -> None:
     """Remove host from blacklist"""
     db_object = await blacklist_service.get(db=db, id=id)
@@ -45,6 +72,7 @@ async def remove_from_blacklist(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Host is not in blacklist",
         )
-    host = db_object.host
+    host = db_object.network
     await blacklist_service.delete(db=db, id=id)
+    await blacklist_matcher.refresh(db)
     logger.info("Host %s removed from blacklist", host)
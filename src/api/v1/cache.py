@@ -0,0 +1,17 @@
+import logging
+
+from fastapi import APIRouter
+
+from schemas.cache import CacheStatsRead
+from services.cache import redirect_cache
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/cache", response_model=CacheStatsRead)
+async def read_cache_stats() -> CacheStatsRead:
+    """Get redirect cache statistics"""
+    return CacheStatsRead(
+        size=len(redirect_cache.local), **redirect_cache.stats.asdict()
+    )
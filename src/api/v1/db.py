@@ -3,7 +3,9 @@ import logging
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.db import get_session
+from db.db import engine, get_request_session
+from db.pool import get_pool_stats
+from schemas.pool import PoolStatsRead
 from schemas.status import Status
 from services.services import url_use_service
 
@@ -12,7 +14,9 @@ logger = logging.getLogger(__name__)
 
 
 @router.get("/ping", response_model=Status)
-async def ping_db(*, db: AsyncSession = Depends(get_session)) -> Status:
+async def ping_db(
+    *, db: AsyncSession = Depends(get_request_session)
+) -> Status:
     """Get database status"""
     time = await url_use_service.get_current_time(db=db)
     if time:
@@ -20,3 +24,9 @@ async def ping_db(*, db: AsyncSession = Depends(get_session)) -> Status:
     else:
         message = "Database is not available"
     return Status(message=message)
+
+
+@router.get("/pool", response_model=PoolStatsRead)
+async def read_pool_stats() -> PoolStatsRead:
+    """Get database connection pool statistics"""
+    return PoolStatsRead(**get_pool_stats(engine.sync_engine))
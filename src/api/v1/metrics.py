@@ -0,0 +1,196 @@
+import logging
+from typing import Callable, Iterator
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from core.metrics import CONTENT_TYPE, CollectedMetric, registry
+from db.db import engine, replica_engines
+from db.pool import get_pool_stats
+from services.bloom_filter import BloomFilter
+from services.cache import CacheStats, code_redirect_cache, redirect_cache
+from services.click_logger import click_logger
+from services.invalidation import invalidation_bus
+from services.rate_limiter import rate_limiter
+from services.url_filter import short_url_filter
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+CACHES = {"redirect": redirect_cache, "redirect_code": code_redirect_cache}
+# Pool statistic: metric name, type
+POOL_METRICS = {
+    "size": ("db_pool_size", "gauge"),
+    "checked_in": ("db_pool_checked_in", "gauge"),
+    "checked_out": ("db_pool_checked_out", "gauge"),
+    "overflow": ("db_pool_overflow", "gauge"),
+    "waits": ("db_pool_waits_total", "counter"),
+    "wait_time": ("db_pool_wait_seconds_total", "counter"),
+    "max_wait_time": ("db_pool_max_wait_seconds", "gauge"),
+    "timeouts": ("db_pool_timeouts_total", "counter"),
+}
+
+
+def iter_pool_stats() -> Iterator[tuple[str, dict]]:
+    yield "primary", get_pool_stats(engine.sync_engine)
+    for number, replica in enumerate(replica_engines):
+        yield f"replica{number}", get_pool_stats(replica.sync_engine)
+
+
+def pool_collector(key: str):
+    def collect():
+        for name, stats in iter_pool_stats():
+            yield (name,), stats.get(key)
+
+    return collect
+
+
+def hit_ratio(stats: CacheStats) -> float:
+    lookups = stats.hits + stats.misses
+    return stats.hits / lookups if lookups else 0.0
+
+
+for key, (name, metric_type) in POOL_METRICS.items():
+    registry.register(
+        CollectedMetric(
+            name,
+            f"Connection pool {key.replace('_', ' ')}",
+            pool_collector(key),
+            ("engine",),
+            metric_type,
+        )
+    )
+
+registry.register(
+    CollectedMetric(
+        "cache_events_total",
+        "Cache lookups by outcome",
+        lambda: (
+            ((name, event), value)
+            for name, cache in CACHES.items()
+            for event, value in cache.stats.asdict().items()
+        ),
+        ("cache", "event"),
+        "counter",
+    )
+)
+registry.register(
+    CollectedMetric(
+        "cache_hit_ratio",
+        "Share of lookups served by the in-process cache",
+        lambda: [
+            ((name,), hit_ratio(cache.stats)) for name, cache in CACHES.items()
+        ],
+        ("cache",),
+    )
+)
+registry.register(
+    CollectedMetric(
+        "cache_size",
+        "Entries in the in-process cache",
+        lambda: [
+            ((name,), len(cache.local)) for name, cache in CACHES.items()
+        ],
+        ("cache",),
+    )
+)
+registry.register(
+    CollectedMetric(
+        "click_queue_depth",
+        "URL uses waiting to be written",
+        lambda: [((), len(click_logger))],
+    )
+)
+registry.register(
+    CollectedMetric(
+        "click_events_total",
+        "URL uses by outcome",
+        lambda: (
+            ((outcome,), value)
+            for outcome, value in click_logger.stats.asdict().items()
+        ),
+        ("outcome",),
+        "counter",
+    )
+)
+
+registry.register(
+    CollectedMetric(
+        "invalidation_events_total",
+        "Cache invalidation messages by event",
+        lambda: (
+            ((event,), value)
+            for event, value in invalidation_bus.stats.asdict().items()
+        ),
+        ("event",),
+        "counter",
+    )
+)
+registry.register(
+    CollectedMetric(
+        "rate_limit_events_total",
+        "Rate limited requests by route class and outcome",
+        lambda: (
+            ((route_class, outcome), value)
+            for route_class, stats in rate_limiter.stats.items()
+            for outcome, value in stats.asdict().items()
+        ),
+        ("route_class", "outcome"),
+        "counter",
+    )
+)
+
+
+def url_filter_collector(value: Callable[[BloomFilter], float]):
+    """Collect a value of the short URL filter once it is built"""
+
+    def collect():
+        bloom = short_url_filter.bloom
+        return [] if bloom is None else [((), value(bloom))]
+
+    return collect
+
+
+registry.register(
+    CollectedMetric(
+        "url_filter_target_false_positive_rate",
+        "Configured false positive rate of the short URL filter",
+        lambda: [((), short_url_filter.error_rate)],
+    )
+)
+registry.register(
+    CollectedMetric(
+        "url_filter_false_positive_rate",
+        "Expected false positive rate of the short URL filter",
+        url_filter_collector(lambda bloom: bloom.false_positive_rate),
+    )
+)
+registry.register(
+    CollectedMetric(
+        "url_filter_keys",
+        "Short URL IDs and codes added to the filter",
+        url_filter_collector(len),
+    )
+)
+registry.register(
+    CollectedMetric(
+        "url_filter_size_bytes",
+        "Memory of the short URL filter",
+        url_filter_collector(lambda bloom: bloom.nbytes),
+    )
+)
+registry.register(
+    CollectedMetric(
+        "url_filter_rejections_total",
+        "Lookups of unknown short URLs answered without the database",
+        lambda: [((), short_url_filter.rejections)],
+        (),
+        "counter",
+    )
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics() -> PlainTextResponse:
+    """Get metrics in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
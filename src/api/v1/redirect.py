@@ -0,0 +1,131 @@
+import logging
+from datetime import datetime
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match, Route
+from starlette.types import Scope
+
+from core.urls import SHORT_CODE_PATTERN
+from db.db import new_session
+from services.cache import (
+    CodeRedirectTarget,
+    RedirectTarget,
+    code_redirect_cache,
+    redirect_cache,
+)
+from services.click_logger import ClickEvent, click_logger
+from services.services import short_url_service
+from services.url_filter import short_url_filter
+
+logger = logging.getLogger(__name__)
+# The same logger as the API route uses
+redirect_logger = logging.getLogger("api.v1.shortened_url.redirect")
+
+
+async def load_redirect_target(
+    request: Request, id: int
+) -> RedirectTarget | None:
+    db = getattr(request.state, "db", None)
+    if db is not None:
+        return await short_url_service.get_redirect_target(db=db, id=id)
+    async with new_session() as db:
+        return await short_url_service.get_redirect_target(db=db, id=id)
+
+
+async def load_code_redirect_target(
+    request: Request, code: str
+) -> CodeRedirectTarget | None:
+    db = getattr(request.state, "db", None)
+    if db is not None:
+        return await short_url_service.get_code_redirect_target(
+            db=db, code=code
+        )
+    async with new_session() as db:
+        return await short_url_service.get_code_redirect_target(
+            db=db, code=code
+        )
+
+
+async def respond(
+    request: Request, id: int, target: RedirectTarget | CodeRedirectTarget
+) -> Response:
+    """Enqueue the click, then redirect to the target unless it is gone"""
+    host, port = request.client
+    await click_logger.put(
+        ClickEvent(
+            url_id=id,
+            host=host,
+            port=port,
+            user_agent=request.headers.get("user-agent") or "unknown",
+            created_at=datetime.utcnow(),
+        )
+    )
+    if target.deleted:
+        return Response(status_code=status.HTTP_410_GONE)
+    redirect_logger.debug("Redirecting to: %s", target.original)
+    return Response(
+        content="",
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        headers={"Location": target.original},
+    )
+
+
+async def redirect(request: Request) -> Response:
+    """
+    `GET /{id}` without dependency solving and pydantic models:
+    cached target lookup, click enqueueing, 307 or 410
+    """
+    id = request.path_params["id"]
+    target = None
+    if short_url_filter.might_contain_id(id):
+        target = await redirect_cache.get(
+            id, lambda: load_redirect_target(request, id)
+        )
+    if target is None:
+        return JSONResponse(
+            {"detail": "URL is not found"},
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    return await respond(request, id, target)
+
+
+async def redirect_by_code(request: Request) -> Response:
+    """`GET /{code}`, the short URL itself: as `redirect`, 404 if unknown"""
+    code = request.path_params["code"]
+    target = None
+    valid = SHORT_CODE_PATTERN.fullmatch(code) is not None
+    if valid and short_url_filter.might_contain_code(code):
+        target = await code_redirect_cache.get(
+            code, lambda: load_code_redirect_target(request, code)
+        )
+    if target is None:
+        return JSONResponse(
+            {"detail": "URL is not found"},
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    return await respond(request, target.id, target)
+
+
+class RedirectRoute(Route):
+    """
+    GET-only route for a redirect endpoint. Requests it does not fully
+    match (other methods, IDs which are not plain integers) fall through
+    to the next routes, e.g. the API redirect route, which answers them
+    as before
+    """
+
+    def __init__(
+        self, path: str, endpoint=redirect, name: str = "fast_redirect"
+    ):
+        super().__init__(path, endpoint, name=name)
+        self.methods = {"GET"}
+
+    def matches(self, scope: Scope) -> tuple[Match, Scope]:
+        match, child_scope = super().matches(scope)
+        if match != Match.FULL:
+            return Match.NONE, {}
+        child_scope["route"] = self
+        return match, child_scope
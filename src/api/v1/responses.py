@@ -0,0 +1,20 @@
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+# Opaque keyset pagination cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Streaming response for endpoints, which consume the request body while
+    the response is sent. Unlike `StreamingResponse` it does not listen for
+    client disconnect, because that would steal request body messages
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -1,33 +1,67 @@
 import logging
+from datetime import datetime
+from typing import AsyncIterator, Callable
 
+import orjson
 from fastapi import (
     APIRouter,
     Depends,
     Header,
     HTTPException,
+    Query,
     Request,
     Response,
     status,
 )
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.db import get_session
-from schemas.short_url_use import (
-    ShortURLUseCreate,
-    ShortURLUseRead,
-    ShortURLUseReadCut,
+from core.config import app_settings
+from db.db import get_request_session
+from schemas.short_url_stats import (
+    ShortURLStatsBucket,
+    ShortURLStatsRead,
+    ShortURLStatsTopItem,
 )
+from schemas.short_url_use import ShortURLUseRead, ShortURLUseReadCut
 from schemas.shortened_url import (
     ShortenedURLBatchRead,
     ShortenedURLCreate,
     ShortenedURLRead,
     ShortenedURLUpdate,
 )
-from services.services import short_url_service, url_use_service
+from services.base import InvalidCursorError
+from services.bulk_import import (
+    BulkImportError,
+    get_line_parser,
+    iter_url_chunks,
+)
+from services.cache import (
+    RedirectTarget,
+    code_redirect_cache,
+    redirect_cache,
+)
+from services.click_logger import ClickEvent, click_logger
+from services.export import MEDIA_TYPES, ExportFormat, export_rows
+from services.hyperloglog import HyperLogLog
+from services.rollups import VISITOR_SKETCH_PRECISION, Granularity
+from services.services import (
+    short_url_service,
+    url_stats_service,
+    url_use_breakdown_service,
+    url_use_rollup_service,
+    url_use_service,
+)
 from services.shortener import generate_short_url
+from services.url_filter import short_url_filter
+
+from .responses import NEXT_CURSOR_HEADER, NDJSONStreamingResponse
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
+# High-volume, DEBUG level: enable, sample or rate limit it separately
+redirect_logger = logging.getLogger(f"{__name__}.redirect")
 
 
 def host_extractor(request: Request) -> str:
@@ -40,10 +74,12 @@ def port_extractor(request: Request) -> int:
 
 async def get_short_url(
     *,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_request_session),
     id: int,
 ) -> ShortenedURLRead:
-    url_object = await short_url_service.get(db=db, id=id)
+    url_object = None
+    if short_url_filter.might_contain_id(id):
+        url_object = await short_url_service.get(db=db, id=id)
     if url_object is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="URL is not found"
@@ -51,63 +87,202 @@ async def get_short_url(
     return url_object
 
 
+async def get_redirect_target(
+    *,
+    db: AsyncSession = Depends(get_request_session),
+    id: int,
+) -> RedirectTarget:
+    target = None
+    if short_url_filter.might_contain_id(id):
+        target = await redirect_cache.get(
+            id, lambda: short_url_service.get_redirect_target(db=db, id=id)
+        )
+    if target is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="URL is not found"
+        )
+    return target
+
+
 async def log_url_use(
     *,
-    db: AsyncSession = Depends(get_session),
     host: str = Depends(host_extractor),
     port: int = Depends(port_extractor),
     user_agent: str | None = Header(default=None),
-    short_url: ShortenedURLRead = Depends(get_short_url),
-) -> ShortURLUseRead:
-    url_use_data = ShortURLUseCreate.parse_obj(
-        {
-            "host": host,
-            "port": port,
-            "user_agent": user_agent or "unknown",
-            "url_id": short_url.id,
-            "user_id": None,
-        }
+    id: int,
+    target: RedirectTarget = Depends(get_redirect_target),
+) -> None:
+    await click_logger.put(
+        ClickEvent(
+            url_id=id,
+            host=host,
+            port=port,
+            user_agent=user_agent or "unknown",
+            created_at=datetime.utcnow(),
+        )
     )
-    db_object = await url_use_service.create(db=db, object_in=url_use_data)
-    use = ShortURLUseRead.from_orm(db_object)
-    logger.info(f"Logged URL use: {use}")
-    return use
+
+
+async def generate_unique_short_urls(originals: list[str]) -> list[str]:
+    """Generate short URLs, which are unique within the batch"""
+    values: list[str] = []
+    seen = set()
+    for original in originals:
+        value = await generate_short_url(original)
+        attempt = 0
+        while value in seen:
+            attempt += 1
+            value = await generate_short_url(original, attempt=attempt)
+        seen.add(value)
+        values.append(value)
+    return values
 
 
 @router.post("/shorten", response_model=list[ShortenedURLBatchRead])
 async def bulk_create_short_url(
     *,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_request_session),
     urls_in: list[ShortenedURLCreate],
 ) -> list[ShortenedURLBatchRead]:
+    originals = [url.original_url for url in urls_in]
+    values = await generate_unique_short_urls(originals)
     objects_in = [
-        {
-            "value": generate_short_url(url.original_url),
-            "original": url.original_url,
-        }
-        for url in urls_in
+        {"value": value, "original": original}
+        for value, original in zip(values, originals)
     ]
-    db_objects = await short_url_service.bulk_create(
-        db=db, objects_in=objects_in
-    )
+    rows = await short_url_service.create_or_get(db=db, objects_in=objects_in)
+    for row in rows:
+        short_url_filter.add(row.id, row.code)
     urls_out = [
-        ShortenedURLBatchRead(short_id=obj.id, short_url=obj.value)
-        for obj in db_objects
+        ShortenedURLBatchRead(short_id=row.id, short_url=row.value)
+        for row in rows
     ]
     return urls_out
 
 
-@router.get("/{id}", status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+async def shorten_stream(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    parse_line: Callable[[bytes], str | None],
+) -> AsyncIterator[bytes]:
+    """Shorten and insert URLs chunk by chunk, yield NDJSON results"""
+    try:
+        async for urls, errors in iter_url_chunks(
+            chunks, parse_line, app_settings.project_bulk_chunk_size
+        ):
+            output = [orjson.dumps(error) for error in errors]
+            if urls:
+                output.extend(await shorten_chunk(db, urls))
+            if output:
+                yield b"\n".join(output) + b"\n"
+    except BulkImportError as error:
+        yield orjson.dumps({"error": str(error)}) + b"\n"
+
+
+async def shorten_chunk(
+    db: AsyncSession, urls: list[tuple[int, str]]
+) -> list[bytes]:
+    values = await generate_unique_short_urls([url for _, url in urls])
+    objects_in = [
+        {"value": value, "original": original}
+        for value, (_, original) in zip(values, urls)
+    ]
+    try:
+        rows = await short_url_service.create_or_get(
+            db=db, objects_in=objects_in, copy=True
+        )
+    except IntegrityError:
+        await db.rollback()
+        logger.warning("Chunk of %d URLs is rejected", len(urls))
+        return [
+            orjson.dumps({"line": line, "error": "Short URL is not unique"})
+            for line, _ in urls
+        ]
+    logger.info("Shortened chunk of %d URLs", len(rows))
+    for row in rows:
+        short_url_filter.add(row.id, row.code)
+    return [
+        orjson.dumps(
+            {
+                "line": line,
+                "short_id": row.id,
+                "short_url": row.value,
+                "original_url": row.original,
+            }
+        )
+        for (line, _), row in zip(urls, rows)
+    ]
+
+
+@router.post("/shorten/stream", response_class=NDJSONStreamingResponse)
+async def stream_create_short_url(
+    *,
+    db: AsyncSession = Depends(get_request_session),
+    request: Request,
+) -> NDJSONStreamingResponse:
+    """
+    Shorten URLs from NDJSON (`{"original_url": ...}` per line)
+    or CSV (URL in the first column) request body.
+    Results are streamed back as NDJSON as soon as each chunk is committed
+    """
+    try:
+        parse_line = get_line_parser(request.headers.get("content-type", ""))
+    except BulkImportError as error:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=str(error),
+        )
+    return NDJSONStreamingResponse(
+        shorten_stream(db, request.stream(), parse_line)
+    )
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_short_url_uses(
+    *,
+    db: AsyncSession = Depends(get_request_session),
+    url_id: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    format: ExportFormat = "ndjson",
+) -> StreamingResponse:
+    """
+    Stream URL use history of a URL and/or a time range [since, until)
+    as NDJSON or CSV, ordered by time. Either the URL or both ends of the
+    range are required
+    """
+    if url_id is None and (since is None or until is None):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Either url_id or both since and until are required",
+        )
+    partitions = url_use_service.stream_rows(
+        db=db,
+        url_id=url_id,
+        since=since,
+        until=until,
+        batch_size=app_settings.project_export_batch_size,
+    )
+    return StreamingResponse(
+        export_rows(url_use_service.EXPORT_COLUMNS, partitions, format),
+        media_type=MEDIA_TYPES[format],
+    )
+
+
+@router.get(
+    "/{id}",
+    status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+    dependencies=[Depends(log_url_use)],
+)
 async def read_short_url(
     *,
-    short_url: ShortenedURLRead = Depends(get_short_url),
-    use: ShortURLUseRead = Depends(log_url_use),
+    target: RedirectTarget = Depends(get_redirect_target),
 ) -> Response:
     """Get URL by ID & log use"""
-    if short_url.deleted:
+    if target.deleted:
         return Response(status_code=status.HTTP_410_GONE)
-    logger.info(f"Redirecting to: {short_url.original}")
-    headers = {"Location": short_url.original}
+    redirect_logger.debug("Redirecting to: %s", target.original)
+    headers = {"Location": target.original}
     return Response(
         content="",
         status_code=status.HTTP_307_TEMPORARY_REDIRECT,
@@ -118,14 +293,17 @@ async def read_short_url(
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 async def mark_deleted_short_url(
     *,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_request_session),
     short_url: ShortenedURLRead = Depends(get_short_url),
 ) -> None:
     """Get URL by ID & mark deleted"""
     await short_url_service.update(
         db=db, db_object=short_url, object_in=ShortenedURLUpdate(deleted=True)
     )
-    logger.info(f"Mark {short_url.value} ({short_url.original}) as deleted")
+    await redirect_cache.invalidate(short_url.id)
+    if short_url.code is not None:
+        await code_redirect_cache.invalidate(short_url.code)
+    logger.info("Mark %s (%s) as deleted", short_url.value, short_url.original)
 
 
 @router.get(
@@ -133,22 +311,102 @@ async def mark_deleted_short_url(
 )
 async def read_short_url_use_history(
     *,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_request_session),
+    response: Response,
     id: int,
     full_info: bool | None = None,
-    offset: int = 0,
-    max_result: int = 10,
+    cursor: str | None = None,
+    offset: int = Query(0, ge=0, deprecated=True),
+    max_result: int = Query(10, ge=1, le=1000),
 ) -> list[ShortURLUseRead] | ShortURLUseReadCut:
-    """Get URL use history by ID"""
+    """
+    Get URL use history by ID.
+    Pages are ordered by time; the next page cursor is returned
+    in the X-Next-Cursor header
+    """
     if not full_info:
-        url_uses_count = await url_use_service.count(
-            db, filter=dict(url_id=id)
-        )
+        url_uses_count = await url_stats_service.get_clicks(db, url_id=id)
         return ShortURLUseReadCut(count=url_uses_count)
-    url_uses = await url_use_service.get_multi(
-        db=db, filter=dict(url_id=id), skip=offset, limit=max_result
+    if offset:
+        return await url_use_service.get_multi(
+            db=db, filter=dict(url_id=id), skip=offset, limit=max_result
+        )
+    try:
+        page = await url_use_service.get_page(
+            db=db,
+            filter=dict(url_id=id),
+            order_by=("created_at", "id"),
+            cursor=cursor,
+            limit=max_result,
+        )
+    except InvalidCursorError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(error)
+        )
+    if page.next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return page.items
+
+
+@router.get("/{id}/stats", response_model=ShortURLStatsRead)
+async def read_short_url_stats(
+    *,
+    db: AsyncSession = Depends(get_request_session),
+    id: int,
+    granularity: Granularity = "hour",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    top: int = Query(10, ge=1, le=100),
+) -> ShortURLStatsRead:
+    """
+    Get URL use time series, top hosts and user agent families and
+    unique visitor estimates for [since, until), rounded to whole buckets.
+    Top lists are counted per day
+    """
+    if granularity not in app_settings.project_click_rollups:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Clicks are not rolled up by {granularity}",
+        )
+    rollups = await url_use_rollup_service.get_series(
+        db=db, url_id=id, granularity=granularity, since=since, until=until
+    )
+    total_visitors = HyperLogLog(VISITOR_SKETCH_PRECISION)
+    buckets = []
+    for rollup in rollups:
+        visitors = HyperLogLog.from_bytes(
+            rollup.visitors or bytes(1 << VISITOR_SKETCH_PRECISION)
+        )
+        total_visitors.merge(visitors)
+        buckets.append(
+            ShortURLStatsBucket(
+                bucket=rollup.bucket,
+                clicks=rollup.clicks,
+                visitors=visitors.estimate(),
+            )
+        )
+    top_items = {}
+    for dimension in ("host", "user_agent"):
+        rows = await url_use_breakdown_service.get_top(
+            db=db,
+            url_id=id,
+            dimension=dimension,
+            since=since,
+            until=until,
+            limit=top,
+        )
+        top_items[dimension] = [
+            ShortURLStatsTopItem(value=row.value, clicks=row.clicks)
+            for row in rows
+        ]
+    return ShortURLStatsRead(
+        granularity=granularity,
+        clicks=sum(bucket.clicks for bucket in buckets),
+        visitors=total_visitors.estimate(),
+        buckets=buckets,
+        top_hosts=top_items["host"],
+        top_user_agents=top_items["user_agent"],
     )
-    return url_uses
 
 
 @router.post(
@@ -156,20 +414,24 @@ async def read_short_url_use_history(
 )
 async def create_short_url(
     *,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_request_session),
     url_in: ShortenedURLCreate,
 ) -> ShortenedURLRead:
-    """Create new short URL"""
+    """Create new short URL or get the existing one for the same URL"""
     original = url_in.original_url
-    urls_count = await short_url_service.count(db, filter={"value": original})
-    if urls_count > 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="URL already exists",
-        )
-    data = {
-        "value": generate_short_url(original),
-        "original": original,
-    }
-    url_object = await short_url_service.create(db=db, object_in=data)
-    return ShortenedURLRead.from_orm(url_object)
+    for attempt in range(app_settings.project_shortener_max_attempts):
+        value = await generate_short_url(original, attempt=attempt)
+        data = {"value": value, "original": original}
+        try:
+            (row,) = await short_url_service.create_or_get(
+                db=db, objects_in=[data]
+            )
+        except IntegrityError:
+            await db.rollback()
+            continue
+        short_url_filter.add(row.id, row.code)
+        return ShortenedURLRead.from_orm(row)
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Could not generate a unique short URL",
+    )
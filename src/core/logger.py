@@ -1,3 +1,16 @@
+import atexit
+import copy
+import logging
+import queue
+import random
+import time
+from datetime import datetime, timezone
+from logging import config as logging_config
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+import orjson
+
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 LOG_DEFAULT_HANDLERS = [
     "console",
@@ -7,6 +20,7 @@ LOGGING = {
     "disable_existing_loggers": False,
     "formatters": {
         "verbose": {"format": LOG_FORMAT},
+        "json": {"()": "core.logger.JsonFormatter"},
         "default": {
             "()": "uvicorn.logging.DefaultFormatter",
             "fmt": "%(levelprefix)s %(message)s",
@@ -57,3 +71,154 @@ LOGGING = {
         "handlers": LOG_DEFAULT_HANDLERS,
     },
 }
+
+# LogRecord attributes, anything else is an `extra` field
+RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord("", 0, "", 0, "", None, None).__dict__
+) | {"message", "asctime"}
+
+_listeners: list[QueueListener] = []
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with `extra` fields included"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(data, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Passes a random `rate` share of records"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self._rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return random.random() < self._rate
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Passes at most `rate` records per second (with bursts up to `rate`).
+    The next passed record gets the number of suppressed ones
+    in its `suppressed` attribute
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self._rate = rate
+        self._capacity = max(rate, 1.0)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+        if self._tokens < 1:
+            self._suppressed += 1
+            return False
+        self._tokens -= 1
+        if self._suppressed:
+            record.suppressed = self._suppressed
+            self._suppressed = 0
+        return True
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    Hands records over to the listener thread as they are, so that
+    formatting and writing happen off the event loop
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def build_logging_config(
+    *,
+    level: str = "INFO",
+    json: bool = False,
+    levels: dict[str, str] | None = None,
+    sampling: dict[str, float] | None = None,
+    rate_limit: dict[str, float] | None = None,
+) -> dict[str, Any]:
+    """`LOGGING` with the format, levels and filters applied"""
+    config = copy.deepcopy(LOGGING)
+    if json:
+        for handler in config["handlers"].values():
+            handler["formatter"] = "json"
+    config["root"]["level"] = config["loggers"][""]["level"] = level
+    loggers = config["loggers"]
+    for name, logger_level in (levels or {}).items():
+        loggers.setdefault(name, {})["level"] = logger_level
+    filters = config.setdefault("filters", {})
+    for kind, factory, options in (
+        ("sampling", SamplingFilter, sampling),
+        ("rate_limit", RateLimitFilter, rate_limit),
+    ):
+        for name, rate in (options or {}).items():
+            filter_name = f"{kind}:{name}"
+            filters[filter_name] = {"()": factory, "rate": rate}
+            loggers.setdefault(name, {}).setdefault("filters", []).append(
+                filter_name
+            )
+    return config
+
+
+def stop_queue_listeners() -> None:
+    """Write out queued records and stop listener threads"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+def enable_queue(loggers: list[logging.Logger]) -> list[QueueListener]:
+    """
+    Move handlers of each logger to a listener thread, leaving
+    the logger a non-blocking queue handler
+    """
+    listeners = []
+    for logger in loggers:
+        if not logger.handlers:
+            continue
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        listener = QueueListener(
+            log_queue, *logger.handlers, respect_handler_level=True
+        )
+        logger.handlers = [LogQueueHandler(log_queue)]
+        listener.start()
+        listeners.append(listener)
+    return listeners
+
+
+def setup_logging(*, queued: bool = False, **options) -> None:
+    """
+    Configure logging, see `build_logging_config` for `options`.
+    In queue mode records are formatted and written by listener threads
+    """
+    stop_queue_listeners()
+    config = build_logging_config(**options)
+    logging_config.dictConfig(config)
+    if queued:
+        loggers = [logging.getLogger(name) for name in config["loggers"]]
+        _listeners.extend(enable_queue(loggers))
+
+
+atexit.register(stop_queue_listeners)
@@ -0,0 +1,244 @@
+import bisect
+import functools
+import inspect
+import math
+import os
+import time
+from typing import Any, Awaitable, Callable, Iterable, Iterator, TypeVar
+
+# Seconds, from sub-millisecond cache hits to slow batch requests
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = tuple[str, ...]
+Sample = tuple[str, dict[str, str], float]
+FunctionType = TypeVar("FunctionType", bound=Callable[..., Awaitable])
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """Named family of samples, one per combination of label values"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+    def render(self, const_labels: dict[str, str] | None = None) -> str:
+        """Samples in the text format, `const_labels` added to each one"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples():
+            if const_labels:
+                labels = {**labels, **const_labels}
+            if labels:
+                label_pairs = ",".join(
+                    f'{key}="{_escape(str(label))}"'
+                    for key, label in labels.items()
+                )
+                name = f"{name}{{{label_pairs}}}"
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines)
+
+    def _labels(self, values: Labels) -> dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, value in self._values.items():
+            yield self.name, self._labels(labels), value
+
+
+class Histogram(Metric):
+    """
+    Observations counted into fixed buckets.
+    `observe` only bisects the bounds and bumps one counter;
+    cumulative bucket counts are computed on render
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._bounds = sorted(buckets)
+        # Per label values: bucket counts (the last one is +Inf), sum
+        self._values: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        item = self._values.get(labels)
+        if item is None:
+            item = self._values[labels] = ([0] * (len(self._bounds) + 1), [0])
+        counts, total = item
+        counts[bisect.bisect_left(self._bounds, value)] += 1
+        total[0] += value
+
+    def get_count(self, *labels: str) -> int:
+        item = self._values.get(labels)
+        return sum(item[0]) if item else 0
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, (counts, total) in self._values.items():
+            label_dict = self._labels(labels)
+            cumulative = 0
+            for bound, count in zip([*self._bounds, math.inf], counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {
+                    **label_dict,
+                    "le": _format_value(bound),
+                }, cumulative
+            yield f"{self.name}_sum", label_dict, total[0]
+            yield f"{self.name}_count", label_dict, cumulative
+
+
+class CollectedMetric(Metric):
+    """
+    Values read from elsewhere (pool, cache, queue statistics)
+    by `collect` when the metrics are rendered
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], Iterable[tuple[Labels, float]]],
+        labelnames: Labels = (),
+        type: str = "gauge",
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.type = type
+        self._collect = collect
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, value in self._collect():
+            if value is not None:
+                yield self.name, self._labels(labels), value
+
+
+class MetricsRegistry:
+    """
+    Metrics of the current process only. Every worker keeps its own ones
+    and answers a scrape with them, labelled with its `pid`: the samples
+    of different workers are summed up by the metrics backend,
+    e.g. `sum without (pid) (rate(http_requests_total[1m]))`
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        const_labels = {"pid": str(os.getpid())}
+        return (
+            "\n".join(
+                metric.render(const_labels)
+                for metric in self._metrics.values()
+            )
+            + "\n"
+        )
+
+
+registry = MetricsRegistry()
+
+repository_duration = registry.register(
+    Histogram(
+        "repository_call_duration_seconds",
+        "Duration of repository method calls",
+        ("repository", "method"),
+    )
+)
+
+
+def timed(histogram: Histogram, *labels: str):
+    """Observe the duration of each call of the decorated coroutine"""
+
+    def decorator(function: FunctionType) -> FunctionType:
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs) -> Any:
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labels)
+
+        wrapper.__timed__ = True
+        return wrapper
+
+    return decorator
+
+
+def instrument_repository(cls: type) -> None:
+    """
+    Time the public coroutine methods of a repository class,
+    labelled with the class name (inherited ones too)
+    """
+    for name in dir(cls):
+        if name.startswith("_"):
+            continue
+        method = inspect.getattr_static(cls, name)
+        if not inspect.iscoroutinefunction(method):
+            continue
+        if getattr(method, "__timed__", False):
+            method = method.__wrapped__
+        setattr(
+            cls, name, timed(repository_duration, cls.__name__, name)(method)
+        )
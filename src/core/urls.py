@@ -0,0 +1,43 @@
+import hashlib
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+SHORT_CODE_MAX_LENGTH = 16
+SHORT_CODE_PATTERN = re.compile(rf"[0-9A-Za-z_-]{{1,{SHORT_CODE_MAX_LENGTH}}}")
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of URL for deduplication: lowercase scheme and host,
+    no default port, `/` for an empty path
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    userinfo, _, _ = parts.netloc.rpartition("@")
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    netloc = f"{userinfo}@{host}" if userinfo else host
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+    return urlunsplit(
+        (scheme, netloc, parts.path or "/", parts.query, parts.fragment)
+    )
+
+
+def url_hash(url: str) -> str:
+    """SHA-256 hex digest of the normalized URL"""
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+def short_code(short_url: str, base_url: str) -> str | None:
+    """
+    Code of a short URL served by this app: the rest of it after
+    `base_url`, if it looks like a code (up to `SHORT_CODE_MAX_LENGTH`
+    letters, digits, `_` or `-`)
+    """
+    if not short_url.startswith(base_url):
+        return None
+    code = short_url.removeprefix(base_url)
+    return code if SHORT_CODE_PATTERN.fullmatch(code) else None
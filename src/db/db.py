@@ -1,15 +1,77 @@
+from typing import Any
+
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from starlette.requests import Request
 
 from core.config import app_settings
 
+from .pool import InstrumentedQueuePool
+from .replicas import ReplicaRouter
+
 Base = declarative_base()
-engine = create_async_engine(app_settings.project_db, echo=True, future=True)
+
+
+def engine_options(url: str) -> dict[str, Any]:
+    options: dict[str, Any] = {
+        "echo": app_settings.project_db_echo,
+        "query_cache_size": app_settings.project_db_query_cache_size,
+    }
+    if url.startswith("sqlite"):
+        return options
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=app_settings.project_db_pool_size,
+        max_overflow=app_settings.project_db_max_overflow,
+        pool_timeout=app_settings.project_db_pool_timeout,
+        pool_pre_ping=app_settings.project_db_pool_pre_ping,
+        pool_recycle=app_settings.project_db_pool_recycle,
+    )
+    if "+asyncpg" in url:
+        options["connect_args"] = {
+            "prepared_statement_cache_size": (
+                app_settings.project_db_statement_cache_size
+            )
+        }
+    return options
+
+
+engine = create_async_engine(
+    app_settings.project_db,
+    future=True,
+    **engine_options(app_settings.project_db),
+)
+replica_engines = [
+    create_async_engine(dsn, future=True, **engine_options(dsn))
+    for dsn in app_settings.project_db_replicas
+]
+replica_router = ReplicaRouter(
+    [replica.sync_engine for replica in replica_engines],
+    strategy=app_settings.project_db_replica_strategy,
+    retry_interval=app_settings.project_db_replica_retry_interval,
+)
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
 
+def new_session() -> AsyncSession:
+    return async_session()
+
+
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
+
+
+async def get_request_session(request: Request) -> AsyncSession:
+    """
+    Session of the current request, opened by `DBSessionMiddleware`
+    and shared with the middleware stack and all dependencies
+    """
+    session = getattr(request.state, "db", None)
+    if session is not None:
+        yield session
+        return
+    async with async_session() as session:
+        yield session
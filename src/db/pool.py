@@ -0,0 +1,62 @@
+import time
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue, Empty
+
+
+@dataclass
+class PoolWaitStats:
+    waits: int = 0
+    wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    timeouts: int = 0
+
+    def asdict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class InstrumentedQueue(AsyncAdaptedQueue):
+    """Connection queue measuring blocking waits for a free connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolWaitStats()
+
+    def get(self, block: bool = True, timeout: float | None = None) -> Any:
+        if not block or not self.empty():
+            return super().get(block, timeout)
+        start = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        except Empty:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats.waits += 1
+            self.stats.wait_time += elapsed
+            self.stats.max_wait_time = max(self.stats.max_wait_time, elapsed)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool with connection wait statistics"""
+
+    _queue_class = InstrumentedQueue
+
+
+def get_pool_stats(engine: Engine) -> dict[str, Any]:
+    pool = engine.pool
+    stats: dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(pool._pool.stats.asdict())
+    return stats
@@ -0,0 +1,92 @@
+import itertools
+import logging
+import time
+from typing import Literal
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session, UOWTransaction
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+ReplicaStrategy = Literal["round_robin", "least_loaded"]
+
+# Session.info keys
+WROTE_AT = "replicas_wrote_at"
+PRIMARY_UNTIL = "replicas_primary_until"
+
+
+class ReplicaRouter:
+    """
+    Chooses a read replica engine for read-only statements.
+    A session reads from the primary after it has written anything
+    (read your writes) or until its `PRIMARY_UNTIL` info deadline.
+    A replica, which failed to connect, is skipped for `retry_interval`
+    seconds; with no healthy replica reads go to the primary
+    """
+
+    def __init__(
+        self,
+        replicas: list[Engine],
+        *,
+        strategy: ReplicaStrategy = "round_robin",
+        retry_interval: float = 30.0,
+    ):
+        self.replicas = replicas
+        self._strategy = strategy
+        self._retry_interval = retry_interval
+        self._unhealthy_until: dict[Engine, float] = {}
+        self._cycle = itertools.cycle(replicas)
+
+    def read_bind(self, session: AsyncSession) -> Engine | None:
+        """Replica engine for a read, None to use the session's own bind"""
+        if not self.replicas or self.reads_primary(session):
+            return None
+        healthy = [
+            replica for replica in self.replicas if self.is_healthy(replica)
+        ]
+        if not healthy:
+            return None
+        if self._strategy == "least_loaded":
+            return min(healthy, key=self._load)
+        for replica in self._cycle:
+            if replica in healthy:
+                return replica
+
+    @staticmethod
+    def reads_primary(session: AsyncSession) -> bool:
+        return (
+            WROTE_AT in session.info
+            or session.info.get(PRIMARY_UNTIL, 0) > time.time()
+        )
+
+    def is_healthy(self, replica: Engine) -> bool:
+        return self._unhealthy_until.get(replica, 0) <= time.monotonic()
+
+    def mark_unhealthy(self, replica: Engine) -> None:
+        logger.warning(
+            "Replica %s is unavailable for %.0fs",
+            replica.url.render_as_string(hide_password=True),
+            self._retry_interval,
+        )
+        self._unhealthy_until[replica] = (
+            time.monotonic() + self._retry_interval
+        )
+
+    @staticmethod
+    def _load(replica: Engine) -> int:
+        pool = replica.pool
+        return pool.checkedout() if isinstance(pool, QueuePool) else 0
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_write_statement(state: ORMExecuteState) -> None:
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info.setdefault(WROTE_AT, time.time())
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session: Session, flush_context: UOWTransaction) -> None:
+    session.info.setdefault(WROTE_AT, time.time())
@@ -1,10 +1,22 @@
+import asyncio
+import logging
+import os
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 
-from api.v1 import base
+from api.v1 import base, metrics
+from api.v1.redirect import RedirectRoute, redirect_by_code
 from core.config import app_settings
+from db.db import engine, replica_engines
 from middlewares.base import middlewares
+from services.click_logger import click_logger
+from services.invalidation import invalidation_bus
+from services.partitions import partition_maintainer
+from services.url_filter import short_url_filter
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=app_settings.project_name,
@@ -14,14 +26,81 @@ app = FastAPI(
 )
 
 app.include_router(base.api_router, prefix="/api/v1")
+# The usual scrape path of Prometheus
+app.include_router(metrics.router, include_in_schema=False)
+if app_settings.project_fast_redirect:
+    app.router.routes.insert(0, RedirectRoute("/api/v1/{id:int}"))
+# Short URLs themselves, after all the other routes
+app.router.routes.append(
+    RedirectRoute("/{code}", redirect_by_code, name="redirect_by_code")
+)
 for middleware in middlewares:
     app.add_middleware(middleware)
 
 
-if __name__ == "__main__":
+@app.on_event("startup")
+async def startup() -> None:
+    click_logger.start()
+    partition_maintainer.start()
+    if app_settings.project_invalidation:
+        invalidation_bus.start()
+    if app_settings.project_url_filter:
+        short_url_filter.start()
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    """Drain background queues, bounded by the graceful shutdown timeout"""
+    await partition_maintainer.stop()
+    await short_url_filter.stop()
+    await invalidation_bus.stop()
+    try:
+        await asyncio.wait_for(
+            click_logger.stop(),
+            timeout=app_settings.project_shutdown_timeout,
+        )
+    except asyncio.TimeoutError:
+        logger.error(
+            "%d URL uses are lost: click queue is not drained in %ss",
+            len(click_logger),
+            app_settings.project_shutdown_timeout,
+        )
+    for replica in replica_engines:
+        await replica.dispose()
+    await engine.dispose()
+
+
+def run() -> None:
+    """
+    Serve the app: a single reloading process in dev mode, otherwise
+    `PROJECT_WORKERS` processes (one per CPU by default)
+    """
+    dev = app_settings.project_mode == "dev"
+    workers = None if dev else app_settings.project_workers or os.cpu_count()
+    if (
+        app_settings.project_shortener == "snowflake"
+        and app_settings.project_shortener_worker_id is not None
+        and (workers or 1) > 1
+    ):
+        raise RuntimeError(
+            "Snowflake worker ID would be shared by all workers: "
+            "unset PROJECT_SHORTENER_WORKER_ID or set PROJECT_WORKERS=1"
+        )
     uvicorn.run(
         "main:app",
         host=app_settings.project_host,
         port=app_settings.project_port,
-        reload=True,
+        reload=dev,
+        workers=workers,
+        loop=app_settings.project_loop,
+        http=app_settings.project_http,
+        backlog=app_settings.project_backlog,
+        timeout_keep_alive=app_settings.project_keepalive_timeout,
+        limit_concurrency=app_settings.project_limit_concurrency,
+        # Logging is configured on import of the settings, in every worker
+        log_config=None,
     )
+
+
+if __name__ == "__main__":
+    run()
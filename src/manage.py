@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import logging
+
+from db.db import get_session
+from services.partitions import partition_maintainer
+from services.services import url_stats_service
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_stats() -> None:
+    async for db in get_session():
+        await url_stats_service.rebuild(db)
+    logger.info("Click counters and rollups rebuilt")
+
+
+async def maintain_partitions() -> None:
+    async for db in get_session():
+        created, expired = await partition_maintainer.maintain(db)
+    logger.info("Partitions created: %s, expired: %s", created, expired)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Service maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "rebuild-stats",
+        help="recount click counters and rollups from raw URL uses",
+    )
+    commands.add_parser(
+        "maintain-partitions",
+        help="create future URL use partitions and expire old ones",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "rebuild-stats":
+        asyncio.run(rebuild_stats())
+    elif args.command == "maintain-partitions":
+        asyncio.run(maintain_partitions())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,14 @@
 from .blacklist_middleware import BlacklistMiddleware
+from .metrics_middleware import MetricsMiddleware
+from .proxy_headers_middleware import TrustedProxyMiddleware
+from .rate_limit_middleware import RateLimitMiddleware
+from .session_middleware import DBSessionMiddleware
 
-middlewares = [BlacklistMiddleware]
+# Pure ASGI middleware classes, outermost last
+middlewares = [
+    RateLimitMiddleware,
+    BlacklistMiddleware,
+    DBSessionMiddleware,
+    MetricsMiddleware,
+    TrustedProxyMiddleware,
+]
@@ -1,27 +1,31 @@
 import logging
 
-from fastapi import Request, status
+from fastapi import status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from db.db import get_session
-from services.services import blacklist_service
+from services.blacklist_matcher import blacklist_matcher
 
 logger = logging.getLogger(__name__)
 
 
-class BlacklistMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        async for db in get_session():
-            blacklisted_times = await blacklist_service.count(
-                db=db, filter=dict(host=request.client.host)
-            )
-        if blacklisted_times > 0:
-            logger.info(
-                "Blacklisted client %s connection attempt", request.client.host
-            )
-            return JSONResponse(
+class BlacklistMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        await blacklist_matcher.ensure_fresh(scope.get("state", {}).get("db"))
+        client = scope.get("client")
+        host = client[0] if client else None
+        if blacklist_matcher.is_blacklisted(host):
+            logger.info("Blacklisted client %s connection attempt", host)
+            response = JSONResponse(
                 status_code=status.HTTP_403_FORBIDDEN,
                 content={"detail": "You`ve been temporary blacklisted"},
             )
-        return await call_next(request)
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
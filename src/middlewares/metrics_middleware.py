@@ -0,0 +1,55 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.metrics import Counter, Histogram, registry
+
+# Label of requests which matched no route, to keep label values bounded
+UNMATCHED_ROUTE = "<unmatched>"
+
+requests_total = registry.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by route and response status",
+        ("method", "route", "status"),
+    )
+)
+request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request duration by route",
+        ("method", "route"),
+    )
+)
+
+
+class MetricsMiddleware:
+    """
+    Counts HTTP requests and observes their duration, labelled with
+    the path template of the matched route rather than the raw path
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = route.path_format if route is not None else UNMATCHED_ROUTE
+            method = scope["method"]
+            request_duration.observe(time.perf_counter() - start, method, path)
+            requests_total.inc(method, path, str(status_code))
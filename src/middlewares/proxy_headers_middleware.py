@@ -0,0 +1,17 @@
+from starlette.types import ASGIApp
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from core.config import app_settings
+
+
+class TrustedProxyMiddleware(ProxyHeadersMiddleware):
+    """
+    Takes the client address from X-Forwarded-For of requests coming
+    from `PROJECT_TRUSTED_PROXIES`, so clients behind a reverse proxy or
+    load balancer are told apart. Without trusted proxies it does nothing
+    """
+
+    def __init__(self, app: ASGIApp):
+        super().__init__(
+            app, trusted_hosts=app_settings.project_trusted_proxies
+        )
@@ -0,0 +1,36 @@
+import math
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.config import app_settings
+from services.rate_limiter import classify, rate_limiter
+
+
+class RateLimitMiddleware:
+    """
+    Answers 429 to clients over the limit of the route class before
+    the request reaches the database
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not app_settings.project_rate_limit:
+            await self.app(scope, receive, send)
+            return
+        route_class = classify(scope["method"], scope["path"])
+        client = scope.get("client")
+        if route_class is not None and client:
+            retry_after = await rate_limiter.hit(route_class, client[0])
+            if retry_after is not None:
+                response = JSONResponse(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    content={"detail": "Too many requests"},
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
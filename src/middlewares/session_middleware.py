@@ -0,0 +1,75 @@
+import math
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import app_settings
+from db.db import new_session, replica_router
+from db.replicas import PRIMARY_UNTIL, WROTE_AT
+
+# Keeps a client reading from the primary for a while after its writes
+PRIMARY_COOKIE = "db_primary_until"
+
+
+class DBSessionMiddleware:
+    """
+    Opens one database session per HTTP request and stores it in the
+    request state. The session connects lazily, on its first statement.
+    With read replicas, a response to a request, which wrote to the
+    database, sets a cookie sending the client's reads to the primary
+    for `PROJECT_DB_READ_YOUR_WRITES_WINDOW` seconds
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._window = app_settings.project_db_read_your_writes_window
+        self._sticky = bool(replica_router.replicas) and self._window > 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        async with new_session() as session:
+            scope.setdefault("state", {})["db"] = session
+            if not self._sticky:
+                await self.app(scope, receive, send)
+                return
+            primary_until = self._get_primary_until(scope)
+            if primary_until:
+                session.info[PRIMARY_UNTIL] = primary_until
+
+            async def send_with_cookie(message: Message) -> None:
+                if (
+                    message["type"] == "http.response.start"
+                    and WROTE_AT in session.info
+                ):
+                    until = session.info[WROTE_AT] + self._window
+                    MutableHeaders(scope=message).append(
+                        "set-cookie",
+                        f"{PRIMARY_COOKIE}={until:.3f};"
+                        f" Max-Age={math.ceil(self._window)}; Path=/;"
+                        " HttpOnly; SameSite=lax",
+                    )
+                await send(message)
+
+            await self.app(scope, receive, send_with_cookie)
+
+    def _get_primary_until(self, scope: Scope) -> float | None:
+        """
+        Deadline of the client's primary reads. The cookie is not signed,
+        so it is trusted for one window from now at most
+        """
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                cookies = cookie_parser(value.decode("latin-1"))
+                try:
+                    until = float(cookies.get(PRIMARY_COOKIE, ""))
+                except ValueError:
+                    return None
+                now = time.time()
+                if not math.isfinite(until) or until <= now:
+                    return None
+                return min(until, now + self._window)
+        return None
@@ -1,8 +1,23 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from ipaddress import IPv4Network, IPv6Network, ip_network
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+)
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql.expression import func
+from sqlalchemy.sql.expression import func, text
 from sqlalchemy_utils import IPAddressType
 
+from core.config import app_settings
+from core.urls import SHORT_CODE_MAX_LENGTH, short_code, url_hash
 from db.db import Base
 
 
@@ -23,25 +38,66 @@ class User(Base):
         return f"User(id={self.id}, {self.username})"
 
 
+def original_hash_default(context) -> str:
+    return url_hash(context.get_current_parameters()["original"])
+
+
+def code_default(context) -> str | None:
+    return short_code(
+        context.get_current_parameters()["value"],
+        app_settings.project_short_url_base,
+    )
+
+
 class ShortenedURL(Base):
     __tablename__ = "db_shortened_url"
     id = Column(Integer, primary_key=True)
     value = Column(String(1000), unique=True, nullable=False)
-    original = Column(String(1000), unique=True, nullable=False)
+    original = Column(String(1000), nullable=False)
+    original_hash = Column(
+        String(64), default=original_hash_default, nullable=False
+    )
     created_at = Column(
         DateTime, index=True, default=func.now(), nullable=False
     )
     deleted = Column(Boolean, default=False)
+    # Code of `value` under PROJECT_SHORT_URL_BASE, served at /{code};
+    # NULL for short URLs of remote shorteners
+    code = Column(
+        String(SHORT_CODE_MAX_LENGTH), default=code_default, nullable=True
+    )
+    # Predicate of the rows, which are not deleted
+    live = text("deleted IS NOT TRUE")
 
     uses = relationship(
         "ShortenedURLUse", back_populates="url", cascade="all, delete"
     )
 
+    __table_args__ = (
+        # URLs are deduplicated against live rows only
+        Index(
+            "ix_db_shortened_url_original_hash",
+            "original_hash",
+            unique=True,
+            postgresql_where=live,
+            sqlite_where=live,
+        ),
+        # Redirects by code are index-only scans on Postgres
+        Index(
+            "ix_db_shortened_url_code",
+            "code",
+            unique=True,
+            postgresql_include=["id", "original", "deleted"],
+        ),
+    )
+
     def __repr__(self):
         return f"ShortenedURL({self.value}, original={self.original})"
 
 
 class ShortenedURLUse(Base):
+    # On Postgres the table is range partitioned by month of `created_at`
+    # (see services.partitions), its primary key is (id, created_at)
     __tablename__ = "db_shortened_url_use"
     id = Column(Integer, primary_key=True)
     created_at = Column(
@@ -56,6 +112,16 @@ class ShortenedURLUse(Base):
     url = relationship("ShortenedURL", back_populates="uses")
     user = relationship("User", back_populates="short_url_uses")
 
+    __table_args__ = (
+        # Keyset pagination of a URL's history by (created_at, id)
+        Index(
+            "ix_db_shortened_url_use_url_id_created_at_id",
+            "url_id",
+            "created_at",
+            "id",
+        ),
+    )
+
     def __repr__(self):
         return (
             f"ShortenedURLUse(peer={self.host}:{self.port},"
@@ -67,7 +133,80 @@ class BlacklistedClient(Base):
     __tablename__ = "db_blacklisted_client"
     id = Column(Integer, primary_key=True)
     host = Column(IPAddressType)
+    prefix_length = Column(Integer, default=None, nullable=True)
     until = Column(DateTime, index=True, default=None, nullable=True)
 
+    @property
+    def network(self) -> IPv4Network | IPv6Network:
+        prefix_length = self.prefix_length
+        if prefix_length is None:
+            prefix_length = self.host.max_prefixlen
+        return ip_network((self.host, prefix_length), strict=False)
+
     def __repr__(self):
         return f"BlacklistedClient({self.host})"
+
+
+class IdCounter(Base):
+    __tablename__ = "db_id_counter"
+    name = Column(String(50), primary_key=True)
+    next_value = Column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"IdCounter({self.name}, next_value={self.next_value})"
+
+
+class ShortenedURLStats(Base):
+    __tablename__ = "db_shortened_url_stats"
+    url_id = Column(ForeignKey("db_shortened_url.id"), primary_key=True)
+    clicks = Column(BigInteger, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"ShortenedURLStats(url={self.url_id}, clicks={self.clicks})"
+
+
+class ShortenedURLUseRollup(Base):
+    __tablename__ = "db_shortened_url_use_rollup"
+    url_id = Column(ForeignKey("db_shortened_url.id"), primary_key=True)
+    granularity = Column(String(10), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    clicks = Column(BigInteger, default=0, nullable=False)
+    # HyperLogLog registers of visitors (host and user agent)
+    visitors = Column(LargeBinary, nullable=True)
+
+    def __repr__(self):
+        return (
+            f"ShortenedURLUseRollup(url={self.url_id},"
+            f" {self.granularity}={self.bucket}, clicks={self.clicks})"
+        )
+
+
+class ShortenedURLUseBreakdown(Base):
+    __tablename__ = "db_shortened_url_use_breakdown"
+    url_id = Column(ForeignKey("db_shortened_url.id"), primary_key=True)
+    dimension = Column(String(20), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    value = Column(String(1000), primary_key=True)
+    clicks = Column(BigInteger, default=0, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"ShortenedURLUseBreakdown(url={self.url_id}, {self.bucket},"
+            f" {self.dimension}={self.value}, clicks={self.clicks})"
+        )
+
+
+class InvalidationEvent(Base):
+    """Changed rows of cached tables, polled on backends without NOTIFY"""
+
+    __tablename__ = "db_invalidation_event"
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String(100), nullable=False)
+    # JSON list of changed rows' keys, null if any row may have changed
+    keys = Column(Text, nullable=True)
+    created_at = Column(
+        DateTime, index=True, default=func.now(), nullable=False
+    )
+
+    def __repr__(self):
+        return f"InvalidationEvent({self.id}, {self.table_name})"
@@ -1,17 +1,29 @@
 from datetime import datetime
 
-from pydantic import BaseModel, conint
-from pydantic.networks import IPv4Address
+from pydantic import BaseModel, conint, root_validator
+from pydantic.networks import IPvAnyAddress
 
 
 class BlacklistedClientCreate(BaseModel):
-    host: IPv4Address
+    host: IPvAnyAddress
+    prefix_length: conint(ge=0, le=128) | None = None
     until: datetime | None
 
+    @root_validator(skip_on_failure=True)
+    def check_prefix_length(cls, values):
+        host, prefix_length = values["host"], values.get("prefix_length")
+        if prefix_length is not None and prefix_length > host.max_prefixlen:
+            raise ValueError(
+                f"prefix_length must not exceed {host.max_prefixlen}"
+                f" for IPv{host.version}"
+            )
+        return values
+
 
 class BlacklistedClientInDB(BaseModel):
     id: conint(ge=0)
-    host: IPv4Address
+    host: IPvAnyAddress
+    prefix_length: conint(ge=0, le=128) | None
     until: datetime | None
 
     class Config:
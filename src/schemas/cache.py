@@ -0,0 +1,10 @@
+from pydantic import BaseModel, conint
+
+
+class CacheStatsRead(BaseModel):
+    size: conint(ge=0)
+    hits: conint(ge=0)
+    misses: conint(ge=0)
+    evictions: conint(ge=0)
+    expirations: conint(ge=0)
+    shared_hits: conint(ge=0)
@@ -0,0 +1,13 @@
+from pydantic import BaseModel, confloat, conint
+
+
+class PoolStatsRead(BaseModel):
+    pool: str
+    size: conint(ge=0) | None = None
+    checked_in: conint(ge=0) | None = None
+    checked_out: conint(ge=0) | None = None
+    overflow: int | None = None
+    waits: conint(ge=0) | None = None
+    wait_time: confloat(ge=0) | None = None
+    max_wait_time: confloat(ge=0) | None = None
+    timeouts: conint(ge=0) | None = None
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from pydantic import BaseModel, conint
+
+
+class ShortURLStatsBucket(BaseModel):
+    bucket: datetime
+    clicks: conint(ge=0)
+    visitors: conint(ge=0)
+
+
+class ShortURLStatsTopItem(BaseModel):
+    value: str
+    clicks: conint(ge=0)
+
+
+class ShortURLStatsRead(BaseModel):
+    granularity: str
+    clicks: conint(ge=0)
+    visitors: conint(ge=0)
+    buckets: list[ShortURLStatsBucket]
+    top_hosts: list[ShortURLStatsTopItem]
+    top_user_agents: list[ShortURLStatsTopItem]
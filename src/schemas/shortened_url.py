@@ -9,6 +9,7 @@ class ShortenedURLInDB(BaseModel):
     original: HttpUrl
     created_at: datetime
     deleted: bool
+    code: str | None
 
     class Config:
         orm_mode = True
@@ -1,12 +1,42 @@
+import base64
+import binascii
 import logging
-from typing import Any, Generic, Type, TypeVar
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Hashable,
+    Iterator,
+    NamedTuple,
+    Type,
+    TypeVar,
+)
 
+import orjson
 from pydantic import BaseModel
-from sqlalchemy import delete, insert, select, update
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    bindparam,
+    delete,
+    insert,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Result
+from sqlalchemy.exc import InterfaceError, OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.sql import functions
+from sqlalchemy.sql import Executable, Insert, functions
 
-from db.db import Base
+from core.config import app_settings
+from core.metrics import instrument_repository
+from db.db import Base, replica_router
+
+from .invalidation import KEYS_PER_MESSAGE, invalidation_bus
 
 logger = logging.getLogger(__name__)
 
@@ -28,20 +58,143 @@ class Repository:
         raise NotImplementedError
 
 
+def chunked(items: list, size: int) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(values: list[Any]) -> str:
+    """Opaque pagination cursor for the key of the last returned row"""
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode()
+
+
+def decode_cursor(cursor: str, columns: list) -> list[Any]:
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor))
+    except (binascii.Error, ValueError) as error:
+        raise InvalidCursorError("Malformed cursor") from error
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursorError("Cursor does not match the ordering")
+    try:
+        return [
+            _cursor_value(column, value)
+            for column, value in zip(columns, values)
+        ]
+    except (TypeError, ValueError) as error:
+        raise InvalidCursorError("Malformed cursor") from error
+
+
+def _cursor_value(column, value: Any) -> Any:
+    """Value of a cursor's JSON, checked against the column type"""
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    python_type = column.type.python_type
+    # JSON numbers may be integers for float columns, but not booleans
+    if python_type is float and type(value) is int:
+        return float(value)
+    if type(value) is not python_type:
+        raise TypeError(f"{column.name} must be {python_type.__name__}")
+    return value
+
+
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+class Page(NamedTuple, Generic[ModelType]):
+    items: list[ModelType]
+    next_cursor: str | None
+
+
 class RepositoryDB(
     Repository, Generic[ModelType, CreateSchemaType, UpdateSchemaType]
 ):
+    # Columns identifying changed rows to other processes,
+    # which cache the table; empty if none does
+    invalidation_keys: tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument_repository(cls)
+
     def __init__(self, model: Type[ModelType]):
         self._model = model
+        self._statements: dict[Hashable, Executable] = {}
+
+    def _statement(
+        self, key: Hashable, build: Callable[[], Executable]
+    ) -> Executable:
+        """
+        Statement built once per repository and `key`, with bound
+        parameters instead of values: neither the construct nor its
+        cache key is rebuilt on later calls
+        """
+        statement = self._statements.get(key)
+        if statement is None:
+            statement = self._statements[key] = build()
+        return statement
+
+    @staticmethod
+    def _filter_key(filter: dict[str, Any]) -> tuple[tuple[str, bool], ...]:
+        """Filtered columns and whether they are compared with NULL"""
+        return tuple((name, filter[name] is None) for name in sorted(filter))
+
+    def _filter_criteria(self, key: tuple[tuple[str, bool], ...]) -> list:
+        return [
+            getattr(self._model, name).is_(None)
+            if is_null
+            else getattr(self._model, name) == bindparam(f"filter_{name}")
+            for name, is_null in key
+        ]
+
+    @staticmethod
+    def _filter_params(filter: dict[str, Any]) -> dict[str, Any]:
+        return {
+            f"filter_{name}": value
+            for name, value in filter.items()
+            if value is not None
+        }
+
+    async def read(
+        self,
+        db: AsyncSession,
+        statement: Executable,
+        params: dict[str, Any] | None = None,
+    ) -> Result:
+        """
+        Execute a read-only statement on a replica, when one is configured
+        and the session has not written yet. If the replica is unreachable,
+        it is put aside and the statement goes to the primary
+        """
+        replica = replica_router.read_bind(db)
+        if replica is None:
+            return await db.execute(statement=statement, params=params)
+        try:
+            return await db.execute(
+                statement=statement,
+                params=params,
+                bind_arguments={"bind": replica},
+            )
+        except (OSError, OperationalError, InterfaceError) as error:
+            logger.error(error)
+            replica_router.mark_unhealthy(replica)
+            # Nothing ran on the primary: the session's state stays valid
+            return await db.execute(statement=statement, params=params)
 
     async def get(self, db: AsyncSession, id: Any) -> ModelType | None:
-        statement = select(self._model).where(self._model.id == id)
-        results = await db.execute(statement=statement)
+        statement = self._statement(
+            "get",
+            lambda: select(self._model).where(
+                self._model.id == bindparam("id")
+            ),
+        )
+        results = await self.read(db, statement, {"id": id})
         return results.scalar_one_or_none()
 
     async def get_multi(
@@ -53,17 +206,95 @@ class RepositoryDB(
         limit: int = 100,
     ) -> list[ModelType]:
         filter = filter or {}
-        statement = (
-            select(self._model).filter_by(**filter).offset(skip).limit(limit)
+        filter_key = self._filter_key(filter)
+        statement = self._statement(
+            ("get_multi", filter_key),
+            lambda: select(self._model)
+            .where(*self._filter_criteria(filter_key))
+            .order_by(*self._model.__table__.primary_key.columns)
+            .offset(bindparam("skip", type_=Integer))
+            .limit(bindparam("limit", type_=Integer)),
+        )
+        results = await self.read(
+            db,
+            statement,
+            {**self._filter_params(filter), "skip": skip, "limit": limit},
         )
-        results = await db.execute(statement=statement)
         return results.scalars().all()
 
+    async def get_page(
+        self,
+        db: AsyncSession,
+        *,
+        filter: dict[str, Any] = None,
+        order_by: tuple[str, ...] = ("id",),
+        cursor: str | None = None,
+        limit: int = 100,
+    ) -> Page[ModelType]:
+        """
+        Keyset pagination: rows strictly after `cursor` in ascending
+        `order_by` order, which must end with a unique column.
+        Every page costs the same index range scan, however deep it is
+        """
+        filter = filter or {}
+        columns = [getattr(self._model, name) for name in order_by]
+        filter_key = self._filter_key(filter)
+        statement = self._statement(
+            ("get_page", filter_key, order_by, cursor is not None),
+            lambda: self._page_statement(
+                filter_key, columns, after_cursor=cursor is not None
+            ),
+        )
+        params = {**self._filter_params(filter), "limit": limit + 1}
+        if cursor is not None:
+            values = decode_cursor(cursor, columns)
+            params.update(
+                (f"cursor_{number}", value)
+                for number, value in enumerate(values)
+            )
+        results = await self.read(db, statement, params)
+        items = results.scalars().all()
+        if len(items) <= limit:
+            return Page(items, None)
+        items = items[:limit]
+        last = items[-1]
+        return Page(
+            items,
+            encode_cursor([getattr(last, name) for name in order_by]),
+        )
+
+    def _page_statement(
+        self,
+        filter_key: tuple[tuple[str, bool], ...],
+        columns: list,
+        *,
+        after_cursor: bool,
+    ) -> Executable:
+        statement = select(self._model).where(
+            *self._filter_criteria(filter_key)
+        )
+        if after_cursor:
+            values = [
+                bindparam(f"cursor_{number}", type_=column.type)
+                for number, column in enumerate(columns)
+            ]
+            # The redundant bound on the leading column lets the planner
+            # prune partitions, which row value comparisons do not
+            statement = statement.where(
+                columns[0] >= values[0],
+                tuple_(*columns) > tuple_(*values),
+            )
+        return statement.order_by(*columns).limit(
+            bindparam("limit", type_=Integer)
+        )
+
     async def create(
         self, db: AsyncSession, *, object_in: CreateSchemaType | dict[str, Any]
     ) -> ModelType:
         db_object = self._model(**dict(object_in))
         db.add(db_object)
+        await db.flush()
+        await self._publish(db, [db_object])
         await db.commit()
         await db.refresh(db_object)
         return db_object
@@ -82,8 +313,63 @@ class RepositoryDB(
             statement=statement,
             params=[{**dict(object_in)} for object_in in objects_in],
         )
+        db_objects = results.all()
+        await self._publish(db, db_objects)
         await db.commit()
-        return results.all()
+        return db_objects
+
+    async def bulk_insert(
+        self,
+        db: AsyncSession,
+        objects_in: list[CreateSchemaType] | list[dict[str, Any]],
+    ) -> None:
+        """Single multi-row INSERT statement, returning nothing"""
+        if not objects_in:
+            return
+        statement = insert(self._model).values(
+            [dict(object_in) for object_in in objects_in]
+        )
+        await db.execute(statement=statement)
+        await self._publish(db, None)
+        await db.commit()
+
+    async def increment(
+        self,
+        db: AsyncSession,
+        *,
+        objects_in: list[dict[str, Any]],
+        index_elements: list[str],
+        columns: list[str],
+    ) -> None:
+        """
+        Upsert rows, adding `columns` of the conflicting rows to the stored
+        values. Rows are sorted by key to avoid deadlocks between
+        concurrent writers. Does not commit
+        """
+        if not objects_in:
+            return
+        await self._publish(db, None)
+        objects_in = sorted(
+            objects_in,
+            key=lambda object_in: [object_in[key] for key in index_elements],
+        )
+        for chunk in chunked(objects_in, app_settings.project_bulk_chunk_size):
+            statement = self._dialect_insert(db.get_bind().dialect.name)
+            statement = statement.values(chunk)
+            statement = statement.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={
+                    name: getattr(self._model, name) + statement.excluded[name]
+                    for name in columns
+                },
+            )
+            await db.execute(statement=statement)
+
+    def _dialect_insert(self, dialect: str) -> Insert:
+        """INSERT supporting ON CONFLICT clauses"""
+        if dialect == "postgresql":
+            return postgresql.insert(self._model)
+        return sqlite.insert(self._model)
 
     async def update(
         self,
@@ -100,6 +386,7 @@ class RepositoryDB(
             .values(**obj_in_data)
         )
         await db.execute(statement=statement)
+        await self._publish(db, [db_object])
         await db.commit()
         await db.refresh(db_object)
         return db_object
@@ -108,20 +395,77 @@ class RepositoryDB(
         filter = {"id": id} if id else {}
         statement = delete(self._model).filter_by(**filter)
         await db.execute(statement=statement)
+        await self._publish_keys(db, [filter] if id else None)
         await db.commit()
 
     async def count(
         self, db: AsyncSession, *, filter: dict[str, Any] = None
     ) -> int:
         filter = filter or {}
-        statement = (
-            select(self._model)
-            .filter_by(**filter)
-            .with_only_columns(*[functions.count()])
+        filter_key = self._filter_key(filter)
+        statement = self._statement(
+            ("count", filter_key),
+            lambda: select(functions.count())
+            .select_from(self._model)
+            .where(*self._filter_criteria(filter_key)),
         )
-        result = await db.execute(statement=statement)
+        result = await self.read(db, statement, self._filter_params(filter))
         return result.scalar()
 
+    async def copy_records(
+        self,
+        db: AsyncSession,
+        *,
+        table_name: str,
+        columns: list[str],
+        records: list[tuple],
+    ) -> None:
+        """
+        Load records with COPY into a temporary table shaped like the
+        model's `columns`. Postgres (asyncpg) only; the table is dropped
+        on commit
+        """
+        await db.execute(
+            text(
+                f"CREATE TEMP TABLE {table_name} ON COMMIT DROP AS"
+                f" SELECT {', '.join(columns)}"
+                f" FROM {self._model.__tablename__} WITH NO DATA"
+            )
+        )
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table_name, records=records, columns=columns
+        )
+
+    async def _publish(
+        self, db: AsyncSession, db_objects: list[Any] | None
+    ) -> None:
+        """
+        Publish changes of `db_objects` (None: of any row) to the
+        processes caching the table, on commit of `db`
+        """
+        if not self.invalidation_keys or db_objects is None:
+            await self._publish_keys(db, None)
+            return
+        keys = [
+            {name: getattr(db_object, name) for name in self.invalidation_keys}
+            for db_object in db_objects
+        ]
+        await self._publish_keys(db, keys)
+
+    async def _publish_keys(
+        self, db: AsyncSession, keys: list[dict[str, Any]] | None
+    ) -> None:
+        if not self.invalidation_keys:
+            return
+        table_name = self._model.__tablename__
+        if keys is None:
+            await invalidation_bus.publish(db, table_name, None)
+            return
+        for chunk in chunked(keys, KEYS_PER_MESSAGE):
+            await invalidation_bus.publish(db, table_name, chunk)
+
     async def get_current_time(self, db: AsyncSession) -> str:
         statement = select(functions.now())
         try:
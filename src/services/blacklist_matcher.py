@@ -0,0 +1,157 @@
+import asyncio
+import ipaddress
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from db.db import get_session
+from models.models import BlacklistedClient
+
+from .invalidation import invalidation_bus
+from .services import blacklist_service
+
+logger = logging.getLogger(__name__)
+
+IPNetwork = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+def _timestamp(moment: datetime) -> float:
+    """POSIX timestamp of a moment, naive ones being in UTC"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class PrefixTable:
+    """
+    Longest-prefix match table for a single IP version.
+    Networks are grouped by prefix length, so a lookup is one masked
+    hash probe per distinct prefix length: O(address width) at most,
+    independent of the number of stored networks
+    """
+
+    def __init__(self, width: int):
+        self._width = width
+        self._tables: dict[int, dict[int, float]] = {}
+        self._lengths: list[tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        return sum(len(table) for table in self._tables.values())
+
+    def add(self, network: IPNetwork, expires_at: float) -> None:
+        table = self._tables.setdefault(network.prefixlen, {})
+        key = int(network.network_address)
+        if expires_at > table.get(key, -math.inf):
+            table[key] = expires_at
+
+    def freeze(self) -> None:
+        """Precompute masks, longest prefix first"""
+        self._lengths = [
+            (length, self._mask(length))
+            for length in sorted(self._tables, reverse=True)
+        ]
+
+    def lookup(self, address: int, now: float) -> bool:
+        for length, mask in self._lengths:
+            expires_at = self._tables[length].get(address & mask)
+            if expires_at is not None and expires_at > now:
+                return True
+        return False
+
+    def _mask(self, length: int) -> int:
+        return ((1 << length) - 1) << (self._width - length)
+
+
+def _timestamp(moment: datetime) -> float:
+    """POSIX timestamp of a moment, naive ones being in UTC"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class BlacklistMatcher:
+    """
+    In-process copy of the blacklist.
+    It is reloaded from the database at most once per `refresh_interval`
+    seconds, or on the next request after `invalidate()`
+    """
+
+    def __init__(self, refresh_interval: float):
+        self._refresh_interval = refresh_interval
+        self._tables = {4: PrefixTable(32), 6: PrefixTable(128)}
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(table) for table in self._tables.values())
+
+    @property
+    def is_stale(self) -> bool:
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at >= self._refresh_interval
+        )
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def load(
+        self, entries: Iterable[tuple[IPNetwork, datetime | None]]
+    ) -> None:
+        tables = {4: PrefixTable(32), 6: PrefixTable(128)}
+        for network, until in entries:
+            expires_at = _timestamp(until) if until else math.inf
+            tables[network.version].add(network, expires_at)
+        for table in tables.values():
+            table.freeze()
+        self._tables = tables
+        self._loaded_at = time.monotonic()
+
+    async def refresh(self, db: AsyncSession) -> None:
+        clients = await blacklist_service.get_active(db=db)
+        self.load((client.network, client.until) for client in clients)
+        logger.debug("Blacklist reloaded: %d networks", len(self))
+
+    async def ensure_fresh(self, db: AsyncSession | None = None) -> None:
+        """
+        Reload the blacklist if it is stale, with the given session
+        (which is released afterwards) or a new one
+        """
+        if not self.is_stale:
+            return
+        async with self._lock:
+            if not self.is_stale:
+                return
+            if db is not None:
+                await self.refresh(db)
+                await db.close()
+                return
+            async for db in get_session():
+                await self.refresh(db)
+
+    def is_blacklisted(self, host: str | None) -> bool:
+        if not host:
+            return False
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        table = self._tables[address.version]
+        return table.lookup(int(address), time.time())
+
+
+blacklist_matcher = BlacklistMatcher(
+    refresh_interval=app_settings.project_blacklist_refresh_interval
+)
+# Reload on the next request after other processes change the blacklist
+invalidation_bus.subscribe(
+    BlacklistedClient.__tablename__,
+    lambda keys: blacklist_matcher.invalidate(),
+)
@@ -0,0 +1,60 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Set membership sketch without false negatives: `capacity` items fit
+    with a false positive rate of `error_rate`, beyond that the rate
+    grows (see `false_positive_rate`)
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def __len__(self) -> int:
+        """Number of added items, repeated ones included"""
+        return self._count
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self._bits[index >> 3] & (1 << (index & 7))
+            for index in self._indexes(value)
+        )
+
+    @property
+    def false_positive_rate(self) -> float:
+        """Expected false positive rate with the items added so far"""
+        return (1 - math.exp(-self.hashes * self._count / self.size)) ** (
+            self.hashes
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def add(self, value: str) -> None:
+        for index in self._indexes(value):
+            self._bits[index >> 3] |= 1 << (index & 7)
+        self._count += 1
+
+    def _indexes(self, value: str) -> list[int]:
+        """Double hashing: `hashes` indexes out of one 128-bit digest"""
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        return [
+            (first + number * second) % self.size
+            for number in range(self.hashes)
+        ]
@@ -0,0 +1,109 @@
+import csv
+import logging
+from typing import AsyncIterator, Callable
+from urllib.parse import urlsplit
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+MAX_LINE_LENGTH = 64 * 1024
+MAX_URL_LENGTH = 1000
+CSV_HEADERS = {"original_url", "original-url", "url"}
+
+
+class BulkImportError(Exception):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines, holding at most one line in memory"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        if b"\n" not in chunk and len(buffer) <= MAX_LINE_LENGTH:
+            continue
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+        if len(buffer) > MAX_LINE_LENGTH:
+            raise BulkImportError(
+                f"Line is longer than {MAX_LINE_LENGTH} bytes"
+            )
+    if buffer:
+        yield buffer
+
+
+def validate_url(url: str) -> str:
+    url = url.strip()
+    if len(url) > MAX_URL_LENGTH:
+        raise ValueError(f"URL is longer than {MAX_URL_LENGTH} characters")
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        raise ValueError("invalid or missing URL scheme")
+    return url
+
+
+def parse_ndjson_line(line: bytes) -> str | None:
+    """`{"original_url": "..."}` or a bare JSON string"""
+    if not line.strip():
+        return None
+    try:
+        data = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        raise ValueError("invalid JSON")
+    if isinstance(data, dict):
+        data = data.get("original_url")
+    if not isinstance(data, str):
+        raise ValueError("field required: original_url")
+    return validate_url(data)
+
+
+def parse_csv_line(line: bytes) -> str | None:
+    """URL is the first column, an optional header row is skipped"""
+    row = next(csv.reader([line.decode().rstrip("\r")]), None)
+    if not row or not row[0].strip() or row[0].strip() in CSV_HEADERS:
+        return None
+    return validate_url(row[0])
+
+
+def get_line_parser(content_type: str) -> Callable[[bytes], str | None]:
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return parse_csv_line
+    if media_type in (
+        "application/x-ndjson",
+        "application/ndjson",
+        "application/jsonl",
+        "application/json-lines",
+    ):
+        return parse_ndjson_line
+    raise BulkImportError(f"Unsupported media type: {media_type}")
+
+
+async def iter_url_chunks(
+    chunks: AsyncIterator[bytes],
+    parse_line: Callable[[bytes], str | None],
+    chunk_size: int,
+) -> AsyncIterator[tuple[list[tuple[int, str]], list[dict]]]:
+    """
+    Yield chunks of parsed `(line number, URL)` pairs along with the
+    errors of lines, which could not be parsed, as soon as either holds
+    `chunk_size` items
+    """
+    urls, errors = [], []
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        try:
+            url = parse_line(line)
+        except (ValueError, UnicodeDecodeError) as error:
+            errors.append({"line": line_number, "error": str(error)})
+            url = None
+        if url is not None:
+            urls.append((line_number, url))
+        if len(urls) >= chunk_size or len(errors) >= chunk_size:
+            yield urls, errors
+            urls, errors = [], []
+    if urls or errors:
+        yield urls, errors
@@ -0,0 +1,272 @@
+import asyncio
+import importlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    NamedTuple,
+    TypeVar,
+)
+
+import orjson
+
+from core.config import app_settings
+from models.models import ShortenedURL
+
+from .invalidation import Keys, invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ValueType = TypeVar("ValueType")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    shared_hits: int = 0
+
+    def asdict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class CacheBackend:
+    """Shared (out-of-process) cache tier, storing bytes"""
+
+    async def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Local stand-in for a shared cache tier"""
+
+    def __init__(self):
+        self._data: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        expires_at, value = self._data.get(key, (0.0, None))
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+
+class LRUCache(Generic[KeyType, ValueType]):
+    """Bounded in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self._max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[
+            KeyType, tuple[float, ValueType]
+        ] = OrderedDict()
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: KeyType) -> ValueType | None:
+        item = self._data.get(key)
+        if item is None:
+            self.stats.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: KeyType, value: ValueType) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._max_size:
+            self._data.popitem(last=False)
+            self.stats.evictions += 1
+
+    def delete(self, key: KeyType) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class ReadThroughCache(Generic[KeyType, ValueType]):
+    """
+    Two-tier read-through cache: in-process LRU first, then the optional
+    shared backend, then `loader`. Missing values (None) are not cached.
+    Concurrent misses for the same key share one `loader` call
+    """
+
+    def __init__(
+        self,
+        *,
+        namespace: str,
+        local: LRUCache[KeyType, ValueType],
+        shared: CacheBackend | None = None,
+        encode: Callable[[ValueType], bytes] = orjson.dumps,
+        decode: Callable[[bytes], ValueType] = orjson.loads,
+    ):
+        self._namespace = namespace
+        self.local = local
+        self.shared = shared
+        self._encode = encode
+        self._decode = decode
+        self._pending: dict[KeyType, asyncio.Future] = {}
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.local.stats
+
+    async def get(
+        self,
+        key: KeyType,
+        loader: Callable[[], Awaitable[ValueType | None]],
+    ) -> ValueType | None:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        pending = self._pending.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Load anew if the sharing call was cancelled, not this one
+                cancelling = asyncio.current_task().cancelling()
+                if cancelling or not pending.cancelled():
+                    raise
+                return await self.get(key, loader)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await self._load(key, loader)
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            del self._pending[key]
+        return value
+
+    async def invalidate(self, key: KeyType) -> None:
+        self.local.delete(key)
+        if self.shared is not None:
+            await self.shared.delete(self._shared_key(key))
+
+    def clear(self) -> None:
+        self.local.clear()
+
+    async def _load(
+        self,
+        key: KeyType,
+        loader: Callable[[], Awaitable[ValueType | None]],
+    ) -> ValueType | None:
+        if self.shared is not None:
+            data = await self.shared.get(self._shared_key(key))
+            if data is not None:
+                self.stats.shared_hits += 1
+                value = self._decode(data)
+                self.local.set(key, value)
+                return value
+        value = await loader()
+        if value is None:
+            return None
+        self.local.set(key, value)
+        if self.shared is not None:
+            await self.shared.set(
+                self._shared_key(key), self._encode(value), self.local.ttl
+            )
+        return value
+
+    def _shared_key(self, key: KeyType) -> str:
+        return f"{self._namespace}:{key}"
+
+
+def load_backend(path: str | None) -> CacheBackend | None:
+    """Instantiate shared cache backend by its dotted path"""
+    if not path:
+        return None
+    module_name, _, class_name = path.rpartition(".")
+    module = importlib.import_module(module_name)
+    backend_class: Any = getattr(module, class_name)
+    logger.info("Using shared cache backend %s", path)
+    return backend_class()
+
+
+class RedirectTarget(NamedTuple):
+    original: str
+    deleted: bool
+
+
+class CodeRedirectTarget(NamedTuple):
+    id: int
+    original: str
+    deleted: bool
+
+
+redirect_cache: ReadThroughCache[int, RedirectTarget] = ReadThroughCache(
+    namespace="redirect",
+    local=LRUCache(
+        max_size=app_settings.project_redirect_cache_size,
+        ttl=app_settings.project_redirect_cache_ttl,
+    ),
+    shared=load_backend(app_settings.project_redirect_cache_backend),
+    encode=lambda target: orjson.dumps(tuple(target)),
+    decode=lambda data: RedirectTarget(*orjson.loads(data)),
+)
+code_redirect_cache: ReadThroughCache[
+    str, CodeRedirectTarget
+] = ReadThroughCache(
+    namespace="redirect_code",
+    local=LRUCache(
+        max_size=app_settings.project_redirect_cache_size,
+        ttl=app_settings.project_redirect_cache_ttl,
+    ),
+    shared=load_backend(app_settings.project_redirect_cache_backend),
+    encode=lambda target: orjson.dumps(tuple(target)),
+    decode=lambda data: CodeRedirectTarget(*orjson.loads(data)),
+)
+
+
+def evict_redirect_targets(keys: Keys) -> None:
+    """Drop targets of short URLs changed by any process from this one"""
+    if keys is None:
+        redirect_cache.clear()
+        code_redirect_cache.clear()
+        return
+    for key in keys:
+        redirect_cache.local.delete(key["id"])
+        if key.get("code") is not None:
+            code_redirect_cache.local.delete(key["code"])
+
+
+invalidation_bus.subscribe(ShortenedURL.__tablename__, evict_redirect_targets)
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Literal, NamedTuple
+
+from core.config import app_settings
+from db.db import get_session
+
+from .services import url_use_service
+
+logger = logging.getLogger(__name__)
+
+OverflowPolicy = Literal["block", "drop_newest", "drop_oldest"]
+
+
+class ClickEvent(NamedTuple):
+    url_id: int
+    host: str
+    port: int
+    user_agent: str
+    created_at: datetime
+
+
+@dataclass
+class ClickLoggerStats:
+    accepted: int = 0
+    dropped: int = 0
+    written: int = 0
+    failed: int = 0
+
+    def asdict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class ClickLogger:
+    """
+    Bounded in-process queue of URL uses.
+    A background writer flushes it with multi-row INSERTs every
+    `flush_interval` seconds or as soon as `batch_size` events are queued.
+    When the queue is full, `overflow` decides what happens to new events:
+    wait up to `block_timeout` seconds for free space, drop the new event
+    or drop the oldest queued one
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        overflow: OverflowPolicy = "drop_newest",
+        block_timeout: float = 0.05,
+    ):
+        self._queue: asyncio.Queue[ClickEvent] = asyncio.Queue(max_size)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._overflow = overflow
+        self._block_timeout = block_timeout
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._closed = False
+        self.stats = ClickLoggerStats()
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, event: ClickEvent) -> bool:
+        """Enqueue event, return False if it was dropped"""
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            if not await self._handle_overflow(event):
+                self.stats.dropped += 1
+                return False
+        self.stats.accepted += 1
+        if self._wakeup is not None and len(self) >= self._batch_size:
+            self._wakeup.set()
+        return True
+
+    async def flush(self) -> int:
+        """Write all queued events, return the number of written ones"""
+        written = 0
+        while not self._queue.empty():
+            size = min(self._batch_size, self._queue.qsize())
+            batch = [self._queue.get_nowait() for _ in range(size)]
+            written += await self._write(batch)
+        return written
+
+    def start(self) -> None:
+        self._closed = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop background writer, draining the queue"""
+        self._closed = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=self._flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _handle_overflow(self, event: ClickEvent) -> bool:
+        if self._overflow == "drop_oldest":
+            self._queue.get_nowait()
+            self.stats.dropped += 1
+            self._queue.put_nowait(event)
+            return True
+        if self._overflow == "block":
+            try:
+                await asyncio.wait_for(
+                    self._queue.put(event), timeout=self._block_timeout
+                )
+                return True
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    async def _write(self, batch: list[ClickEvent]) -> int:
+        try:
+            async for db in get_session():
+                await url_use_service.record(
+                    db=db, objects_in=[event._asdict() for event in batch]
+                )
+        except Exception:
+            logger.exception("Failed to log %d URL uses", len(batch))
+            self.stats.failed += len(batch)
+            return 0
+        logger.debug("Logged %d URL uses", len(batch))
+        self.stats.written += len(batch)
+        return len(batch)
+
+
+click_logger = ClickLogger(
+    max_size=app_settings.project_click_queue_size,
+    batch_size=app_settings.project_click_batch_size,
+    flush_interval=app_settings.project_click_flush_interval_ms / 1000,
+    overflow=app_settings.project_click_overflow,
+)
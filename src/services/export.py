@@ -0,0 +1,48 @@
+import csv
+import io
+from typing import AsyncIterator, Callable, Literal, Sequence
+
+import orjson
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def encode_ndjson(columns: Sequence[str], rows: Sequence[tuple]) -> bytes:
+    """One JSON object per row, serialized straight from row tuples"""
+    return b"".join(
+        orjson.dumps(dict(zip(columns, row)), option=orjson.OPT_APPEND_NEWLINE)
+        for row in rows
+    )
+
+
+def encode_csv(columns: Sequence[str], rows: Sequence[tuple]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def csv_header(columns: Sequence[str]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue().encode()
+
+
+ENCODERS: dict[str, Callable[[Sequence[str], Sequence[tuple]], bytes]] = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+}
+
+
+async def export_rows(
+    columns: Sequence[str],
+    partitions: AsyncIterator[Sequence[tuple]],
+    format: ExportFormat,
+) -> AsyncIterator[bytes]:
+    """Encode row partitions one by one, holding a single one in memory"""
+    encode = ENCODERS[format]
+    if format == "csv":
+        yield csv_header(columns)
+    async for rows in partitions:
+        yield encode(columns, rows)
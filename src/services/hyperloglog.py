@@ -0,0 +1,54 @@
+import hashlib
+import math
+
+
+class HyperLogLog:
+    """
+    Cardinality sketch of `2 ** precision` one-byte registers.
+    Standard error is about 1.04 / sqrt(2 ** precision), sketches of the
+    same precision are merged with a register-wise maximum
+    """
+
+    def __init__(self, precision: int = 10, registers: bytes | None = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        size = 1 << precision
+        if registers is not None and len(registers) != size:
+            raise ValueError(
+                f"Expected {size} registers, got {len(registers)}"
+            )
+        self._registers = bytearray(registers or size)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(int(math.log2(len(data))), data)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._registers)
+
+    def add(self, value: str) -> None:
+        digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        index = hashed >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rest = hashed & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        self._registers = bytearray(
+            map(max, self._registers, other._registers)
+        )
+
+    def estimate(self) -> int:
+        size = len(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        raw = alpha * size**2 / sum(2.0**-rank for rank in self._registers)
+        zeros = self._registers.count(0)
+        if raw <= 2.5 * size and zeros:
+            return round(size * math.log(size / zeros))
+        return round(raw)
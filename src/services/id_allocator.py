@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+from core.config import app_settings
+from db.db import get_session
+
+from .services import id_counter_service
+
+logger = logging.getLogger(__name__)
+
+
+class IdAllocator:
+    """
+    Hi/lo allocator: leases blocks of `block_size` IDs from a database
+    counter and hands them out from memory.
+    A lease is committed before any ID of it is used, so a crashed
+    process only wastes the rest of its block and never reuses IDs
+    """
+
+    def __init__(self, name: str, block_size: int):
+        self._name = name
+        self._block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def remaining(self) -> int:
+        return self._end - self._next
+
+    async def next_id(self) -> int:
+        while self._next >= self._end:
+            await self._lease()
+        value = self._next
+        self._next += 1
+        return value
+
+    def reset(self) -> None:
+        """Forget the current block"""
+        self._next = self._end = 0
+
+    async def _lease(self) -> None:
+        async with self._lock:
+            if self._next < self._end:
+                return
+            async for db in get_session():
+                start = await id_counter_service.lease(
+                    db=db, name=self._name, size=self._block_size
+                )
+            self._next, self._end = start, start + self._block_size
+            logger.debug(
+                "Leased %s IDs [%d, %d)", self._name, self._next, self._end
+            )
+
+
+short_url_id_allocator = IdAllocator(
+    "short_url", block_size=app_settings.project_id_block_size
+)
+worker_id_allocator = IdAllocator("snowflake_worker", block_size=1)
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+import orjson
+from sqlalchemy import bindparam, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from db.db import engine, new_session
+from models.models import InvalidationEvent
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache_invalidation"
+# Keys per message, to stay under the 8000 bytes limit of NOTIFY payloads
+KEYS_PER_MESSAGE = 100
+
+Keys = list[dict[str, Any]] | None
+Handler = Callable[[Keys], None]
+
+
+@dataclass
+class InvalidationStats:
+    published: int = 0
+    received: int = 0
+    reconnects: int = 0
+
+    def asdict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class InvalidationBus:
+    """
+    Tells every process which rows of the tables it caches have changed.
+    Changes are published in the writing transaction, so they are only
+    delivered once committed: with NOTIFY on Postgres, otherwise as rows
+    of the events table, polled every `poll_interval` seconds and kept
+    for `retention` seconds.
+    Handlers get the changed rows' keys, or None if any row may have
+    changed: after a lost listener connection, for example
+    """
+
+    def __init__(self, *, poll_interval: float, retention: float):
+        self._poll_interval = poll_interval
+        self._retention = retention
+        self._handlers: dict[str, list[Handler]] = {}
+        self._last_id: int | None = None
+        self._pruned_at = 0.0
+        self._task: asyncio.Task | None = None
+        self._live = False
+        self.stats = InvalidationStats()
+
+    @property
+    def live(self) -> bool:
+        """Whether changes made by other processes are being delivered"""
+        return self._live
+
+    def subscribe(self, table_name: str, handler: Handler) -> None:
+        self._handlers.setdefault(table_name, []).append(handler)
+
+    async def publish(
+        self, db: AsyncSession, table_name: str, keys: Keys
+    ) -> None:
+        """
+        Publish changes of `table_name` on commit of `db`, up to
+        `KEYS_PER_MESSAGE` keys at once
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            payload = orjson.dumps({"table": table_name, "keys": keys})
+            await db.execute(select(func.pg_notify(CHANNEL, payload.decode())))
+        else:
+            await db.execute(
+                insert(InvalidationEvent).values(
+                    table_name=table_name,
+                    keys=None if keys is None else orjson.dumps(keys),
+                )
+            )
+        self.stats.published += 1
+
+    def dispatch(self, table_name: str, keys: Keys) -> None:
+        self.stats.received += 1
+        for handler in self._handlers.get(table_name, ()):
+            try:
+                handler(keys)
+            except Exception:
+                logger.exception("%s invalidation failed", table_name)
+
+    def dispatch_all(self) -> None:
+        for table_name in self._handlers:
+            self.dispatch(table_name, None)
+
+    async def poll(self, db: AsyncSession) -> None:
+        """
+        Dispatch events committed since the last poll, drop expired ones
+        once per `retention`. The first poll only skips existing events
+        """
+        if self._last_id is None:
+            result = await db.execute(select(func.max(InvalidationEvent.id)))
+            self._last_id = result.scalar() or 0
+            return
+        result = await db.execute(
+            select(
+                InvalidationEvent.id,
+                InvalidationEvent.table_name,
+                InvalidationEvent.keys,
+            )
+            .where(InvalidationEvent.id > bindparam("last_id"))
+            .order_by(InvalidationEvent.id),
+            {"last_id": self._last_id},
+        )
+        for event in result:
+            self._last_id = event.id
+            keys = None if event.keys is None else orjson.loads(event.keys)
+            self.dispatch(event.table_name, keys)
+        if time.monotonic() - self._pruned_at < self._retention:
+            return
+        await db.execute(
+            delete(InvalidationEvent).where(
+                InvalidationEvent.created_at
+                < datetime.utcnow() - timedelta(seconds=self._retention)
+            )
+        )
+        await db.commit()
+        self._pruned_at = time.monotonic()
+
+    def start(self) -> None:
+        if engine.dialect.name == "postgresql":
+            self._task = asyncio.create_task(self._listen())
+        else:
+            self._task = asyncio.create_task(self._run_polls())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._live = False
+
+    async def _listen(self) -> None:
+        """Keep a LISTEN connection, reconnect when it is lost"""
+        connected_before = False
+        while True:
+            try:
+                async with engine.connect() as connection:
+                    raw_connection = await connection.get_raw_connection()
+                    listener = raw_connection.driver_connection
+                    closed = asyncio.Event()
+                    listener.add_termination_listener(lambda _: closed.set())
+                    await listener.add_listener(CHANNEL, self._on_notify)
+                    if connected_before:
+                        # Changes are lost while disconnected
+                        self.stats.reconnects += 1
+                        self.dispatch_all()
+                    connected_before = True
+                    self._live = True
+                    try:
+                        await closed.wait()
+                    finally:
+                        self._live = False
+                        if not listener.is_closed():
+                            await listener.remove_listener(
+                                CHANNEL, self._on_notify
+                            )
+            except Exception:
+                logger.exception("Invalidation listener failed")
+            await asyncio.sleep(self._poll_interval)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        message = orjson.loads(payload)
+        self.dispatch(message["table"], message["keys"])
+
+    async def _run_polls(self) -> None:
+        while True:
+            try:
+                async with new_session() as db:
+                    await self.poll(db)
+                # Events stay in the table, so none are lost from now on
+                self._live = True
+            except Exception:
+                logger.exception("Invalidation poll failed")
+            await asyncio.sleep(self._poll_interval)
+
+
+invalidation_bus = InvalidationBus(
+    poll_interval=app_settings.project_invalidation_poll_interval,
+    retention=app_settings.project_invalidation_retention,
+)
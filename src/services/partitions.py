@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from db.db import get_session
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = "db_shortened_url_use"
+PARTITION_PREFIX = f"{PARTITIONED_TABLE}_p"
+# Arbitrary constant key of the advisory lock serializing maintenance
+MAINTENANCE_LOCK_KEY = 0x5EED_C11C
+
+
+def month_start(moment: date | datetime) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def partition_month(name: str) -> date | None:
+    """Month of a partition by its name, None for foreign tables"""
+    suffix = name.removeprefix(PARTITION_PREFIX)
+    if suffix == name or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return date(int(suffix[:4]), int(suffix[4:]), 1)
+
+
+def create_partition_ddl(month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)}"
+        f" PARTITION OF {PARTITIONED_TABLE}"
+        f" FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+    )
+
+
+class PartitionMaintainer:
+    """
+    Keeps monthly range partitions of the URL use table on Postgres:
+    creates `ahead` months of future partitions and detaches or drops
+    the ones older than `retention_months`. Other backends and
+    a not yet partitioned table are left as is
+    """
+
+    def __init__(
+        self,
+        *,
+        ahead: int,
+        retention_months: int | None,
+        retention_action: str,
+        interval: float,
+    ):
+        self._ahead = ahead
+        self._retention_months = retention_months
+        self._retention_action = retention_action
+        self._interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def maintain(
+        self, db: AsyncSession, today: date | None = None
+    ) -> tuple[list[str], list[str]]:
+        """Create and expire partitions, return their names"""
+        if db.get_bind().dialect.name != "postgresql":
+            return [], []
+        if not await self._is_partitioned(db):
+            logger.warning("%s is not partitioned", PARTITIONED_TABLE)
+            return [], []
+        await db.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"),
+            {"key": MAINTENANCE_LOCK_KEY},
+        )
+        current = month_start(today or date.today())
+        existing = await self._get_partitions(db)
+        created = []
+        for offset in range(self._ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(month) not in existing:
+                await db.execute(text(create_partition_ddl(month)))
+                created.append(partition_name(month))
+        expired = []
+        if self._retention_months is not None:
+            cutoff = add_months(current, -self._retention_months)
+            for name in sorted(existing):
+                month = partition_month(name)
+                if month is not None and month < cutoff:
+                    await db.execute(text(self._expire_ddl(name)))
+                    expired.append(name)
+        await db.commit()
+        if created or expired:
+            logger.info(
+                "Partitions created: %s, %s: %s",
+                created,
+                self._retention_action,
+                expired,
+            )
+        return created, expired
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async for db in get_session():
+                    await self.maintain(db)
+            except Exception:
+                logger.exception("Partition maintenance failed")
+            await asyncio.sleep(self._interval)
+
+    def _expire_ddl(self, name: str) -> str:
+        if self._retention_action == "drop":
+            return f"DROP TABLE {name}"
+        return f"ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {name}"
+
+    @staticmethod
+    async def _is_partitioned(db: AsyncSession) -> bool:
+        result = await db.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table"
+                " WHERE partrelid = CAST(:table AS regclass)"
+            ),
+            {"table": PARTITIONED_TABLE},
+        )
+        return result.scalar() is not None
+
+    @staticmethod
+    async def _get_partitions(db: AsyncSession) -> set[str]:
+        result = await db.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits"
+                " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+                " WHERE pg_inherits.inhparent = CAST(:table AS regclass)"
+            ),
+            {"table": PARTITIONED_TABLE},
+        )
+        return set(result.scalars())
+
+
+partition_maintainer = PartitionMaintainer(
+    ahead=app_settings.project_click_partitions_ahead,
+    retention_months=app_settings.project_click_retention_months,
+    retention_action=app_settings.project_click_retention_action,
+    interval=app_settings.project_partition_maintenance_interval,
+)
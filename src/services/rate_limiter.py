@@ -0,0 +1,208 @@
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Literal
+
+from core.config import app_settings
+from db.db import new_session
+from schemas.blacklist import BlacklistedClientCreate
+
+from .blacklist_matcher import blacklist_matcher
+from .cache import LRUCache, load_backend
+from .services import blacklist_service
+
+logger = logging.getLogger(__name__)
+
+RouteClass = Literal["redirect", "create", "status"]
+API_PREFIX = "/api/v1"
+# Method, path pattern, route class; other routes are not limited
+ROUTE_CLASSES: list[tuple[set[str], re.Pattern, RouteClass]] = [
+    ({"GET", "HEAD"}, re.compile(rf"{API_PREFIX}/-?\d+"), "redirect"),
+    ({"GET", "HEAD"}, re.compile(r"/[0-9A-Za-z_-]{1,16}"), "redirect"),
+    ({"POST"}, re.compile(rf"{API_PREFIX}/(shorten(/stream)?)?"), "create"),
+    (
+        {"GET"},
+        re.compile(rf"{API_PREFIX}/(export|[^/]+/(status|stats))"),
+        "status",
+    ),
+]
+
+
+def classify(method: str, path: str) -> RouteClass | None:
+    for methods, pattern, route_class in ROUTE_CLASSES:
+        if method in methods and pattern.fullmatch(path):
+            return route_class
+    return None
+
+
+@dataclass
+class RateLimitStats:
+    allowed: int = 0
+    limited: int = 0
+    bans: int = 0
+
+    def asdict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class RateLimitBackend:
+    """Shared (out-of-process) token bucket store"""
+
+    async def acquire(
+        self, key: str, rate: float, burst: float
+    ) -> float | None:
+        """
+        Take a token from the bucket `key`, refilled with `rate` tokens
+        per second up to `burst`. Return None if taken, otherwise
+        seconds until the next token
+        """
+        raise NotImplementedError
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Token buckets of this process, the least recently used ones are
+    dropped beyond `max_keys`. Also a local stand-in for a shared backend
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self._max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def acquire(
+        self, key: str, rate: float, burst: float
+    ) -> float | None:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        retry_after = None
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self._max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+class RateLimiter:
+    """
+    Token bucket limits per client host and route class.
+    Buckets live in this process, or in the `shared` backend if set.
+    A client limited `ban_after` times within `ban_window` seconds is
+    blacklisted for `ban_duration` seconds, doubled for each earlier ban
+    within `ban_max_duration` seconds, but not longer than that
+    """
+
+    def __init__(
+        self,
+        *,
+        limits: dict[str, float],
+        burst: float,
+        ban_after: int | None,
+        ban_window: float,
+        ban_duration: float,
+        ban_max_duration: float,
+        shared: RateLimitBackend | None = None,
+    ):
+        self._limits = limits
+        self._burst = burst
+        self._ban_after = ban_after
+        self._ban_window = ban_window
+        self._ban_duration = ban_duration
+        self._ban_max_duration = ban_max_duration
+        self.local = InMemoryRateLimitBackend()
+        self.shared = shared
+        # Host: (start of the window, limited requests)
+        self._violations: LRUCache[str, tuple[float, int]] = LRUCache(
+            max_size=100_000, ttl=ban_window
+        )
+        # Host: bans so far
+        self._bans: LRUCache[str, int] = LRUCache(
+            max_size=100_000, ttl=ban_max_duration
+        )
+        self.stats: dict[str, RateLimitStats] = {
+            route_class: RateLimitStats() for route_class in limits
+        }
+
+    async def hit(self, route_class: RouteClass, host: str) -> float | None:
+        """
+        Count a request, blacklist the client if it is limited too often.
+        Return None if the request is allowed, otherwise seconds until
+        it would be
+        """
+        rate = self._limits.get(route_class)
+        if rate is None:
+            return None
+        backend = self.shared or self.local
+        retry_after = await backend.acquire(
+            f"{route_class}:{host}", rate, rate * self._burst
+        )
+        stats = self.stats[route_class]
+        if retry_after is None:
+            stats.allowed += 1
+            return None
+        stats.limited += 1
+        until = self._record_violation(host)
+        if until is not None:
+            stats.bans += 1
+            try:
+                await self.ban(host, until)
+            except Exception:
+                logger.exception("Host %s is not blacklisted", host)
+        return retry_after
+
+    async def ban(self, host: str, until: datetime) -> None:
+        async with new_session() as db:
+            await blacklist_service.create(
+                db=db,
+                object_in=BlacklistedClientCreate(host=host, until=until),
+            )
+        blacklist_matcher.invalidate()
+        logger.warning(
+            "Host %s exceeds rate limits: blacklisted until %s",
+            host,
+            until.ctime(),
+        )
+
+    def clear(self) -> None:
+        self.local.clear()
+        self._violations.clear()
+        self._bans.clear()
+
+    def _record_violation(self, host: str) -> datetime | None:
+        """Blacklisting deadline, if the client is limited too often"""
+        if self._ban_after is None:
+            return None
+        now = time.monotonic()
+        started_at, count = self._violations.get(host) or (now, 0)
+        if now - started_at > self._ban_window:
+            started_at, count = now, 0
+        count += 1
+        if count < self._ban_after:
+            self._violations.set(host, (started_at, count))
+            return None
+        # Requests in flight meanwhile start counting anew
+        self._violations.delete(host)
+        bans = self._bans.get(host) or 0
+        self._bans.set(host, bans + 1)
+        duration = min(self._ban_duration * 2**bans, self._ban_max_duration)
+        return datetime.utcnow() + timedelta(seconds=duration)
+
+
+rate_limiter = RateLimiter(
+    limits=app_settings.project_rate_limits,
+    burst=app_settings.project_rate_limit_burst,
+    ban_after=app_settings.project_rate_limit_ban_after,
+    ban_window=app_settings.project_rate_limit_ban_window,
+    ban_duration=app_settings.project_rate_limit_ban_duration,
+    ban_max_duration=app_settings.project_rate_limit_ban_max_duration,
+    shared=load_backend(app_settings.project_rate_limit_backend),
+)
@@ -0,0 +1,60 @@
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, Literal
+
+from .hyperloglog import HyperLogLog
+from .user_agents import user_agent_family
+
+Granularity = Literal["minute", "hour", "day"]
+Dimension = Literal["host", "user_agent"]
+
+# Breakdowns by dimension grow with the number of distinct values,
+# so they are only kept per day
+BREAKDOWN_GRANULARITY: Granularity = "day"
+VISITOR_SKETCH_PRECISION = 10
+
+
+def truncate(moment: datetime, granularity: Granularity) -> datetime:
+    """Start of the time bucket containing `moment`"""
+    moment = moment.replace(second=0, microsecond=0)
+    if granularity == "minute":
+        return moment
+    moment = moment.replace(minute=0)
+    if granularity == "hour":
+        return moment
+    return moment.replace(hour=0)
+
+
+class ClickAggregate:
+    """
+    Per-URL click counters, per-bucket clicks and visitor sketches
+    and per-day breakdowns of a batch of URL uses, ready to be added
+    to the aggregate tables
+    """
+
+    def __init__(self, granularities: Iterable[Granularity]):
+        self._granularities = tuple(granularities)
+        self.clicks: Counter[int] = Counter()
+        self.buckets: Counter[tuple[int, str, datetime]] = Counter()
+        self.visitors: dict[tuple[int, str, datetime], HyperLogLog] = {}
+        self.breakdowns: Counter[tuple[int, str, datetime, str]] = Counter()
+
+    def add(
+        self, *, url_id: int, created_at: datetime, host: str, user_agent: str
+    ) -> None:
+        self.clicks[url_id] += 1
+        visitor = f"{host}|{user_agent}"
+        for granularity in self._granularities:
+            key = (url_id, granularity, truncate(created_at, granularity))
+            self.buckets[key] += 1
+            sketch = self.visitors.get(key)
+            if sketch is None:
+                sketch = self.visitors[key] = HyperLogLog(
+                    VISITOR_SKETCH_PRECISION
+                )
+            sketch.add(visitor)
+        day = truncate(created_at, BREAKDOWN_GRANULARITY)
+        self.breakdowns[url_id, "host", day, host] += 1
+        self.breakdowns[
+            url_id, "user_agent", day, user_agent_family(user_agent)
+        ] += 1
@@ -1,17 +1,204 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterable, Sequence
+
+from sqlalchemy import (
+    Row,
+    bindparam,
+    column,
+    delete,
+    false,
+    insert,
+    or_,
+    select,
+    table,
+    tuple_,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Executable, Insert, functions
+
+from core.config import app_settings
+from core.urls import short_code, url_hash
+from db.db import replica_router
 from models.models import BlacklistedClient as BlacklistedClientModel
+from models.models import IdCounter as IdCounterModel
 from models.models import ShortenedURL as ShortenedURLModel
+from models.models import ShortenedURLStats as ShortenedURLStatsModel
 from models.models import ShortenedURLUse as ShortenedURLUseModel
+from models.models import (
+    ShortenedURLUseBreakdown as ShortenedURLUseBreakdownModel,
+)
+from models.models import ShortenedURLUseRollup as ShortenedURLUseRollupModel
 from schemas.blacklist import BlacklistedClientCreate
 from schemas.short_url_use import ShortURLUseCreate
 from schemas.shortened_url import ShortenedURLCreate, ShortenedURLUpdate
 
-from .base import RepositoryDB
+from .base import RepositoryDB, chunked
+from .cache import CodeRedirectTarget, RedirectTarget
+from .hyperloglog import HyperLogLog
+from .rollups import (
+    BREAKDOWN_GRANULARITY,
+    ClickAggregate,
+    Dimension,
+    Granularity,
+    truncate,
+)
 
 
 class RepositoryShortenedURL(
     RepositoryDB[ShortenedURLModel, ShortenedURLCreate, ShortenedURLUpdate]
 ):
-    pass
+    invalidation_keys = ("id", "code")
+
+    async def get_redirect_target(
+        self, db: AsyncSession, id: int
+    ) -> RedirectTarget | None:
+        """Get only the columns needed to serve a redirect"""
+        statement = self._statement(
+            "get_redirect_target",
+            lambda: select(self._model.original, self._model.deleted).where(
+                self._model.id == bindparam("id")
+            ),
+        )
+        row = await self._read_new_row(db, statement, {"id": id})
+        if row is None:
+            return None
+        return RedirectTarget(original=row.original, deleted=bool(row.deleted))
+
+    async def get_code_redirect_target(
+        self, db: AsyncSession, code: str
+    ) -> CodeRedirectTarget | None:
+        """
+        `get_redirect_target` by short code: an index-only scan
+        of the covering code index on Postgres
+        """
+        statement = self._statement(
+            "get_code_redirect_target",
+            lambda: select(
+                self._model.id, self._model.original, self._model.deleted
+            ).where(self._model.code == bindparam("code")),
+        )
+        row = await self._read_new_row(db, statement, {"code": code})
+        if row is None:
+            return None
+        return CodeRedirectTarget(
+            id=row.id, original=row.original, deleted=bool(row.deleted)
+        )
+
+    async def stream_keys(
+        self, db: AsyncSession, *, batch_size: int = 10_000
+    ) -> AsyncIterator[Sequence[tuple[int, str | None]]]:
+        """
+        Yield (id, code) of all short URLs as partitions read
+        from a server-side cursor of the primary
+        """
+        statement = select(self._model.id, self._model.code).execution_options(
+            yield_per=batch_size
+        )
+        results = await db.stream(statement)
+        async for partition in results.tuples().partitions():
+            yield partition
+
+    async def _read_new_row(
+        self, db: AsyncSession, statement: Executable, params: dict[str, Any]
+    ) -> Row | None:
+        """
+        A URL missing on a replica may be not replicated yet,
+        so the primary is asked too
+        """
+        results = await self.read(db, statement, params)
+        row = results.one_or_none()
+        if row is None and replica_router.replicas:
+            results = await db.execute(statement=statement, params=params)
+            row = results.one_or_none()
+        return row
+
+    async def create_or_get(
+        self,
+        db: AsyncSession,
+        *,
+        objects_in: list[dict[str, str]],
+        copy: bool = False,
+    ) -> list[Row]:
+        """
+        Idempotent insert of `value`, `original` pairs, committed at once.
+        URLs are deduplicated by the normalized URL hash within the batch
+        and against existing live (not deleted) rows with
+        INSERT ... ON CONFLICT ... RETURNING,
+        so a row is returned for each of `objects_in`: either the new or
+        the existing one.
+        With `copy` on Postgres the batch is loaded with COPY into
+        a temporary table and moved with a single INSERT ... SELECT
+        """
+        hashes = [url_hash(object_in["original"]) for object_in in objects_in]
+        records: dict[str, dict[str, str]] = {}
+        for original_hash, object_in in zip(hashes, objects_in):
+            records.setdefault(
+                original_hash,
+                {
+                    **object_in,
+                    "original_hash": original_hash,
+                    "code": short_code(
+                        object_in["value"], app_settings.project_short_url_base
+                    ),
+                },
+            )
+        dialect = db.get_bind().dialect.name
+        if copy and dialect == "postgresql":
+            statements = [await self._copy_statement(db, records.values())]
+        else:
+            statements = [
+                self._dialect_insert(dialect).values(chunk)
+                for chunk in chunked(
+                    list(records.values()),
+                    app_settings.project_bulk_chunk_size,
+                )
+            ]
+        rows = {}
+        for statement in statements:
+            statement = statement.on_conflict_do_update(
+                index_elements=[self._model.original_hash],
+                index_where=self._model.live,
+                set_={"original_hash": statement.excluded.original_hash},
+            ).returning(
+                self._model.id,
+                self._model.value,
+                self._model.original,
+                self._model.original_hash,
+                self._model.created_at,
+                self._model.deleted,
+                self._model.code,
+            )
+            results = await db.execute(statement=statement)
+            rows.update((row.original_hash, row) for row in results)
+        await self._publish(db, list(rows.values()))
+        await db.commit()
+        return [rows[original_hash] for original_hash in hashes]
+
+    async def _copy_statement(
+        self, db: AsyncSession, records: Iterable[dict[str, str]]
+    ) -> Insert:
+        columns = ["value", "original", "original_hash", "code"]
+        await self.copy_records(
+            db,
+            table_name="tmp_shortened_url_import",
+            columns=columns,
+            records=[
+                tuple(record[name] for name in columns) for record in records
+            ],
+        )
+        source = table(
+            "tmp_shortened_url_import", *(column(name) for name in columns)
+        )
+        return self._dialect_insert("postgresql").from_select(
+            [*columns, "created_at", "deleted"],
+            select(
+                *(source.c[name] for name in columns),
+                functions.now(),
+                false(),
+            ),
+        )
 
 
 short_url_service = RepositoryShortenedURL(ShortenedURLModel)
@@ -20,7 +207,72 @@ short_url_service = RepositoryShortenedURL(ShortenedURLModel)
 class RepositoryShortenedURLUse(
     RepositoryDB[ShortenedURLUseModel, ShortURLUseCreate, None]
 ):
-    pass
+    EXPORT_COLUMNS = (
+        "id",
+        "created_at",
+        "host",
+        "port",
+        "user_agent",
+        "url_id",
+        "user_id",
+    )
+
+    async def stream_rows(
+        self,
+        db: AsyncSession,
+        *,
+        url_id: int | None = None,
+        url_ids: Sequence[int] | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        batch_size: int = 10_000,
+    ) -> AsyncIterator[Sequence[tuple]]:
+        """
+        Yield URL uses as partitions of plain row tuples (`EXPORT_COLUMNS`)
+        read from a server-side cursor, in (created_at, id) order
+        """
+        statement = select(
+            *[getattr(self._model, name) for name in self.EXPORT_COLUMNS]
+        )
+        if url_id is not None:
+            statement = statement.where(self._model.url_id == url_id)
+        if url_ids is not None:
+            statement = statement.where(self._model.url_id.in_(url_ids))
+        if since is not None:
+            statement = statement.where(self._model.created_at >= since)
+        if until is not None:
+            statement = statement.where(self._model.created_at < until)
+        statement = statement.order_by(
+            self._model.created_at, self._model.id
+        ).execution_options(yield_per=batch_size)
+        replica = replica_router.read_bind(db)
+        results = await db.stream(
+            statement,
+            bind_arguments={"bind": replica} if replica else None,
+        )
+        async for partition in results.tuples().partitions():
+            yield partition
+
+    async def record(
+        self, db: AsyncSession, *, objects_in: list[dict[str, Any]]
+    ) -> None:
+        """
+        Insert URL uses with a multi-row INSERT and update per-URL click
+        counters, rollups and breakdowns in the same transaction
+        """
+        if not objects_in:
+            return
+        await db.execute(statement=insert(self._model).values(objects_in))
+        aggregate = ClickAggregate(app_settings.project_click_rollups)
+        for object_in in objects_in:
+            aggregate.add(
+                url_id=object_in["url_id"],
+                created_at=object_in["created_at"],
+                host=object_in["host"],
+                user_agent=object_in["user_agent"],
+            )
+        await url_stats_service.apply(db, aggregate)
+        await db.commit()
 
 
 url_use_service = RepositoryShortenedURLUse(ShortenedURLUseModel)
@@ -29,7 +281,297 @@ url_use_service = RepositoryShortenedURLUse(ShortenedURLUseModel)
 class RepositoryBlacklist(
     RepositoryDB[BlacklistedClientModel, BlacklistedClientCreate, None]
 ):
-    pass
+    invalidation_keys = ("id",)
+
+    async def get_active(
+        self, db: AsyncSession
+    ) -> list[BlacklistedClientModel]:
+        """Get clients, which are blacklisted now or permanently"""
+        statement = select(self._model).where(
+            or_(
+                self._model.until.is_(None),
+                self._model.until > datetime.utcnow(),
+            )
+        )
+        results = await self.read(db, statement)
+        return results.scalars().all()
 
 
 blacklist_service = RepositoryBlacklist(BlacklistedClientModel)
+
+
+class RepositoryIdCounter(RepositoryDB[IdCounterModel, None, None]):
+    async def lease(self, db: AsyncSession, *, name: str, size: int) -> int:
+        """
+        Reserve `size` consecutive values of the counter in its own
+        transaction, return the first one
+        """
+        statement = (
+            update(self._model)
+            .where(self._model.name == name)
+            .values(next_value=self._model.next_value + size)
+            .returning(self._model.next_value)
+        )
+        next_value = (await db.execute(statement=statement)).scalar()
+        if next_value is None:
+            try:
+                await db.execute(
+                    insert(self._model).values(name=name, next_value=1 + size)
+                )
+                next_value = 1 + size
+            except IntegrityError:
+                await db.rollback()
+                next_value = (await db.execute(statement=statement)).scalar()
+        await db.commit()
+        return next_value - size
+
+
+id_counter_service = RepositoryIdCounter(IdCounterModel)
+
+
+class RepositoryShortenedURLStats(
+    RepositoryDB[ShortenedURLStatsModel, None, None]
+):
+    async def get_clicks(self, db: AsyncSession, *, url_id: int) -> int:
+        statement = self._statement(
+            "get_clicks",
+            lambda: select(self._model.clicks).where(
+                self._model.url_id == bindparam("url_id")
+            ),
+        )
+        results = await self.read(db, statement, {"url_id": url_id})
+        return results.scalar() or 0
+
+    async def apply(self, db: AsyncSession, aggregate: ClickAggregate) -> None:
+        """Add aggregated URL uses to all the aggregate tables, no commit"""
+        await self.increment(
+            db,
+            objects_in=[
+                {"url_id": url_id, "clicks": clicks}
+                for url_id, clicks in aggregate.clicks.items()
+            ],
+            index_elements=["url_id"],
+            columns=["clicks"],
+        )
+        await url_use_rollup_service.increment(
+            db,
+            objects_in=[
+                {
+                    "url_id": url_id,
+                    "granularity": granularity,
+                    "bucket": bucket,
+                    "clicks": clicks,
+                }
+                for (url_id, granularity, bucket), clicks in (
+                    aggregate.buckets.items()
+                )
+            ],
+            index_elements=["url_id", "granularity", "bucket"],
+            columns=["clicks"],
+        )
+        await url_use_rollup_service.merge_visitors(
+            db, sketches=aggregate.visitors
+        )
+        await url_use_breakdown_service.increment(
+            db,
+            objects_in=[
+                {
+                    "url_id": url_id,
+                    "dimension": dimension,
+                    "bucket": bucket,
+                    "value": value,
+                    "clicks": clicks,
+                }
+                for (url_id, dimension, bucket, value), clicks in (
+                    aggregate.breakdowns.items()
+                )
+            ],
+            index_elements=["url_id", "dimension", "bucket", "value"],
+            columns=["clicks"],
+        )
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        """
+        Recount the aggregate tables from raw URL uses, committing every
+        `PROJECT_BULK_CHUNK_SIZE` URLs
+        """
+        last_id = 0
+        while True:
+            results = await db.execute(
+                select(ShortenedURLModel.id)
+                .where(ShortenedURLModel.id > last_id)
+                .order_by(ShortenedURLModel.id)
+                .limit(app_settings.project_bulk_chunk_size)
+            )
+            url_ids = results.scalars().all()
+            if not url_ids:
+                return
+            await self._rebuild_urls(db, url_ids)
+            await db.commit()
+            last_id = url_ids[-1]
+
+    async def _rebuild_urls(
+        self, db: AsyncSession, url_ids: Sequence[int]
+    ) -> None:
+        """
+        Recount the aggregates of some URLs. Their counter rows are locked
+        first, as click writers do, so concurrent writers of these URLs
+        wait and apply their increments on top of the result
+        """
+        await self.increment(
+            db,
+            objects_in=[{"url_id": url_id, "clicks": 0} for url_id in url_ids],
+            index_elements=["url_id"],
+            columns=["clicks"],
+        )
+        await db.execute(
+            update(self._model)
+            .where(self._model.url_id.in_(url_ids))
+            .values(clicks=0)
+        )
+        for model in (
+            url_use_rollup_service._model,
+            url_use_breakdown_service._model,
+        ):
+            await db.execute(delete(model).where(model.url_id.in_(url_ids)))
+        columns = url_use_service.EXPORT_COLUMNS
+        async for rows in url_use_service.stream_rows(
+            db,
+            url_ids=url_ids,
+            batch_size=app_settings.project_export_batch_size,
+        ):
+            aggregate = ClickAggregate(app_settings.project_click_rollups)
+            for row in rows:
+                use = dict(zip(columns, row))
+                aggregate.add(
+                    url_id=use["url_id"],
+                    created_at=use["created_at"],
+                    host=use["host"],
+                    user_agent=use["user_agent"],
+                )
+            await self.apply(db, aggregate)
+
+
+url_stats_service = RepositoryShortenedURLStats(ShortenedURLStatsModel)
+
+
+class RepositoryShortenedURLUseRollup(
+    RepositoryDB[ShortenedURLUseRollupModel, None, None]
+):
+    async def merge_visitors(
+        self,
+        db: AsyncSession,
+        *,
+        sketches: dict[tuple[int, str, datetime], HyperLogLog],
+    ) -> None:
+        """
+        Merge visitor sketches into existing rollup rows.
+        The rows must be upserted in the same transaction first, which
+        keeps them locked against concurrent writers on Postgres
+        """
+        if not sketches:
+            return
+        keys = sorted(sketches)
+        columns = (
+            self._model.url_id,
+            self._model.granularity,
+            self._model.bucket,
+        )
+        stored = {}
+        for chunk in chunked(keys, app_settings.project_bulk_chunk_size):
+            results = await db.execute(
+                statement=select(*columns, self._model.visitors).where(
+                    tuple_(*columns).in_(chunk)
+                )
+            )
+            stored.update(
+                ((url_id, granularity, bucket), visitors)
+                for url_id, granularity, bucket, visitors in results
+            )
+        for key in keys:
+            if stored.get(key):
+                sketches[key].merge(HyperLogLog.from_bytes(stored[key]))
+        await db.execute(
+            update(self._model),
+            [
+                {
+                    "url_id": url_id,
+                    "granularity": granularity,
+                    "bucket": bucket,
+                    "visitors": sketches[
+                        url_id, granularity, bucket
+                    ].to_bytes(),
+                }
+                for url_id, granularity, bucket in keys
+            ],
+        )
+
+    async def get_series(
+        self,
+        db: AsyncSession,
+        *,
+        url_id: int,
+        granularity: Granularity,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> list[ShortenedURLUseRollupModel]:
+        """Rollup buckets overlapping [since, until), ordered by time"""
+        statement = select(self._model).where(
+            self._model.url_id == url_id,
+            self._model.granularity == granularity,
+        )
+        if since is not None:
+            statement = statement.where(
+                self._model.bucket >= truncate(since, granularity)
+            )
+        if until is not None:
+            statement = statement.where(self._model.bucket < until)
+        results = await self.read(db, statement.order_by(self._model.bucket))
+        return results.scalars().all()
+
+
+url_use_rollup_service = RepositoryShortenedURLUseRollup(
+    ShortenedURLUseRollupModel
+)
+
+
+class RepositoryShortenedURLUseBreakdown(
+    RepositoryDB[ShortenedURLUseBreakdownModel, None, None]
+):
+    async def get_top(
+        self,
+        db: AsyncSession,
+        *,
+        url_id: int,
+        dimension: Dimension,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        limit: int = 10,
+    ) -> list[Row]:
+        """
+        Most frequent values of `dimension` with their clicks, counted
+        over whole `BREAKDOWN_GRANULARITY` buckets overlapping [since, until)
+        """
+        clicks = functions.sum(self._model.clicks).label("clicks")
+        statement = select(self._model.value, clicks).where(
+            self._model.url_id == url_id,
+            self._model.dimension == dimension,
+        )
+        if since is not None:
+            statement = statement.where(
+                self._model.bucket >= truncate(since, BREAKDOWN_GRANULARITY)
+            )
+        if until is not None:
+            statement = statement.where(self._model.bucket < until)
+        statement = (
+            statement.group_by(self._model.value)
+            .order_by(clicks.desc(), self._model.value)
+            .limit(limit)
+        )
+        results = await self.read(db, statement)
+        return results.all()
+
+
+url_use_breakdown_service = RepositoryShortenedURLUseBreakdown(
+    ShortenedURLUseBreakdownModel
+)
@@ -1,18 +1,201 @@
+import hashlib
 import logging
+import string
+import time
+from functools import lru_cache
 
 import pyshorteners
+from starlette.concurrency import run_in_threadpool
 
 from core.config import app_settings
+from core.metrics import Histogram, registry, timed
 
-logger = logging.getLogger(__name__)
+from .id_allocator import (
+    IdAllocator,
+    short_url_id_allocator,
+    worker_id_allocator,
+)
 
+logger = logging.getLogger(__name__)
 
-def generate_short_url(original: str) -> str:
-    shortener = getattr(
-        pyshorteners.Shortener(), app_settings.project_shortener, None
+shortener_duration = registry.register(
+    Histogram(
+        "shortener_duration_seconds",
+        "Duration of short URL generation",
+        ("shortener",),
     )
-    if shortener is None:
-        raise RuntimeError("Shortener is not configured or incorrect")
-    short = shortener.short(url=original)
-    logger.info(f"url shortened: {original} -> {short}")
+)
+
+BASE62_ALPHABET = string.digits + string.ascii_letters
+
+
+def base62_encode(number: int) -> str:
+    if number < 0:
+        raise ValueError("Only non-negative numbers can be encoded")
+    if number == 0:
+        return BASE62_ALPHABET[0]
+    digits = []
+    while number:
+        number, remainder = divmod(number, 62)
+        digits.append(BASE62_ALPHABET[remainder])
+    return "".join(reversed(digits))
+
+
+class Shortener:
+    """Makes short URL for the original one"""
+
+    async def shorten(self, original: str, attempt: int = 0) -> str:
+        """
+        `attempt` is increased by the caller when the previous short URL
+        turned out to be taken already
+        """
+        raise NotImplementedError
+
+
+class CodeShortener(Shortener):
+    """Short URL is a locally generated code appended to the base URL"""
+
+    def __init__(self, base_url: str):
+        self._base_url = base_url
+
+    async def shorten(self, original: str, attempt: int = 0) -> str:
+        return self._base_url + self.generate_code(original, attempt)
+
+    def generate_code(self, original: str, attempt: int) -> str:
+        raise NotImplementedError
+
+
+class SequenceShortener(CodeShortener):
+    """
+    Base62 of the next ID from a hi/lo allocator: the shortest codes,
+    with a database round trip only once per leased block
+    """
+
+    def __init__(self, base_url: str, allocator: IdAllocator):
+        super().__init__(base_url)
+        self._allocator = allocator
+
+    async def shorten(self, original: str, attempt: int = 0) -> str:
+        return self._base_url + base62_encode(await self._allocator.next_id())
+
+
+class SnowflakeShortener(CodeShortener):
+    """
+    Base62 of a Snowflake-style ID:
+    41 bits of milliseconds since `EPOCH`, 10 bits of worker ID
+    and 12 bits of per-millisecond sequence.
+    Without an explicit worker ID, the process leases one from a database
+    counter on first use, so up to 1024 processes never share it
+    """
+
+    EPOCH = 1672531200000  # 2023-01-01T00:00:00Z
+    WORKER_ID_BITS = 10
+    SEQUENCE_BITS = 12
+
+    def __init__(
+        self,
+        base_url: str,
+        worker_id: int | None = None,
+        worker_ids: IdAllocator = worker_id_allocator,
+    ):
+        super().__init__(base_url)
+        self._worker_id = None if worker_id is None else self._mask(worker_id)
+        self._worker_ids = worker_ids
+        self._last_timestamp = -1
+        self._sequence = 0
+
+    async def shorten(self, original: str, attempt: int = 0) -> str:
+        if self._worker_id is None:
+            worker_id = self._mask(await self._worker_ids.next_id())
+            if self._worker_id is None:
+                self._worker_id = worker_id
+                logger.info("Snowflake worker ID leased: %d", worker_id)
+        return await super().shorten(original, attempt)
+
+    def next_id(self) -> int:
+        timestamp = self._now()
+        if timestamp < self._last_timestamp:
+            timestamp = self._last_timestamp
+        if timestamp == self._last_timestamp:
+            self._sequence = (self._sequence + 1) & (
+                (1 << self.SEQUENCE_BITS) - 1
+            )
+            if self._sequence == 0:
+                while timestamp <= self._last_timestamp:
+                    timestamp = self._now()
+        else:
+            self._sequence = 0
+        self._last_timestamp = timestamp
+        return (
+            (timestamp - self.EPOCH)
+            << (self.WORKER_ID_BITS + self.SEQUENCE_BITS)
+            | self._worker_id << self.SEQUENCE_BITS
+            | self._sequence
+        )
+
+    def generate_code(self, original: str, attempt: int) -> str:
+        return base62_encode(self.next_id())
+
+    @classmethod
+    def _mask(cls, worker_id: int) -> int:
+        return worker_id & ((1 << cls.WORKER_ID_BITS) - 1)
+
+    @staticmethod
+    def _now() -> int:
+        return time.time_ns() // 1_000_000
+
+
+class HashShortener(CodeShortener):
+    """
+    Base62 of the original URL digest, truncated to `length`.
+    The same URL always gets the same code; on collision the digest
+    is salted with the attempt number
+    """
+
+    def __init__(self, base_url: str, length: int):
+        super().__init__(base_url)
+        self._length = length
+
+    def generate_code(self, original: str, attempt: int) -> str:
+        data = original if attempt == 0 else f"{attempt}:{original}"
+        digest = hashlib.blake2b(data.encode(), digest_size=16).digest()
+        return base62_encode(int.from_bytes(digest, "big"))[: self._length]
+
+
+class RemoteShortener(Shortener):
+    """
+    Third-party service from `pyshorteners`.
+    Requests run in the thread pool to keep the event loop responsive
+    """
+
+    def __init__(self, name: str):
+        self._shortener = getattr(pyshorteners.Shortener(), name, None)
+        if self._shortener is None:
+            raise RuntimeError("Shortener is not configured or incorrect")
+
+    async def shorten(self, original: str, attempt: int = 0) -> str:
+        return await run_in_threadpool(self._shortener.short, url=original)
+
+
+@lru_cache
+def get_shortener(name: str) -> Shortener:
+    base_url = app_settings.project_short_url_base
+    if name == "sequence":
+        return SequenceShortener(base_url, short_url_id_allocator)
+    if name == "snowflake":
+        return SnowflakeShortener(
+            base_url, app_settings.project_shortener_worker_id
+        )
+    if name == "hash":
+        return HashShortener(
+            base_url, app_settings.project_shortener_code_length
+        )
+    return RemoteShortener(name)
+
+
+@timed(shortener_duration, app_settings.project_shortener)
+async def generate_short_url(original: str, attempt: int = 0) -> str:
+    shortener = get_shortener(app_settings.project_shortener)
+    short = await shortener.shorten(original, attempt)
+    logger.debug("url shortened: %s -> %s", original, short)
     return short
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from db.db import get_session
+from models.models import ShortenedURL
+
+from .bloom_filter import BloomFilter
+from .invalidation import Keys, invalidation_bus
+from .services import short_url_service
+
+logger = logging.getLogger(__name__)
+
+BUILD_BATCH_SIZE = 10_000
+
+
+class ShortURLFilter:
+    """
+    In-process Bloom filter of existing short URL IDs and codes, which
+    rejects unknown ones without a database query.
+    Until it is built every key may exist. Only IDs up to the largest one
+    of the first build, and later of the previous one, are rejected: a
+    lower ID may be committed after the last build started. Such IDs of
+    other processes are known from the invalidation bus only, until the
+    next build. Codes created by other processes are only known from the
+    bus as well, so they are rejected only while it delivers them since
+    the start of the build. The filter is rebuilt every
+    `rebuild_interval` seconds
+    """
+
+    def __init__(
+        self,
+        *,
+        capacity: int,
+        error_rate: float,
+        rebuild_interval: float,
+    ):
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._rebuild_interval = rebuild_interval
+        self._filter: BloomFilter | None = None
+        self._max_id = 0
+        # Largest ID of the first or the previous build
+        self._watermark = 0
+        self._rejects_codes = False
+        self._pending: list[tuple[int, str | None]] | None = None
+        self._task: asyncio.Task | None = None
+        self.rejections = 0
+
+    @property
+    def error_rate(self) -> float:
+        return self._error_rate
+
+    @property
+    def bloom(self) -> BloomFilter | None:
+        return self._filter
+
+    def might_contain_id(self, id: int) -> bool:
+        if self._filter is None or id > self._watermark:
+            return True
+        return self._check(f"id:{id}")
+
+    def might_contain_code(self, code: str) -> bool:
+        if not (self._rejects_codes and invalidation_bus.live):
+            return True
+        return self._check(f"code:{code}")
+
+    def add(self, id: int, code: str | None) -> None:
+        """Remember a new short URL"""
+        if self._pending is not None:
+            self._pending.append((id, code))
+        if self._filter is not None:
+            self._add(self._filter, id, code)
+
+    def add_keys(self, keys: Keys) -> None:
+        """
+        Remember short URLs changed by any process. Without keys, changes
+        may be lost: every key may exist until the next rebuild
+        """
+        if keys is None:
+            self.reset()
+            return
+        for key in keys:
+            self.add(key["id"], key.get("code"))
+
+    def reset(self) -> None:
+        """Forget the filter: every key may exist again"""
+        self._filter = None
+        self._max_id = self._watermark = 0
+        self._rejects_codes = False
+
+    async def build(self, db: AsyncSession) -> None:
+        """
+        Build a new filter by streaming the table and replace the current
+        one. It is sized for `capacity` URLs or twice as many as there
+        are, whichever is more, with two keys (ID and code) per URL
+        """
+        rejects_codes = invalidation_bus.live
+        rows = await short_url_service.count(db=db)
+        bloom = BloomFilter(
+            2 * max(self._capacity, 2 * rows), self._error_rate
+        )
+        max_id = 0
+        # URLs created meanwhile may be missing from the stream
+        self._pending = []
+        try:
+            async for partition in short_url_service.stream_keys(
+                db=db, batch_size=BUILD_BATCH_SIZE
+            ):
+                for id, code in partition:
+                    self._add(bloom, id, code)
+                    max_id = max(max_id, id)
+            for id, code in self._pending:
+                self._add(bloom, id, code)
+        finally:
+            self._pending = None
+        self._watermark = (
+            min(self._max_id, max_id) if self._filter is not None else max_id
+        )
+        self._filter, self._max_id = bloom, max_id
+        self._rejects_codes = rejects_codes
+        logger.info(
+            "Short URL filter built: %d keys, %d KiB",
+            len(bloom),
+            bloom.nbytes // 1024,
+        )
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async for db in get_session():
+                    await self.build(db)
+            except Exception:
+                logger.exception("Short URL filter build failed")
+            await asyncio.sleep(self._rebuild_interval)
+
+    def _check(self, key: str) -> bool:
+        if key in self._filter:
+            return True
+        self.rejections += 1
+        return False
+
+    @staticmethod
+    def _add(bloom: BloomFilter, id: int, code: str | None) -> None:
+        bloom.add(f"id:{id}")
+        if code is not None:
+            bloom.add(f"code:{code}")
+
+
+short_url_filter = ShortURLFilter(
+    capacity=app_settings.project_url_filter_capacity,
+    error_rate=app_settings.project_url_filter_error_rate,
+    rebuild_interval=app_settings.project_url_filter_rebuild_interval,
+)
+invalidation_bus.subscribe(
+    ShortenedURL.__tablename__, short_url_filter.add_keys
+)
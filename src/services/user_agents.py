@@ -0,0 +1,24 @@
+# Checked in order: e.g. Edge and Opera agents mention Chrome and Safari too
+FAMILIES = (
+    ("bot", "Bot"),
+    ("spider", "Bot"),
+    ("crawl", "Bot"),
+    ("edg/", "Edge"),
+    ("opr/", "Opera"),
+    ("opera", "Opera"),
+    ("yabrowser", "Yandex Browser"),
+    ("firefox", "Firefox"),
+    ("chrome", "Chrome"),
+    ("chromium", "Chrome"),
+    ("safari", "Safari"),
+    ("curl", "curl"),
+    ("python", "Python"),
+)
+
+
+def user_agent_family(user_agent: str) -> str:
+    user_agent = user_agent.lower()
+    for token, family in FAMILIES:
+        if token in user_agent:
+            return family
+    return "Other"
@@ -14,6 +14,8 @@ from sqlalchemy.orm import sessionmaker
 
 from db.db import Base
 from main import app
+from services.cache import code_redirect_cache, redirect_cache
+from services.rate_limiter import rate_limiter
 
 
 @pytest.fixture(scope="session")
@@ -74,6 +76,19 @@ async def session(
         yield session
 
 
+@pytest.fixture(autouse=True)
+def redirect_cache_cleanup() -> None:
+    """Drop redirect targets cached by previous tests"""
+    redirect_cache.clear()
+    code_redirect_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def rate_limiter_cleanup() -> None:
+    """Refill the token buckets drained by previous tests"""
+    rate_limiter.clear()
+
+
 @pytest.fixture
 async def api_client(session) -> AsyncGenerator[AsyncClient, None]:
     """
@@ -27,7 +27,10 @@ class ShortenedURLFactory(AsyncModelFactory):
     value = factory.LazyAttribute(
         lambda obj: f"{obj.original}not-really-shortened/"
     )
-    original = factory.Faker("url")
+    # Faker URLs repeat often enough to break the unique URL hash
+    original = factory.Sequence(
+        lambda number: f"https://www.example{number}.com/"
+    )
     created_at = factory.Faker("date_time")
     deleted = False
 
@@ -1,14 +1,28 @@
+import os
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import AsyncGenerator
 
+import orjson
 import pytest
 from fastapi import status
+from httpx import ASGITransport, AsyncClient
 
+from api.v1.redirect import RedirectRoute
+from core.config import app_settings
+from db import db as db_module
 from db.db import async_session
 from main import app
+from services.base import encode_cursor
+from services.blacklist_matcher import blacklist_matcher
+from services.bulk_import import iter_url_chunks, parse_ndjson_line
+from services.cache import InMemoryCacheBackend, redirect_cache
+from services.click_logger import click_logger
 from services.services import (
     blacklist_service,
     short_url_service,
+    url_stats_service,
+    url_use_rollup_service,
     url_use_service,
 )
 
@@ -23,16 +37,23 @@ pytestmark = pytest.mark.anyio
 
 BLACKLIST_LIST_URL = app.url_path_for("show_blacklist")
 BLACKLIST_DETAIL_URL = app.url_path_for("remove_from_blacklist", id="{id}")
+CACHE_STATS_URL = app.url_path_for("read_cache_stats")
+METRICS_URL = app.url_path_for("read_metrics")
 PING_URL = app.url_path_for("ping_db")
+POOL_STATS_URL = app.url_path_for("read_pool_stats")
 SHORT_URL_LIST_URL = app.url_path_for("create_short_url")
 SHORT_URL_DETAIL_URL = app.url_path_for("read_short_url", id="{id}")
 SHORT_URL_STATUS_URL = app.url_path_for(
     "read_short_url_use_history", id="{id}"
 )
 SHORT_URL_SHORTEN_URL = app.url_path_for("bulk_create_short_url")
+SHORT_URL_SHORTEN_STREAM_URL = app.url_path_for("stream_create_short_url")
+SHORT_URL_EXPORT_URL = app.url_path_for("export_short_url_uses")
+SHORT_URL_STATS_URL = app.url_path_for("read_short_url_stats", id="{id}")
 TEST_URL = "https://www.ya.ru"
 TEST_SHORT_URL = "{url}/not-really-short/"
 TEST_IP = "198.51.111.42"
+TEST_SUBNET = "198.51.0.0"
 
 
 class TestBlacklistAPIs:
@@ -46,31 +67,76 @@ class TestBlacklistAPIs:
         yield
         async with async_session() as db:
             await blacklist_service.delete(db=db)
+        blacklist_matcher.invalidate()
 
-    async def test_blacklist_middleware(self, api_client, mocker):
+    @pytest.fixture
+    async def test_ip_client(
+        self, session
+    ) -> AsyncGenerator[AsyncClient, None]:
+        """httpx.AsyncClient, which connects from TEST_IP"""
+        transport = ASGITransport(app=app, client=(TEST_IP, 123))
+        async with AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            yield client
+
+    async def test_blacklist_middleware(self, test_ip_client):
         await BlacklistClientFactory(
-            host=TEST_IP, until=datetime.now() + timedelta(hours=1)
+            host=TEST_IP, until=datetime.utcnow() + timedelta(hours=1)
         )
-        mock_client = mocker.patch("fastapi.Request.client")
-        mock_client.host = TEST_IP
+        blacklist_matcher.invalidate()
 
-        response = await api_client.get(BLACKLIST_LIST_URL)
+        response = await test_ip_client.get(BLACKLIST_LIST_URL)
 
         assert response.status_code == status.HTTP_403_FORBIDDEN
         assert response.json() == {
             "detail": "You`ve been temporary blacklisted"
         }
 
+    async def test_blacklist_middleware_subnet(
+        self, api_client, test_ip_client
+    ):
+        data = {"host": TEST_SUBNET, "prefix_length": 16, "until": None}
+        await api_client.post(BLACKLIST_LIST_URL, json=data)
+
+        response = await test_ip_client.get(BLACKLIST_LIST_URL)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    async def test_blacklist_middleware_expired(self, test_ip_client):
+        await BlacklistClientFactory(
+            host=TEST_IP, until=datetime.utcnow() - timedelta(hours=1)
+        )
+        blacklist_matcher.invalidate()
+
+        response = await test_ip_client.get(BLACKLIST_LIST_URL)
+
+        assert response.status_code == status.HTTP_200_OK
+
     async def test_show_blacklist(self, api_client, create_blacklist):
         response = await api_client.get(BLACKLIST_LIST_URL)
 
         assert response.status_code == status.HTTP_200_OK
         assert len(response.json()) == len(create_blacklist)
 
+    async def test_show_blacklist_pages(self, api_client, create_blacklist):
+        response = await api_client.get(
+            BLACKLIST_LIST_URL, params={"limit": 2}
+        )
+        cursor = response.headers["X-Next-Cursor"]
+        next_response = await api_client.get(
+            BLACKLIST_LIST_URL, params={"limit": 2, "cursor": cursor}
+        )
+
+        ids = [client["id"] for client in response.json()]
+        ids += [client["id"] for client in next_response.json()]
+        assert ids == sorted(client.id for client in create_blacklist)
+        assert "X-Next-Cursor" not in next_response.headers
+
     async def test_blacklist(self, api_client):
         data = {
             "host": TEST_IP,
-            "until": datetime.now(tz=None).isoformat(),
+            "until": datetime.utcnow().isoformat(),
         }
 
         response = await api_client.post(BLACKLIST_LIST_URL, json=data)
@@ -106,6 +172,55 @@ class TestDbAPIs:
             in response.json()["message"]
         )
 
+    async def test_pool_stats(self, api_client):
+        response = await api_client.get(POOL_STATS_URL)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert "pool" in response.json()
+
+    @pytest.mark.parametrize("metrics_url", [METRICS_URL, "/metrics"])
+    async def test_metrics(self, api_client, metrics_url):
+        url = await ShortenedURLFactory()
+        await api_client.get(SHORT_URL_DETAIL_URL.format(id=url.id))
+        pid = f'pid="{os.getpid()}"'
+
+        response = await api_client.get(metrics_url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/plain")
+        assert (
+            'http_requests_total{method="GET",route="/api/v1/{id}",'
+            f'status="307",{pid}}}' in response.text
+        )
+        assert (
+            'repository_call_duration_seconds_count{repository="Repository'
+            f'ShortenedURL",method="get_redirect_target",{pid}}}'
+            in response.text
+        )
+        assert f'cache_hit_ratio{{cache="redirect",{pid}}}' in response.text
+        assert f"click_queue_depth{{{pid}}}" in response.text
+
+    async def test_one_session_per_request(self, api_client, monkeypatch):
+        """Middleware and all dependencies share the request session"""
+        url = await ShortenedURLFactory()
+        session_maker = db_module.async_session
+        sessions = []
+
+        def counting_session_maker():
+            sessions.append(session_maker())
+            return sessions[-1]
+
+        monkeypatch.setattr(db_module, "async_session", counting_session_maker)
+        blacklist_matcher.invalidate()
+
+        response = await api_client.get(
+            SHORT_URL_STATUS_URL.format(id=url.id),
+            params={"full_info": True},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(sessions) == 1
+
 
 class TestShortURLAPIs:
     @pytest.fixture
@@ -117,7 +232,7 @@ class TestShortURLAPIs:
     async def shortener_mock(self, mocker):
         shortener_mock = mocker.patch(
             "api.v1.shortened_url.generate_short_url",
-            side_effect=lambda url: TEST_SHORT_URL.format(url=url),
+            side_effect=lambda url, attempt=0: TEST_SHORT_URL.format(url=url),
         )
         return shortener_mock
 
@@ -142,7 +257,60 @@ class TestShortURLAPIs:
         assert "deleted" in response_json
         assert response_json["original"] == TEST_URL
         assert response_json["value"] == shortener_mock.side_effect(TEST_URL)
-        shortener_mock.assert_called_once_with(TEST_URL)
+        shortener_mock.assert_called_once_with(TEST_URL, attempt=0)
+
+    async def test_create_retries_taken(self, api_client, mocker):
+        taken = await ShortenedURLFactory()
+        shortener_mock = mocker.patch(
+            "api.v1.shortened_url.generate_short_url",
+            side_effect=lambda url, attempt=0: (
+                taken.value if attempt == 0 else f"{taken.value}-{attempt}"
+            ),
+        )
+        data = {"original_url": f"{TEST_URL}/retried"}
+
+        response = await api_client.post(SHORT_URL_LIST_URL, json=data)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()["value"] == f"{taken.value}-1"
+        assert shortener_mock.call_count == 2
+
+    async def test_create_attempts_exhausted(self, api_client, mocker):
+        taken = await ShortenedURLFactory()
+        shortener_mock = mocker.patch(
+            "api.v1.shortened_url.generate_short_url",
+            return_value=taken.value,
+        )
+        data = {"original_url": f"{TEST_URL}/exhausted"}
+
+        response = await api_client.post(SHORT_URL_LIST_URL, json=data)
+
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert (
+            shortener_mock.call_count
+            == app_settings.project_shortener_max_attempts
+        )
+
+    async def test_create_idempotent(self, api_client, shortener_mock):
+        data = {"original_url": f"{TEST_URL}/idempotent"}
+        first = await api_client.post(SHORT_URL_LIST_URL, json=data)
+
+        data = {"original_url": "HTTPS://WWW.YA.RU:443/idempotent"}
+        response = await api_client.post(SHORT_URL_LIST_URL, json=data)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()["id"] == first.json()["id"]
+        assert response.json()["value"] == first.json()["value"]
+
+    async def test_create_generated(self, api_client):
+        data = {"original_url": f"{TEST_URL}/generated"}
+
+        response = await api_client.post(SHORT_URL_LIST_URL, json=data)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()["value"].startswith(
+            app_settings.project_short_url_base
+        )
 
     async def test_bulk_create(self, api_client, shortener_mock):
         data = [
@@ -159,6 +327,103 @@ class TestShortURLAPIs:
         for url in data:
             shortener_mock.assert_any_call(url["original_url"])
 
+    async def test_bulk_create_duplicates(self, api_client, shortener_mock):
+        existing = await ShortenedURLFactory()
+        data = [
+            {"original_url": "https://duplicate.com"},
+            {"original_url": existing.original},
+            {"original_url": "https://duplicate.com/"},
+        ]
+
+        response = await api_client.post(SHORT_URL_SHORTEN_URL, json=data)
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response_json) == len(data)
+        assert response_json[0] == response_json[2]
+        assert response_json[1]["short_id"] == existing.id
+        assert response_json[1]["short_url"] == existing.value
+
+    @pytest.mark.parametrize(
+        "content_type, lines",
+        [
+            (
+                "application/x-ndjson",
+                [
+                    b'{"original_url": "https://stream1.com"}',
+                    b'"https://stream2.com"',
+                    b'{"original_url": "not-a-url"}',
+                    b'{"original_url": "https://stream3.com"}',
+                ],
+            ),
+            (
+                "text/csv",
+                [
+                    b"original_url,comment",
+                    b"https://csv1.com,first",
+                    b"https://csv2.com",
+                    b"not-a-url",
+                    b'"https://csv3.com","last"',
+                ],
+            ),
+        ],
+    )
+    async def test_bulk_create_stream(
+        self, api_client, monkeypatch, content_type, lines
+    ):
+        monkeypatch.setattr(app_settings, "project_bulk_chunk_size", 2)
+
+        async def body():
+            for line in lines:
+                yield line + b"\n"
+
+        response = await api_client.post(
+            SHORT_URL_SHORTEN_STREAM_URL,
+            content=body(),
+            headers={"Content-Type": content_type},
+        )
+        results = [orjson.loads(line) for line in response.iter_lines()]
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/x-ndjson"
+        created = [result for result in results if "short_id" in result]
+        errors = [result for result in results if "error" in result]
+        assert len(created) == 3
+        assert all(
+            result["original_url"].encode() in lines[result["line"] - 1]
+            for result in created
+        )
+        assert [error["line"] for error in errors] == [len(lines) - 1]
+        async with async_session() as db:
+            for result in created:
+                url = await short_url_service.get(db=db, id=result["short_id"])
+                assert url.value == result["short_url"]
+
+    async def test_bulk_create_stream_media_type(self, api_client):
+        response = await api_client.post(
+            SHORT_URL_SHORTEN_STREAM_URL,
+            content=b"https://stream.com",
+            headers={"Content-Type": "text/plain"},
+        )
+
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+    async def test_bulk_invalid_lines_chunked(self):
+        """Errors are flushed in chunks too, not held until the end"""
+
+        async def body():
+            for number in range(10):
+                yield b"not-a-url-%d\n" % number
+            yield b'"https://valid.com"\n'
+
+        chunks = [
+            chunk
+            async for chunk in iter_url_chunks(body(), parse_ndjson_line, 3)
+        ]
+
+        assert [len(errors) for _, errors in chunks] == [3, 3, 3, 1]
+        assert [len(urls) for urls, _ in chunks] == [0, 0, 0, 1]
+
     async def test_retrieve(self, api_client, create_short_url):
         url = create_short_url
 
@@ -167,6 +432,133 @@ class TestShortURLAPIs:
         assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
         assert response.headers["Location"] == create_short_url.original
 
+    async def test_retrieve_cached(self, api_client, create_short_url):
+        url = create_short_url
+        await api_client.get(SHORT_URL_DETAIL_URL.format(id=url.id))
+        stats_before = (await api_client.get(CACHE_STATS_URL)).json()
+
+        response = await api_client.get(SHORT_URL_DETAIL_URL.format(id=url.id))
+        stats_after = (await api_client.get(CACHE_STATS_URL)).json()
+
+        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+        assert response.headers["Location"] == create_short_url.original
+        assert stats_after["hits"] == stats_before["hits"] + 1
+        assert stats_after["misses"] == stats_before["misses"]
+
+    async def test_retrieve_shared_cache(
+        self, api_client, create_short_url, monkeypatch
+    ):
+        url = create_short_url
+        monkeypatch.setattr(redirect_cache, "shared", InMemoryCacheBackend())
+        await api_client.get(SHORT_URL_DETAIL_URL.format(id=url.id))
+        redirect_cache.clear()
+        shared_hits_before = redirect_cache.stats.shared_hits
+
+        response = await api_client.get(SHORT_URL_DETAIL_URL.format(id=url.id))
+
+        assert response.headers["Location"] == create_short_url.original
+        assert redirect_cache.stats.shared_hits == shared_hits_before + 1
+
+    async def test_retrieve_deleted(self, api_client, create_short_url):
+        """Deletion invalidates cached redirect"""
+        url = create_short_url
+        await api_client.get(SHORT_URL_DETAIL_URL.format(id=url.id))
+        await api_client.delete(SHORT_URL_DETAIL_URL.format(id=url.id))
+
+        response = await api_client.get(SHORT_URL_DETAIL_URL.format(id=url.id))
+
+        assert response.status_code == status.HTTP_410_GONE
+
+    async def test_create_after_delete(self, api_client):
+        """A deleted URL is shortened anew, not deduplicated"""
+        data = {"original_url": f"{TEST_URL}/shortened-again"}
+        deleted = (await api_client.post(SHORT_URL_LIST_URL, json=data)).json()
+        await api_client.delete(SHORT_URL_DETAIL_URL.format(id=deleted["id"]))
+
+        created = (await api_client.post(SHORT_URL_LIST_URL, json=data)).json()
+        response = await api_client.get(
+            SHORT_URL_DETAIL_URL.format(id=created["id"])
+        )
+
+        assert created["id"] != deleted["id"]
+        assert not created["deleted"]
+        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+        assert response.headers["Location"] == data["original_url"]
+
+    @pytest.mark.parametrize(
+        "method, path",
+        [
+            ("GET", "{id}"),
+            ("GET", "{deleted_id}"),
+            ("GET", "0"),
+            ("GET", "-1"),
+            ("GET", "not-an-id"),
+            ("HEAD", "{id}"),
+        ],
+    )
+    async def test_fast_redirect_matches_api_route(
+        self, api_client, monkeypatch, method, path
+    ):
+        """The fast redirect route answers exactly as the API route"""
+        url = await ShortenedURLFactory()
+        deleted = await ShortenedURLFactory(deleted=True)
+        url_path = SHORT_URL_DETAIL_URL.format(
+            id=path.format(id=url.id, deleted_id=deleted.id)
+        )
+        assert isinstance(app.router.routes[0], RedirectRoute)
+
+        responses = []
+        for routes in (app.router.routes, app.router.routes[1:]):
+            monkeypatch.setattr(app.router, "routes", routes)
+            accepted = click_logger.stats.accepted
+            response = await api_client.request(method, url_path)
+            responses.append(
+                (
+                    response.status_code,
+                    response.headers.get("location"),
+                    response.content,
+                    click_logger.stats.accepted - accepted,
+                )
+            )
+            redirect_cache.clear()
+
+        assert responses[0] == responses[1]
+
+    async def test_redirect_by_code(self, api_client):
+        data = {"original_url": f"{TEST_URL}/by-code"}
+        created = (await api_client.post(SHORT_URL_LIST_URL, json=data)).json()
+        code = created["value"].removeprefix(
+            app_settings.project_short_url_base
+        )
+        accepted = click_logger.stats.accepted
+
+        response = await api_client.get(f"/{code}")
+
+        assert created["code"] == code
+        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+        assert response.headers["Location"] == data["original_url"]
+        assert click_logger.stats.accepted == accepted + 1
+
+    @pytest.mark.parametrize("code", ["unknown", "a" * 17, "not*a*code"])
+    async def test_redirect_by_code_not_found(self, api_client, code):
+        response = await api_client.get(f"/{code}")
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json() == {"detail": "URL is not found"}
+
+    async def test_redirect_by_code_deleted(self, api_client):
+        """Deletion invalidates the redirect cached by code"""
+        url = await ShortenedURLFactory(
+            value=f"{app_settings.project_short_url_base}deleted"
+        )
+        assert url.code == "deleted"
+        await api_client.get(f"/{url.code}")
+        await api_client.delete(SHORT_URL_DETAIL_URL.format(id=url.id))
+
+        response = await api_client.get(f"/{url.code}")
+
+        assert response.status_code == status.HTTP_410_GONE
+
     async def test_destroy(self, api_client, create_short_url):
         """Deletion only sets URL as deleted"""
         url = create_short_url
@@ -187,14 +579,66 @@ class TestShortURLAPIs:
         assert url_after.deleted
 
     async def test_status(self, api_client, create_short_url):
+        url = create_short_url
+        for _ in range(2):
+            await api_client.get(SHORT_URL_DETAIL_URL.format(id=url.id))
+        await click_logger.flush()
+
+        response = await api_client.get(SHORT_URL_STATUS_URL.format(id=url.id))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["count"] == 2
+        async with async_session() as db:
+            rollups = await url_use_rollup_service.get_multi(
+                db=db, filter=dict(url_id=url.id)
+            )
+        clicks = Counter()
+        for rollup in rollups:
+            clicks[rollup.granularity] += rollup.clicks
+        # Clicks around a bucket boundary are rolled up into two buckets
+        assert clicks == {
+            granularity: 2
+            for granularity in app_settings.project_click_rollups
+        }
+
+    async def test_status_rebuilt(self, api_client, create_short_url):
+        """Counters are backfilled from the existing URL uses"""
         url = create_short_url
         uses = [await ShortenedURLUseFactory(url_id=url.id) for _ in range(2)]
+        async with async_session() as db:
+            await url_stats_service.rebuild(db)
 
         response = await api_client.get(SHORT_URL_STATUS_URL.format(id=url.id))
 
         assert response.status_code == status.HTTP_200_OK
         assert response.json()["count"] == len(uses)
 
+    async def test_status_rebuilt_in_chunks(
+        self, api_client, create_short_url, monkeypatch
+    ):
+        """Stale counters are recounted, a few URLs per transaction"""
+        monkeypatch.setattr(app_settings, "project_bulk_chunk_size", 1)
+        url = create_short_url
+        other_url = await ShortenedURLFactory()
+        await ShortenedURLUseFactory(url_id=url.id)
+        async with async_session() as db:
+            await url_stats_service.increment(
+                db,
+                objects_in=[
+                    {"url_id": url.id, "clicks": 5},
+                    {"url_id": other_url.id, "clicks": 3},
+                ],
+                index_elements=["url_id"],
+                columns=["clicks"],
+            )
+            await url_stats_service.rebuild(db)
+
+            assert await url_stats_service.get_clicks(db, url_id=url.id) == 1
+            assert (
+                await url_stats_service.get_clicks(db, url_id=other_url.id)
+                == 0
+            )
+
     async def test_status_full_info(self, api_client, create_short_url):
         url = create_short_url
         uses = [await ShortenedURLUseFactory(url_id=url.id) for _ in range(2)]
@@ -214,10 +658,172 @@ class TestShortURLAPIs:
             assert "user_agent" in use
             assert "user_id" in use
 
+    async def test_status_full_info_pages(self, api_client, create_short_url):
+        url = create_short_url
+        now = datetime.utcnow()
+        uses = [
+            await ShortenedURLUseFactory(
+                url_id=url.id, created_at=now - timedelta(minutes=minutes)
+            )
+            for minutes in (1, 3, 2, 3, 0)
+        ]
+        params = {"full_info": True, "max_result": 2}
+
+        pages = []
+        while True:
+            response = await api_client.get(
+                SHORT_URL_STATUS_URL.format(id=url.id), params=params
+            )
+            assert response.status_code == status.HTTP_200_OK
+            pages.append([use["id"] for use in response.json()])
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+
+        expected = sorted(uses, key=lambda use: (use.created_at, use.id))
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert sum(pages, []) == [use.id for use in expected]
+
+    @pytest.mark.parametrize(
+        "cursor",
+        [
+            "not-a-cursor",
+            encode_cursor(["x", "y"]),
+            encode_cursor(["2023-05-01T00:00:00", "1"]),
+            encode_cursor(["2023-05-01T00:00:00", True]),
+            encode_cursor([None, 1]),
+        ],
+    )
+    async def test_status_full_info_bad_cursor(
+        self, api_client, create_short_url, cursor
+    ):
+        url = create_short_url
+
+        response = await api_client.get(
+            SHORT_URL_STATUS_URL.format(id=url.id),
+            params={"full_info": True, "cursor": cursor},
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    async def test_stats(self, api_client, create_short_url):
+        url = create_short_url
+        user_agents = [
+            "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Firefox/113.0",
+            "Mozilla/5.0 (X11; Linux x86_64) Chrome/113.0 Safari/537.36",
+            "curl/7.88.1",
+            "curl/7.88.1",
+        ]
+        for user_agent in user_agents:
+            await api_client.get(
+                SHORT_URL_DETAIL_URL.format(id=url.id),
+                headers={"User-Agent": user_agent},
+            )
+        await click_logger.flush()
+
+        response = await api_client.get(
+            SHORT_URL_STATS_URL.format(id=url.id),
+            params={"granularity": "day"},
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_json["clicks"] == len(user_agents)
+        assert response_json["visitors"] == len(set(user_agents))
+        assert len(response_json["buckets"]) == 1
+        assert response_json["top_hosts"] == [
+            {"value": "127.0.0.1", "clicks": len(user_agents)}
+        ]
+        assert response_json["top_user_agents"][0] == {
+            "value": "curl",
+            "clicks": 2,
+        }
+        assert {
+            item["value"] for item in response_json["top_user_agents"]
+        } == {
+            "curl",
+            "Chrome",
+            "Firefox",
+        }
+
+    async def test_stats_not_rolled_up(self, api_client, create_short_url):
+        url = create_short_url
+
+        response = await api_client.get(
+            SHORT_URL_STATS_URL.format(id=url.id),
+            params={"granularity": "minute"},
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    async def test_export_ndjson(self, api_client, create_short_url):
+        url = create_short_url
+        other_url = await ShortenedURLFactory()
+        uses = [await ShortenedURLUseFactory(url_id=url.id) for _ in range(3)]
+        await ShortenedURLUseFactory(url_id=other_url.id)
+
+        response = await api_client.get(
+            SHORT_URL_EXPORT_URL, params={"url_id": url.id}
+        )
+        rows = [orjson.loads(line) for line in response.text.splitlines()]
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert sorted(row["id"] for row in rows) == sorted(
+            use.id for use in uses
+        )
+        assert rows[0].keys() == {
+            "id",
+            "created_at",
+            "host",
+            "port",
+            "user_agent",
+            "url_id",
+            "user_id",
+        }
+
+    async def test_export_csv_time_range(self, api_client, create_short_url):
+        url = create_short_url
+        now = datetime.utcnow()
+        uses = [
+            await ShortenedURLUseFactory(
+                url_id=url.id, created_at=now - timedelta(hours=hours)
+            )
+            for hours in (0, 2, 5)
+        ]
+
+        response = await api_client.get(
+            SHORT_URL_EXPORT_URL,
+            params={
+                "format": "csv",
+                "url_id": url.id,
+                "since": (now - timedelta(hours=3)).isoformat(),
+                "until": (now + timedelta(hours=1)).isoformat(),
+            },
+        )
+        header, *rows = response.text.splitlines()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        assert header.startswith("id,created_at,")
+        assert [int(row.split(",")[0]) for row in rows] == [
+            uses[1].id,
+            uses[0].id,
+        ]
+
+    @pytest.mark.parametrize(
+        "params", [{}, {"since": "2023-05-01T00:00:00"}, {"format": "csv"}]
+    )
+    async def test_export_unbounded(self, api_client, params):
+        response = await api_client.get(SHORT_URL_EXPORT_URL, params=params)
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
     async def test_status_added(self, api_client, create_short_url_with_calls):
         """URL call history is updated on a call"""
         url, before = create_short_url_with_calls
         await api_client.get(SHORT_URL_DETAIL_URL.format(id=url.id))
+        await click_logger.flush()
 
         async with async_session() as db:
             after = await url_use_service.count(
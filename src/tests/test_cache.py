@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from services.cache import LRUCache, ReadThroughCache
+
+pytestmark = pytest.mark.anyio
+
+
+def make_cache() -> ReadThroughCache[int, str]:
+    return ReadThroughCache(
+        namespace="test", local=LRUCache(max_size=10, ttl=60.0)
+    )
+
+
+class TestReadThroughCache:
+    async def test_concurrent_misses_share_loader(self):
+        cache = make_cache()
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "value"
+
+        values = await asyncio.gather(
+            *(cache.get(1, loader) for _ in range(3))
+        )
+
+        assert values == ["value"] * 3
+        assert calls == 1
+
+    async def test_cancelled_loader(self):
+        cache = make_cache()
+        started = asyncio.Event()
+
+        async def slow_loader():
+            started.set()
+            await asyncio.sleep(60)
+
+        async def loader():
+            return "value"
+
+        loading = asyncio.create_task(cache.get(1, slow_loader))
+        await started.wait()
+        waiting = asyncio.create_task(cache.get(1, loader))
+        await asyncio.sleep(0)
+        loading.cancel()
+
+        assert await asyncio.wait_for(waiting, timeout=1) == "value"
+        assert loading.cancelled()
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+
+from services.click_logger import ClickEvent, ClickLogger
+from services.services import url_use_service
+
+from .factories import ShortenedURLFactory
+
+pytestmark = pytest.mark.anyio
+
+
+def make_event(url_id: int, port: int = 8080) -> ClickEvent:
+    return ClickEvent(
+        url_id=url_id,
+        host="127.0.0.1",
+        port=port,
+        user_agent="test",
+        created_at=datetime.utcnow(),
+    )
+
+
+class TestClickLogger:
+    @pytest.fixture
+    async def create_short_url(self):
+        url = await ShortenedURLFactory()
+        return url
+
+    async def test_flush(self, session, create_short_url):
+        url = create_short_url
+        click_logger = ClickLogger(max_size=10, batch_size=2, flush_interval=1)
+        for _ in range(3):
+            await click_logger.put(make_event(url.id))
+
+        written = await click_logger.flush()
+
+        assert written == 3
+        assert len(click_logger) == 0
+        assert (
+            await url_use_service.count(db=session, filter=dict(url_id=url.id))
+            == 3
+        )
+
+    async def test_stop_drains_queue(self, session, create_short_url):
+        url = create_short_url
+        click_logger = ClickLogger(
+            max_size=10, batch_size=100, flush_interval=60
+        )
+        click_logger.start()
+        await click_logger.put(make_event(url.id))
+
+        await click_logger.stop()
+
+        assert click_logger.stats.written == 1
+        assert len(click_logger) == 0
+
+    @pytest.mark.parametrize(
+        "overflow, kept_port", [("drop_newest", 1), ("drop_oldest", 2)]
+    )
+    async def test_overflow(self, overflow, kept_port):
+        click_logger = ClickLogger(
+            max_size=1, batch_size=10, flush_interval=1, overflow=overflow
+        )
+
+        await click_logger.put(make_event(1, port=1))
+        await click_logger.put(make_event(1, port=2))
+
+        assert len(click_logger) == 1
+        assert click_logger.stats.dropped == 1
+        assert click_logger._queue.get_nowait().port == kept_port
+
+    async def test_overflow_block(self):
+        click_logger = ClickLogger(
+            max_size=1,
+            batch_size=10,
+            flush_interval=1,
+            overflow="block",
+            block_timeout=0.01,
+        )
+
+        assert await click_logger.put(make_event(1))
+        assert not await click_logger.put(make_event(1))
+        assert click_logger.stats.dropped == 1
@@ -0,0 +1,28 @@
+import pytest
+
+from services.hyperloglog import HyperLogLog
+
+
+class TestHyperLogLog:
+    @pytest.mark.parametrize("size", [0, 1, 100, 10_000])
+    def test_estimate(self, size):
+        sketch = HyperLogLog(precision=10)
+        for number in range(size):
+            sketch.add(str(number))
+            sketch.add(str(number))
+
+        assert sketch.estimate() == pytest.approx(size, rel=0.1)
+
+    def test_merge(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for number in range(3000):
+            first.add(str(number))
+            second.add(str(number + 1000))
+
+        first.merge(HyperLogLog.from_bytes(second.to_bytes()))
+
+        assert first.estimate() == pytest.approx(4000, rel=0.1)
+
+    def test_merge_precision_mismatch(self):
+        with pytest.raises(ValueError):
+            HyperLogLog(precision=10).merge(HyperLogLog(precision=12))
@@ -0,0 +1,36 @@
+import pytest
+
+from services.id_allocator import IdAllocator
+
+pytestmark = pytest.mark.anyio
+
+
+class TestIdAllocator:
+    async def test_next_id(self, session):
+        allocator = IdAllocator("test-next-id", block_size=3)
+
+        ids = [await allocator.next_id() for _ in range(7)]
+
+        assert ids == list(range(1, 8))
+        assert allocator.remaining == 2
+
+    async def test_workers_do_not_overlap(self, session):
+        first = IdAllocator("test-workers", block_size=5)
+        second = IdAllocator("test-workers", block_size=5)
+
+        ids = []
+        for _ in range(8):
+            ids.append(await first.next_id())
+            ids.append(await second.next_id())
+
+        assert len(set(ids)) == len(ids)
+
+    async def test_lost_block_is_not_reused(self, session):
+        """Restarted worker gets a new block, wasting the previous one"""
+        allocator = IdAllocator("test-restart", block_size=10)
+        before = await allocator.next_id()
+
+        allocator.reset()
+        after = await allocator.next_id()
+
+        assert after == before + 10
@@ -0,0 +1,123 @@
+import pytest
+from sqlalchemy import func, select
+
+from core.config import app_settings
+from models.models import InvalidationEvent
+from services.blacklist_matcher import blacklist_matcher
+from services.cache import (
+    CodeRedirectTarget,
+    RedirectTarget,
+    code_redirect_cache,
+    redirect_cache,
+)
+from services.invalidation import (
+    KEYS_PER_MESSAGE,
+    InvalidationBus,
+    invalidation_bus,
+)
+from services.services import blacklist_service, short_url_service
+
+from .factories import ShortenedURLFactory
+
+pytestmark = pytest.mark.anyio
+
+
+async def count_events(session) -> int:
+    result = await session.execute(select(func.count(InvalidationEvent.id)))
+    return result.scalar()
+
+
+class TestInvalidationBus:
+    async def test_poll_dispatches_new_events(self, session):
+        bus = InvalidationBus(poll_interval=0.01, retention=60.0)
+        received = []
+        bus.subscribe("db_test", received.append)
+        await bus.publish(session, "db_test", [{"id": 1}])
+        await session.commit()
+        await bus.poll(session)
+
+        await bus.publish(session, "db_test", [{"id": 2}])
+        await bus.publish(session, "db_test", None)
+        await session.commit()
+        await bus.poll(session)
+        await bus.poll(session)
+
+        assert received == [[{"id": 2}], None]
+        assert bus.stats.asdict() == {
+            "published": 3,
+            "received": 2,
+            "reconnects": 0,
+        }
+
+    async def test_failing_handler(self):
+        bus = InvalidationBus(poll_interval=0.01, retention=60.0)
+        received = []
+
+        def fail(keys):
+            raise RuntimeError("Handler failed")
+
+        bus.subscribe("db_test", fail)
+        bus.subscribe("db_test", received.append)
+        bus.dispatch_all()
+
+        assert received == [None]
+
+    async def test_retention(self, session):
+        bus = InvalidationBus(poll_interval=0.01, retention=0.0)
+        await bus.publish(session, "db_test", None)
+        await session.commit()
+        await bus.poll(session)
+
+        await bus.poll(session)
+
+        assert await count_events(session) == 0
+
+    async def test_redirect_targets_evicted(self, session):
+        url = await ShortenedURLFactory(
+            value=f"{app_settings.project_short_url_base}evicted"
+        )
+        await invalidation_bus.poll(session)
+        # Cached by this process, changed by another one
+        redirect_cache.local.set(url.id, RedirectTarget(url.original, False))
+        code_redirect_cache.local.set(
+            url.code, CodeRedirectTarget(url.id, url.original, False)
+        )
+        await short_url_service.update(
+            db=session,
+            db_object=await short_url_service.get(db=session, id=url.id),
+            object_in={"deleted": True},
+        )
+
+        await invalidation_bus.poll(session)
+
+        assert redirect_cache.local.get(url.id) is None
+        assert code_redirect_cache.local.get(url.code) is None
+
+    async def test_blacklist_reloaded(self, session):
+        blacklist_matcher.load([])
+        await invalidation_bus.poll(session)
+        client = await blacklist_service.create(
+            db=session, object_in={"host": "198.51.111.45", "until": None}
+        )
+        await blacklist_service.delete(db=session, id=client.id)
+        assert not blacklist_matcher.is_stale
+
+        await invalidation_bus.poll(session)
+
+        assert blacklist_matcher.is_stale
+
+    async def test_keys_chunked(self, session):
+        events_before = await count_events(session)
+
+        await short_url_service.create_or_get(
+            db=session,
+            objects_in=[
+                {
+                    "value": f"https://clck.ru/chunked{number}",
+                    "original": f"https://www.ya.ru/chunked{number}",
+                }
+                for number in range(KEYS_PER_MESSAGE + 1)
+            ],
+        )
+
+        assert await count_events(session) == events_before + 2
@@ -0,0 +1,92 @@
+import logging
+
+import orjson
+import pytest
+
+from core.logger import (
+    JsonFormatter,
+    LogQueueHandler,
+    RateLimitFilter,
+    SamplingFilter,
+    build_logging_config,
+    enable_queue,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def make_record(message: str = "Redirecting to: %s", **extra):
+    record = logging.LogRecord(
+        "test", logging.INFO, __file__, 1, message, ("https://ya.ru",), None
+    )
+    record.__dict__.update(extra)
+    return record
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(self.format(record))
+
+
+class TestLogging:
+    async def test_json_formatter(self):
+        line = JsonFormatter().format(make_record(url_id=42))
+
+        data = orjson.loads(line)
+        assert data["message"] == "Redirecting to: https://ya.ru"
+        assert data["level"] == "INFO"
+        assert data["logger"] == "test"
+        assert data["url_id"] == 42
+
+    @pytest.mark.parametrize("rate, passed", [(0.0, 0), (1.0, 100)])
+    async def test_sampling(self, rate, passed):
+        log_filter = SamplingFilter(rate)
+
+        assert sum(log_filter.filter(make_record()) for _ in range(100)) == (
+            passed
+        )
+
+    async def test_rate_limit(self, monkeypatch):
+        now = 1000.0
+        monkeypatch.setattr("core.logger.time.monotonic", lambda: now)
+        log_filter = RateLimitFilter(rate=10)
+
+        assert sum(log_filter.filter(make_record()) for _ in range(50)) == 10
+        now += 0.5
+        record = make_record()
+        assert log_filter.filter(record)
+        assert record.suppressed == 40
+
+    async def test_build_config(self):
+        config = build_logging_config(
+            json=True,
+            levels={"api.v1.shortened_url.redirect": "DEBUG"},
+            sampling={"api.v1.shortened_url.redirect": 0.01},
+        )
+
+        assert config["handlers"]["console"]["formatter"] == "json"
+        assert config["loggers"]["api.v1.shortened_url.redirect"] == {
+            "level": "DEBUG",
+            "filters": ["sampling:api.v1.shortened_url.redirect"],
+        }
+
+    async def test_queue(self):
+        handler = ListHandler()
+        logger = logging.getLogger("tests.queued")
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            (listener,) = enable_queue([logger])
+            assert isinstance(logger.handlers[0], LogQueueHandler)
+
+            logger.warning("Redirecting to: %s", "https://ya.ru")
+            listener.stop()
+        finally:
+            logger.handlers.clear()
+            logger.propagate = True
+
+        assert handler.records == ["Redirecting to: https://ya.ru"]
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from core.metrics import (
+    CollectedMetric,
+    Counter,
+    Histogram,
+    MetricsRegistry,
+    repository_duration,
+    timed,
+)
+from services.services import short_url_service
+
+pytestmark = pytest.mark.anyio
+
+
+class TestMetrics:
+    async def test_counter(self):
+        counter = Counter("requests_total", "Requests", ("status",))
+        counter.inc("200")
+        counter.inc("200", amount=2)
+
+        assert counter.render().splitlines() == [
+            "# HELP requests_total Requests",
+            "# TYPE requests_total counter",
+            'requests_total{status="200"} 3.0',
+        ]
+
+    async def test_histogram(self):
+        histogram = Histogram("latency", "Latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        assert histogram.render().splitlines()[2:] == [
+            'latency_bucket{le="0.1"} 2.0',
+            'latency_bucket{le="1.0"} 3.0',
+            'latency_bucket{le="+Inf"} 4.0',
+            "latency_sum 2.65",
+            "latency_count 4.0",
+        ]
+
+    async def test_label_escaping(self):
+        metric = CollectedMetric(
+            "info", "Info", lambda: [(('a"b\\c',), 1)], ("name",)
+        )
+
+        assert (
+            metric.render().splitlines()[-1] == 'info{name="a\\"b\\\\c"} 1.0'
+        )
+
+    async def test_registry_labels_pid(self):
+        registry = MetricsRegistry()
+        counter = registry.register(
+            Counter("requests_total", "Requests", ("status",))
+        )
+        histogram = registry.register(
+            Histogram("latency", "Latency", buckets=(1.0,))
+        )
+        counter.inc("200")
+        histogram.observe(0.5)
+        pid = os.getpid()
+
+        lines = registry.render().splitlines()
+
+        assert f'requests_total{{status="200",pid="{pid}"}} 1.0' in lines
+        assert f'latency_bucket{{le="1.0",pid="{pid}"}} 1.0' in lines
+        assert f'latency_count{{pid="{pid}"}} 1.0' in lines
+
+    async def test_duplicate_name(self):
+        registry = MetricsRegistry()
+        registry.register(Counter("requests_total", "Requests"))
+
+        with pytest.raises(ValueError):
+            registry.register(Counter("requests_total", "Requests"))
+
+    async def test_timed(self):
+        histogram = Histogram("call", "Call", ("name",))
+
+        @timed(histogram, "failing")
+        async def fail():
+            raise RuntimeError
+
+        with pytest.raises(RuntimeError):
+            await fail()
+
+        assert histogram.get_count("failing") == 1
+
+    async def test_repository_methods_timed(self, session):
+        """Inherited methods are timed under the subclass name"""
+        labels = ("RepositoryShortenedURL", "get")
+        count = repository_duration.get_count(*labels)
+
+        await short_url_service.get(db=session, id=0)
+
+        assert repository_duration.get_count(*labels) == count + 1
+        assert repository_duration.get_count("RepositoryShortenedURL", "read")
@@ -0,0 +1,56 @@
+from datetime import date, datetime
+
+import pytest
+
+from db.db import async_session
+from services.partitions import (
+    PartitionMaintainer,
+    add_months,
+    create_partition_ddl,
+    month_start,
+    partition_month,
+    partition_name,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class TestPartitionNames:
+    @pytest.mark.parametrize(
+        "month, months, expected",
+        [
+            (date(2023, 5, 1), 1, date(2023, 6, 1)),
+            (date(2023, 12, 1), 1, date(2024, 1, 1)),
+            (date(2023, 1, 1), -1, date(2022, 12, 1)),
+            (date(2023, 5, 1), -17, date(2021, 12, 1)),
+        ],
+    )
+    async def test_add_months(self, month, months, expected):
+        assert add_months(month, months) == expected
+
+    async def test_month_start(self):
+        assert month_start(datetime(2023, 5, 16, 20, 12)) == date(2023, 5, 1)
+
+    async def test_partition_month(self):
+        month = date(2023, 5, 1)
+
+        assert partition_month(partition_name(month)) == month
+        assert partition_month("db_shortened_url_use_default") is None
+        assert partition_month("db_shortened_url_use_p2023") is None
+
+    async def test_create_partition_ddl(self):
+        ddl = create_partition_ddl(date(2023, 12, 1))
+
+        assert "db_shortened_url_use_p202312" in ddl
+        assert "FROM ('2023-12-01') TO ('2024-01-01')" in ddl
+
+
+class TestPartitionMaintainer:
+    async def test_not_postgres(self, session):
+        """Non-partitioned fallback is left as is"""
+        maintainer = PartitionMaintainer(
+            ahead=3, retention_months=1, retention_action="drop", interval=1
+        )
+
+        async with async_session() as db:
+            assert await maintainer.maintain(db) == ([], [])
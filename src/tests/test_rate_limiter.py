@@ -0,0 +1,225 @@
+import ipaddress
+import time
+from datetime import datetime, timedelta
+from typing import AsyncGenerator
+
+import pytest
+from fastapi import status
+from httpx import ASGITransport, AsyncClient
+
+from core.config import app_settings
+from db.db import async_session
+from main import app
+from middlewares.proxy_headers_middleware import TrustedProxyMiddleware
+from services.blacklist_matcher import BlacklistMatcher, blacklist_matcher
+from services.rate_limiter import (
+    InMemoryRateLimitBackend,
+    RateLimiter,
+    classify,
+    rate_limiter,
+)
+from services.services import blacklist_service
+
+pytestmark = pytest.mark.anyio
+
+TEST_IP = "198.51.111.43"
+SHORT_URL_LIST_URL = app.url_path_for("create_short_url")
+
+
+def make_limiter(**options) -> RateLimiter:
+    return RateLimiter(
+        **{
+            "limits": {"redirect": 1.0},
+            "burst": 3.0,
+            "ban_after": None,
+            "ban_window": 60.0,
+            "ban_duration": 60.0,
+            "ban_max_duration": 600.0,
+            **options,
+        }
+    )
+
+
+@pytest.fixture
+async def test_ip_client(session) -> AsyncGenerator[AsyncClient, None]:
+    """httpx.AsyncClient, which connects from TEST_IP"""
+    transport = ASGITransport(app=app, client=(TEST_IP, 123))
+    async with AsyncClient(
+        transport=transport, base_url="http://test"
+    ) as client:
+        yield client
+
+
+@pytest.fixture
+async def blacklist_cleanup() -> AsyncGenerator[None, None]:
+    yield
+    async with async_session() as db:
+        await blacklist_service.delete(db=db)
+    blacklist_matcher.invalidate()
+
+
+class TestRateLimiter:
+    @pytest.mark.parametrize(
+        "method, path, route_class",
+        [
+            ("GET", "/api/v1/42", "redirect"),
+            ("HEAD", "/api/v1/42", "redirect"),
+            ("GET", "/aZ0_-", "redirect"),
+            ("POST", "/api/v1/", "create"),
+            ("POST", "/api/v1/shorten", "create"),
+            ("POST", "/api/v1/shorten/stream", "create"),
+            ("GET", "/api/v1/42/status", "status"),
+            ("GET", "/api/v1/42/stats", "status"),
+            ("GET", "/api/v1/export", "status"),
+            ("DELETE", "/api/v1/42", None),
+            ("GET", "/api/v1/blacklist", None),
+            ("GET", "/api/openapi.json", None),
+        ],
+    )
+    async def test_classify(self, method, path, route_class):
+        assert classify(method, path) == route_class
+
+    async def test_token_bucket(self):
+        limiter = make_limiter()
+
+        results = [await limiter.hit("redirect", TEST_IP) for _ in range(5)]
+
+        assert results[:3] == [None] * 3
+        assert all(0 < retry_after <= 1 for retry_after in results[3:])
+        assert await limiter.hit("redirect", "198.51.111.44") is None
+        assert await limiter.hit("create", TEST_IP) is None
+        assert limiter.stats["redirect"].asdict() == {
+            "allowed": 4,
+            "limited": 2,
+            "bans": 0,
+        }
+
+    async def test_shared_backend(self):
+        shared = InMemoryRateLimitBackend()
+        first = make_limiter(shared=shared)
+        second = make_limiter(shared=shared)
+
+        for _ in range(3):
+            assert await first.hit("redirect", TEST_IP) is None
+
+        assert await second.hit("redirect", TEST_IP) is not None
+
+    async def test_ban_duration_doubles(self, monkeypatch):
+        limiter = make_limiter(ban_after=2)
+        bans = []
+
+        async def ban(host, until):
+            bans.append(until)
+
+        monkeypatch.setattr(limiter, "ban", ban)
+        for _ in range(3 + 2 * 3):
+            await limiter.hit("redirect", TEST_IP)
+
+        assert len(bans) == 3
+        first, second, third = bans
+        assert (second - first).total_seconds() == pytest.approx(60, abs=1)
+        assert (third - second).total_seconds() == pytest.approx(120, abs=1)
+
+    async def test_ban_until_utc(self, monkeypatch):
+        limiter = make_limiter(ban_after=1)
+        bans = []
+
+        async def ban(host, until):
+            bans.append(until)
+
+        monkeypatch.setattr(limiter, "ban", ban)
+        for _ in range(3 + 1):
+            await limiter.hit("redirect", TEST_IP)
+
+        expected = datetime.utcnow() + timedelta(seconds=60)
+        assert len(bans) == 1
+        assert abs((bans[0] - expected).total_seconds()) < 5
+
+    @pytest.mark.parametrize(
+        "expires_in, blacklisted",
+        [(timedelta(minutes=1), True), (timedelta(minutes=-1), False)],
+    )
+    async def test_matcher_until_utc(
+        self, monkeypatch, expires_in, blacklisted
+    ):
+        # Local time is behind UTC here, naive deadlines are in UTC anyway
+        monkeypatch.setenv("TZ", "Etc/GMT+5")
+        time.tzset()
+        matcher = BlacklistMatcher(refresh_interval=60)
+        try:
+            matcher.load(
+                [
+                    (
+                        ipaddress.ip_network(TEST_IP),
+                        datetime.utcnow() + expires_in,
+                    )
+                ]
+            )
+        finally:
+            monkeypatch.undo()
+            time.tzset()
+
+        assert matcher.is_blacklisted(TEST_IP) is blacklisted
+
+    async def test_middleware_limits(self, test_ip_client, monkeypatch):
+        monkeypatch.setattr(app_settings, "project_rate_limit", True)
+        monkeypatch.setattr(rate_limiter, "_limits", {"create": 0.1})
+        monkeypatch.setattr(rate_limiter, "_burst", 10.0)
+        data = {"original_url": "https://www.ya.ru/limited"}
+
+        response = await test_ip_client.post(SHORT_URL_LIST_URL, json=data)
+        limited = await test_ip_client.post(SHORT_URL_LIST_URL, json=data)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert limited.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert limited.json() == {"detail": "Too many requests"}
+        assert limited.headers["Retry-After"] == "10"
+
+    async def test_middleware_bans(
+        self, test_ip_client, monkeypatch, blacklist_cleanup
+    ):
+        monkeypatch.setattr(app_settings, "project_rate_limit", True)
+        monkeypatch.setattr(rate_limiter, "_limits", {"redirect": 0.1})
+        monkeypatch.setattr(rate_limiter, "_burst", 10.0)
+        monkeypatch.setattr(rate_limiter, "_ban_after", 2)
+
+        responses = [await test_ip_client.get("/api/v1/0") for _ in range(4)]
+
+        assert [response.status_code for response in responses] == [
+            status.HTTP_400_BAD_REQUEST,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            status.HTTP_403_FORBIDDEN,
+        ]
+        async with async_session() as db:
+            clients = await blacklist_service.get_active(db=db)
+        assert [str(client.host) for client in clients] == [TEST_IP]
+
+    @pytest.mark.parametrize(
+        "trusted_proxies, client",
+        [([], "10.0.0.1"), (["10.0.0.1"], TEST_IP), (["*"], TEST_IP)],
+    )
+    async def test_forwarded_client(
+        self, monkeypatch, trusted_proxies, client
+    ):
+        monkeypatch.setattr(
+            app_settings, "project_trusted_proxies", trusted_proxies
+        )
+        clients = []
+
+        async def app(scope, receive, send):
+            clients.append(scope["client"][0])
+
+        middleware = TrustedProxyMiddleware(app)
+        await middleware(
+            {
+                "type": "http",
+                "scheme": "http",
+                "client": ("10.0.0.1", 123),
+                "headers": [(b"x-forwarded-for", TEST_IP.encode())],
+            },
+            None,
+            None,
+        )
+
+        assert clients == [client]
@@ -0,0 +1,125 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import QueuePool
+
+from db.replicas import PRIMARY_UNTIL, ReplicaRouter
+from middlewares.session_middleware import PRIMARY_COOKIE, DBSessionMiddleware
+from services.services import blacklist_service, short_url_service
+
+from .factories import BlacklistClientFactory
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def replicas():
+    engines = [
+        create_engine("sqlite://", poolclass=QueuePool) for _ in range(2)
+    ]
+    yield engines
+    for engine in engines:
+        engine.dispose()
+
+
+class TestReplicaRouter:
+    async def test_no_replicas(self):
+        assert ReplicaRouter([]).read_bind(AsyncSession()) is None
+
+    async def test_round_robin(self, replicas):
+        router = ReplicaRouter(replicas)
+
+        binds = [router.read_bind(AsyncSession()) for _ in range(4)]
+
+        assert binds == replicas * 2
+
+    async def test_least_loaded(self, replicas):
+        router = ReplicaRouter(replicas, strategy="least_loaded")
+
+        with replicas[0].connect():
+            assert router.read_bind(AsyncSession()) is replicas[1]
+
+    async def test_unhealthy_replica_is_skipped(self, replicas):
+        router = ReplicaRouter(replicas, retry_interval=60)
+
+        router.mark_unhealthy(replicas[0])
+        binds = {router.read_bind(AsyncSession()) for _ in range(4)}
+        router.mark_unhealthy(replicas[1])
+
+        assert binds == {replicas[1]}
+        assert router.read_bind(AsyncSession()) is None
+
+    async def test_sticky_primary(self, replicas):
+        router = ReplicaRouter(replicas)
+        session = AsyncSession()
+        session.info[PRIMARY_UNTIL] = time.time() + 60
+
+        assert router.read_bind(session) is None
+
+    async def test_reads_primary_after_write(self, session):
+        await BlacklistClientFactory(host="192.0.2.1")
+        assert not ReplicaRouter.reads_primary(session)
+
+        await blacklist_service.create(
+            db=session, object_in={"host": "192.0.2.2"}
+        )
+
+        assert ReplicaRouter.reads_primary(session)
+        await blacklist_service.delete(db=session)
+
+
+class TestRepositoryRead:
+    async def test_unreachable_replica_falls_back(self, session, monkeypatch):
+        replica = create_async_engine(
+            "sqlite+aiosqlite:////nonexistent/replica.db"
+        )
+        router = ReplicaRouter([replica.sync_engine])
+        monkeypatch.setattr("services.base.replica_router", router)
+        await BlacklistClientFactory(host="192.0.2.3")
+
+        clients = await blacklist_service.get_multi(db=session)
+
+        assert clients
+        assert not router.is_healthy(replica.sync_engine)
+        await replica.dispose()
+        await blacklist_service.delete(db=session)
+
+    async def test_fallback_keeps_session_state(self, session, monkeypatch):
+        replica = create_async_engine(
+            "sqlite+aiosqlite:////nonexistent/replica.db"
+        )
+        client = await BlacklistClientFactory(host="192.0.2.4")
+        client = await blacklist_service.get(db=session, id=client.id)
+        router = ReplicaRouter([replica.sync_engine])
+        monkeypatch.setattr("services.base.replica_router", router)
+
+        await short_url_service.count(db=session)
+
+        assert not inspect(client).expired_attributes
+        assert str(client.host) == "192.0.2.4"
+        await replica.dispose()
+        await blacklist_service.delete(db=session)
+
+
+class TestPrimaryCookie:
+    @pytest.mark.parametrize("value", ["inf", "nan", "1.5", "soon"])
+    async def test_invalid_deadline(self, value):
+        middleware = DBSessionMiddleware(app=None)
+        scope = {
+            "headers": [(b"cookie", f"{PRIMARY_COOKIE}={value}".encode())]
+        }
+
+        assert middleware._get_primary_until(scope) is None
+
+    async def test_deadline_clamped(self):
+        middleware = DBSessionMiddleware(app=None)
+        until = time.time() + 365 * 24 * 3600
+        scope = {
+            "headers": [(b"cookie", f"{PRIMARY_COOKIE}={until}".encode())]
+        }
+
+        assert middleware._get_primary_until(scope) <= (
+            time.time() + middleware._window
+        )
@@ -0,0 +1,45 @@
+import pytest
+
+from services.services import blacklist_service, short_url_service
+
+from .factories import BlacklistClientFactory, ShortenedURLFactory
+
+pytestmark = pytest.mark.anyio
+
+
+class TestCachedStatements:
+    async def test_statement_reused(self, session):
+        url = await ShortenedURLFactory()
+
+        assert (
+            await short_url_service.get(db=session, id=url.id)
+        ).id == url.id
+        statement = short_url_service._statements["get"]
+        assert await short_url_service.get(db=session, id=-1) is None
+        assert short_url_service._statements["get"] is statement
+
+    async def test_filter_values_are_parameters(self, session):
+        urls = [await ShortenedURLFactory(deleted=True) for _ in range(3)]
+        deleted = await short_url_service.count(
+            db=session, filter={"deleted": True}
+        )
+        kept = await short_url_service.count(
+            db=session, filter={"deleted": False}
+        )
+
+        assert deleted >= len(urls)
+        assert deleted + kept == await short_url_service.count(db=session)
+        page = await short_url_service.get_multi(
+            db=session, filter={"deleted": True}, skip=1, limit=1
+        )
+        assert len(page) == 1 and page[0].deleted
+
+    async def test_null_filter(self, session):
+        client = await BlacklistClientFactory(until=None)
+
+        clients = await blacklist_service.get_multi(
+            db=session, filter={"until": None}, limit=1000
+        )
+
+        assert client.id in {client.id for client in clients}
+        assert all(client.until is None for client in clients)
@@ -0,0 +1,75 @@
+import pytest
+
+from core.urls import short_code
+from services.id_allocator import IdAllocator
+from services.shortener import (
+    BASE62_ALPHABET,
+    HashShortener,
+    SnowflakeShortener,
+    base62_encode,
+)
+
+pytestmark = pytest.mark.anyio
+
+BASE_URL = "http://short.test/"
+TEST_URL = "https://www.ya.ru"
+
+
+def base62_decode(code: str) -> int:
+    number = 0
+    for char in code:
+        number = number * 62 + BASE62_ALPHABET.index(char)
+    return number
+
+
+class TestShorteners:
+    @pytest.mark.parametrize(
+        "short_url, code",
+        [
+            (f"{BASE_URL}aZ0_-", "aZ0_-"),
+            (f"{BASE_URL}", None),
+            (f"{BASE_URL}a/b", None),
+            (f"{BASE_URL}{'a' * 17}", None),
+            ("https://clck.ru/aZ0", None),
+        ],
+    )
+    async def test_short_code(self, short_url, code):
+        assert short_code(short_url, BASE_URL) == code
+
+    @pytest.mark.parametrize("number", [0, 1, 61, 62, 3844, 2**63 - 1])
+    async def test_base62(self, number):
+        assert base62_decode(base62_encode(number)) == number
+
+    async def test_snowflake_unique(self):
+        shortener = SnowflakeShortener(BASE_URL, worker_id=1)
+
+        urls = [await shortener.shorten(TEST_URL) for _ in range(20_000)]
+
+        assert len(set(urls)) == len(urls)
+        assert all(url.startswith(BASE_URL) for url in urls)
+
+    async def test_snowflake_workers_differ(self):
+        first = SnowflakeShortener(BASE_URL, worker_id=1)
+        second = SnowflakeShortener(BASE_URL, worker_id=2)
+
+        assert await first.shorten(TEST_URL) != await second.shorten(TEST_URL)
+
+    async def test_snowflake_worker_ids_leased(self, session):
+        worker_ids = IdAllocator("test-snowflake-worker", block_size=1)
+        first = SnowflakeShortener(BASE_URL, worker_ids=worker_ids)
+        second = SnowflakeShortener(BASE_URL, worker_ids=worker_ids)
+
+        await first.shorten(TEST_URL)
+        await second.shorten(TEST_URL)
+
+        assert first._worker_id != second._worker_id
+        assert worker_ids.remaining == 0
+
+    async def test_hash(self):
+        shortener = HashShortener(BASE_URL, length=8)
+
+        url = await shortener.shorten(TEST_URL)
+
+        assert url == await shortener.shorten(TEST_URL)
+        assert url != await shortener.shorten(TEST_URL, attempt=1)
+        assert len(url) == len(BASE_URL) + 8
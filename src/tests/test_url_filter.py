@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+from fastapi import status
+
+from core.config import app_settings
+from main import app
+from services.bloom_filter import BloomFilter
+from services.click_logger import click_logger
+from services.invalidation import invalidation_bus
+from services.url_filter import short_url_filter
+
+from .factories import ShortenedURLFactory
+
+pytestmark = pytest.mark.anyio
+
+SHORT_URL_LIST_URL = app.url_path_for("create_short_url")
+SHORT_URL_DETAIL_URL = app.url_path_for("read_short_url", id="{id}")
+
+
+@pytest.fixture
+async def url_filter(session, monkeypatch):
+    """Short URL filter built twice, while the invalidation bus is live"""
+    monkeypatch.setattr(invalidation_bus, "_live", True)
+    for _ in range(2):
+        await short_url_filter.build(session)
+    try:
+        yield short_url_filter
+    finally:
+        short_url_filter.reset()
+
+
+class TestBloomFilter:
+    async def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for number in range(1000):
+            bloom.add(str(number))
+
+        assert all(str(number) in bloom for number in range(1000))
+        assert len(bloom) == 1000
+
+    async def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+        for number in range(10_000):
+            bloom.add(str(number))
+
+        false_positives = sum(
+            str(number) in bloom for number in range(10_000, 30_000)
+        )
+
+        assert false_positives / 20_000 < 0.02
+        assert bloom.false_positive_rate == pytest.approx(0.01, rel=0.1)
+
+    @pytest.mark.parametrize("capacity, error_rate", [(0, 0.01), (10, 1.0)])
+    async def test_invalid(self, capacity, error_rate):
+        with pytest.raises(ValueError):
+            BloomFilter(capacity, error_rate)
+
+
+class TestShortURLFilter:
+    async def test_passes_everything_until_built(self):
+        assert short_url_filter.bloom is None
+        assert short_url_filter.might_contain_id(-1)
+        assert short_url_filter.might_contain_code("unknown")
+
+    async def test_build(self, session):
+        url = await ShortenedURLFactory(
+            value=f"{app_settings.project_short_url_base}filtered"
+        )
+        await short_url_filter.build(session)
+        try:
+            assert short_url_filter.might_contain_id(url.id)
+            assert short_url_filter.might_contain_code("filtered")
+            # Can be created by another process, unknown without the bus
+            assert short_url_filter.might_contain_code("missing")
+            assert short_url_filter.might_contain_id(url.id + 1)
+        finally:
+            short_url_filter.reset()
+
+    async def test_ids_committed_late(self, session):
+        low = await ShortenedURLFactory()
+        high = await ShortenedURLFactory(id=low.id + 1000)
+        await short_url_filter.build(session)
+        try:
+            # Committed by another process after the build, below its
+            # largest ID: known from the invalidation bus
+            late = await ShortenedURLFactory(id=low.id + 500)
+            assert not short_url_filter.might_contain_id(late.id)
+            short_url_filter.add_keys([{"id": late.id}])
+            assert short_url_filter.might_contain_id(late.id)
+
+            await short_url_filter.build(session)
+
+            assert short_url_filter.might_contain_id(late.id)
+            assert not short_url_filter.might_contain_id(low.id + 600)
+            assert short_url_filter.might_contain_id(high.id + 1)
+        finally:
+            short_url_filter.reset()
+
+    async def test_ids_rejected_after_start(self, session):
+        low = await ShortenedURLFactory()
+        high = await ShortenedURLFactory(id=low.id + 1000)
+        short_url_filter.start()
+        try:
+            while short_url_filter.bloom is None:
+                await asyncio.sleep(0.01)
+
+            assert short_url_filter.might_contain_id(high.id)
+            assert not short_url_filter.might_contain_id(low.id + 500)
+        finally:
+            await short_url_filter.stop()
+            short_url_filter.reset()
+
+    async def test_codes_rejected_while_bus_is_live(
+        self, url_filter, monkeypatch
+    ):
+        url = await ShortenedURLFactory(
+            value=f"{app_settings.project_short_url_base}delivered"
+        )
+        url_filter.add(url.id, "delivered")
+
+        assert url_filter.might_contain_code("delivered")
+        assert not url_filter.might_contain_code("missing")
+        monkeypatch.setattr(invalidation_bus, "_live", False)
+        assert url_filter.might_contain_code("missing")
+
+    async def test_unknown_id_rejected(self, api_client, url_filter):
+        rejections = url_filter.rejections
+        accepted = click_logger.stats.accepted
+
+        response = await api_client.get(SHORT_URL_DETAIL_URL.format(id=0))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert url_filter.rejections == rejections + 1
+        assert click_logger.stats.accepted == accepted
+
+    async def test_created_urls_added(self, api_client, url_filter):
+        data = {"original_url": "https://www.ya.ru/filtered"}
+        created = (await api_client.post(SHORT_URL_LIST_URL, json=data)).json()
+
+        response = await api_client.get(f"/{created['code']}")
+
+        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+        assert url_filter.might_contain_code(created["code"])
+
+    async def test_reset_on_lost_changes(self, url_filter):
+        invalidation_bus.dispatch_all()
+
+        assert url_filter.bloom is None
+        assert url_filter.might_contain_id(0)